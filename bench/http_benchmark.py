@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import sys
+import tempfile
+import threading
+import time
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from extract import fetch_engine, http_validators
+
+### the adaptive http client against a local mock server: compression, 304s, throttling and retries ###
+# python -m bench.http_benchmark [n_pages] [--throttle-every=N] [--fail-every=N] [--retry-after=S]
+#
+# The mock server serves n_pages pbp sized pages that gzip when asked, carry an ETag and Last-Modified and
+# answer a matching If-None-Match with 304. Every throttle_every-th request gets a 429 with Retry-After and
+# every fail_every-th a 502. The pages are fetched twice, in full and then conditionally, through fetch_all.
+
+page_size = 120000  # chars, about a trimmed pbp page
+last_modified = formatdate(time.time() - 3600, usegmt=True)
+
+class MockState:
+
+    def __init__(self
+                ,throttle_every : int
+                ,fail_every     : int
+                ,retry_after    : float):
+
+        self.throttle_every = throttle_every
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.codes = dict()
+        self._lock = threading.Lock()
+
+    def next_request(self) -> int:
+
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def count(self
+             ,code : int):
+
+        with self._lock:
+            self.codes[code] = self.codes.get(code, 0) + 1
+
+
+def make_page(path : str) -> bytes:
+
+    seed = int(hashlib.md5(path.encode()).hexdigest()[:8], 16)
+    rows = [f'<tr><td>{(seed + i) % 12}:{(seed * i) % 60:02d}.0</td><td>Player {(seed + 7 * i) % 97} makes 2-pt jump shot from {(seed + i) % 24} ft</td>'
+            f'<td class="center">{i}-{(seed + 3 * i) % (i + 1)}</td></tr>\n' for i in range(page_size // 110)]
+
+    return ('<html><body><table id="pbp">' + ''.join(rows) + '</table></body></html>').encode()
+
+def make_handler(state : MockState):
+
+    class MockHandler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real site
+
+        def reply(self
+                 ,code    : int
+                 ,body    : bytes = b''
+                 ,headers : dict = None):
+
+            state.count(code)
+            self.send_response(code)
+
+            for name, value in (headers or dict()).items():
+                self.send_header(name, value)
+
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+
+            n = state.next_request()
+
+            if state.throttle_every and n % state.throttle_every == 0:
+                return self.reply(429, b'Too Many Requests', {'Retry-After' : f"{state.retry_after:g}"})
+            if state.fail_every and n % state.fail_every == 0:
+                return self.reply(502, b'Bad Gateway')
+
+            body = make_page(self.path)
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            headers = {'ETag' : etag, 'Last-Modified' : last_modified, 'Content-Type' : 'text/html'}
+
+            if self.headers.get('If-None-Match') == etag:
+                return self.reply(304, headers=headers)
+
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, 6)
+                headers['Content-Encoding'] = 'gzip'
+
+            self.reply(200, body, headers)
+
+        def log_message(self, *args):
+            pass
+
+    return MockHandler
+
+def serve(state : MockState
+         ,port  : int = 0) -> ThreadingHTTPServer:
+    """
+    Returns a started mock server (serving on a background thread), port 0 picks a free one.
+    """
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+
+    n_pages = int(args[0]) if args else 40
+    state = MockState(int(options.get('throttle-every', 15)), int(options.get('fail-every', 11)), float(options.get('retry-after', 1)))
+    server = serve(state)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    fetch_engine.backoff_base = 0.1  # keep the run short, the shape of the backoff is the same
+    fetch_engine.set_rate(20)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        http_validators._store = http_validators.ValidatorStore(f"{tmp_path}/http_validators.db")
+        urls = [f"{base_url}/boxscores/pbp/2024010{i % 10}0{i:03d}.html" for i in range(n_pages)]
+
+        for label, conditional in [('full', False), ('conditional', True)]:
+            results, stats = fetch_engine.fetch_all(urls, conditional=conditional)
+            codes = sorted(code for _, code in results.values())
+
+            print(f"{label:12s} {stats['seconds']:6.2f}s  200: {codes.count(200):3d}  304: {codes.count(304):3d}  "
+                  f"decoded {stats['bytes_decoded'] / 2**20:6.2f}MB  on wire {stats['bytes_on_wire'] / 2**20:6.2f}MB  "
+                  f"saved {(stats['bytes_saved_compression'] + stats['bytes_saved_not_modified']) / 2**20:6.2f}MB  "
+                  f"throttled {stats['throttled']}  retries {stats['retries']}  rate now {stats['rate']:.2f}/s")
+
+        http_validators._store.close()
+
+    print(f"server saw {state.requests} requests: {dict(sorted(state.codes.items()))}")
+    server.shutdown()
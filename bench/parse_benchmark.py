@@ -0,0 +1,64 @@
+import sys
+import time
+
+from extract.html_cache import get_cache
+from transform.parse_engines import engines, get_engine
+
+### parse throughput of each parser engine over the cached pbp pages ###
+# python -m bench.parse_benchmark [engine ...]
+
+def load_cached_pages(limit : int = None) -> dict:
+    """
+    Returns dict of abbrev -> html for cached pbp pages (up to limit).
+    """
+
+    cache = get_cache()
+    pbp_keys = [(key, date) for key, date in cache.keys() if key.startswith('pbp_')][:limit]
+
+    return {key : cache.read(key, date) for key, date in pbp_keys}
+
+def time_engine(name      : str
+               ,html_dict : dict
+               ,repeat    : int = 3) -> dict:
+    """
+    Parse every page in html_dict with engine name, best of repeat.
+
+    Returns dict of timing stats.
+    """
+
+    parse_game_html = get_engine(name)
+    n_bytes = sum(len(html) for html in html_dict.values())
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for abbrev, game_html in html_dict.items():
+            parse_game_html(game_html, abbrev.split('.html')[0][-3:])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {'engine'          : name
+           ,'pages'           : len(html_dict)
+           ,'seconds'         : best
+           ,'pages_per_second': len(html_dict) / best if best else 0.0
+           ,'mb_per_second'   : n_bytes / 1e6 / best if best else 0.0}
+
+
+if __name__ == "__main__":
+
+    html_dict = load_cached_pages()
+    names = sys.argv[1:] or list(engines)
+
+    if not html_dict:
+        print('No cached pbp pages found, run main.py for a date range first.')
+        sys.exit(1)
+
+    for name in names:
+        try:
+            stats = time_engine(name, html_dict)
+        except ImportError as e:
+            print(f"{name:5s} skipped ({e})")
+            continue
+
+        print(f"{name:5s} {stats['pages']} pages in {stats['seconds']:.3f}s "
+              f"= {stats['pages_per_second']:.1f} pages/s ({stats['mb_per_second']:.1f} MB/s)")
@@ -0,0 +1,312 @@
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from extract.extract_game_data import extract_home_teams
+from extract.html_cache import SqliteCache
+from load.load_game_data import concat_all_csv, upsert_parquet
+from load.sqlite_store import load_games
+from transform import build_game_df
+from transform.build_game_df import get_soup, get_away_team, get_score_list, parse_game, evaluate_games
+from transform.parse_engines import get_engine
+from transform.result_builder import GameResultBuilder
+
+### end to end stage timings over synthetic bball-ref pages, with peak memory and a baseline check ###
+# python -m bench.pipeline_benchmark [--games=N] [--events=N] [--engine=bs4] [--repeat=N]
+#                                    [--output=path] [--baseline=path] [--save-baseline] [--tolerance=1.25]
+#
+# Every stage is timed best-of-repeat without tracing, then run once more under tracemalloc for its peak.
+# With a baseline, a stage that got slower than tolerance x its baseline time is reported and the exit code is 1.
+
+results_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'bench'))
+baseline_file = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pipeline_baseline.json'))
+noise_seconds = 0.005  # stages this close to their baseline are never flagged, sub millisecond stages jitter by more than tolerance
+
+teams = ['ATL', 'BOS', 'BKN', 'CHA', 'CHI', 'CLE', 'DAL', 'DEN', 'DET', 'GSW', 'HOU', 'IND', 'LAC', 'LAL', 'MEM'
+        ,'MIA', 'MIL', 'MIN', 'NOP', 'NYK', 'OKC', 'ORL', 'PHI', 'PHO', 'POR', 'SAC', 'SAS', 'TOR', 'UTA', 'WAS']
+
+page_head = ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+             '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+             '<script>window.sr_page = {{"type" : "{page_type}"}};</script>'
+             '<style>td.center {{ text-align: center; }}</style>')
+
+### synthetic pages ###
+
+def make_scoreboard_page(game_date : datetime
+                        ,pairs     : list) -> str:
+    """
+    Scoreboard page for game_date listing every (away_team, home_team) in pairs, with the
+    navigation links, standings and older box score links a real page carries.
+
+    Returns html.
+    """
+
+    format_date = game_date.strftime('%Y%m%d')
+    yesterday = (game_date - timedelta(days=1)).strftime('%Y%m%d')
+
+    nav = ''.join(f'<li><a href="/teams/{team}/">{team}</a></li>' for team in teams)
+    games = ''.join(f'<div class="game_summary"><table class="teams"><tr class="loser"><td><a href="/teams/{away_team}/2022.html">{away_team}</a></td>'
+                    f'<td class="right">98</td><td class="right gamelink"><a href="/boxscores/{format_date}0{home_team}.html">Final</a></td></tr>'
+                    f'<tr class="winner"><td><a href="/teams/{home_team}/2022.html">{home_team}</a></td><td class="right">104</td></tr></table></div>'
+                    for away_team, home_team in pairs)
+    older = f'<div class="prevnext"><a href="/boxscores/?month={yesterday[4:6]}&day={yesterday[6:]}&year={yesterday[:4]}">Prev Day</a></div>'
+
+    return (page_head.format(page_type='scoreboard') + '</head><body>'
+            f'<nav><ul>{nav}</ul></nav>{older}<div class="game_summaries">{games}</div>'
+            '<!-- <div class="placeholder"><a href="/boxscores/199001010BOS.html">old</a></div> --></body></html>')
+
+def make_pbp_page(away_team : str
+                 ,home_team : str
+                 ,n_events  : int
+                 ,rng       : random.Random) -> str:
+    """
+    Play-by-play page with n_events plays. Scoring plays carry the running score in a td.center cell,
+    other plays (fouls, rebounds, timeouts) repeat the previous score the way bball-ref does.
+
+    Returns html.
+    """
+
+    away_score = home_score = 0
+    rows = ['<tr class="thead"><th>Time</th><th>Away</th><th></th><th>Score</th><th></th><th>Home</th></tr>'
+           ,'<tr><td>12:00.0</td><td colspan="5" class="center">Start of 1st quarter</td></tr>']
+
+    for i in range(n_events):
+        if i and i % (n_events // 4 or 1) == 0:
+            rows.append(f'<tr><td>0:00.0</td><td colspan="5" class="center">End of {i * 4 // n_events}th quarter</td></tr>')
+
+        if rng.random() < 0.45:  # scoring play
+            points = rng.choice([1, 2, 2, 2, 3])
+            if rng.random() < 0.5:
+                away_score += points
+            else:
+                home_score += points
+            play = f'<a href="/players/x/x01.html">Player</a> makes {points}-pt shot'
+        else:
+            play = rng.choice(['Defensive rebound', 'Personal foul', 'Turnover', 'Timeout'])
+
+        clock = f"{11 - (i * 48 // max(n_events, 1)) % 12}:{rng.randint(0, 59):02d}.0"
+        rows.append(f'<tr><td>{clock}</td><td class="">{play}</td><td class=""></td>'
+                    f'<td class="center">{away_score}-{home_score}</td><td class=""></td><td class=""></td></tr>')
+
+    return (page_head.format(page_type='pbp') +
+            f'<meta name="Description" content="{away_team} vs {home_team}, play-by-play">'
+            f'<meta property="og:title" content="{away_team} vs {home_team} Play-By-Play">'
+            '</head><body><div id="content"><table id="pbp" class="suppress_all stats_table">'
+            f'{"".join(rows)}</table></div>'
+            '<!-- <table><tr><td class="center">0-0</td></tr></table> --></body></html>')
+
+def make_fixtures(n_games  : int
+                 ,n_events : int
+                 ,seed     : int = 0) -> tuple:
+    """
+    n_games games at 10 a day from 2021-10-19, each with an n_events play-by-play page.
+
+    Returns dict of yyyy-mm-dd -> scoreboard html and dict of game cache key -> pbp html.
+    """
+
+    rng = random.Random(seed)
+    scoreboard_dict = dict()
+    pbp_dict = dict()
+    start = datetime(2021, 10, 19)
+
+    for day in range((n_games + 9) // 10):
+        game_date = start + timedelta(days=day)
+        matchups = rng.sample(teams, 20)
+        pairs = [(matchups[i], matchups[i + 1]) for i in range(0, 20, 2)][:n_games - day * 10]
+
+        scoreboard_dict[game_date.strftime('%Y-%m-%d')] = make_scoreboard_page(game_date, pairs)
+
+        for away_team, home_team in pairs:
+            pbp_dict[f"pbp_{game_date.strftime('%Y%m%d')}0{home_team}.html"] = make_pbp_page(away_team, home_team, n_events, rng)
+
+    return scoreboard_dict, pbp_dict
+
+### stages ###
+
+def run_stages(scoreboard_dict : dict
+              ,pbp_dict        : dict
+              ,engine          : str
+              ,work_dir        : str) -> list:
+    """
+    Returns list of (stage name, zero argument callable) in pipeline order. A stage's result is the input
+    of the ones after it, so they have to be run in that order.
+    """
+
+    state = dict()
+    parse_game_html = get_engine(engine)
+    cache_path = os.path.join(work_dir, 'html_cache.db')
+    csv_path = os.path.join(work_dir, 'csv') + '/'
+
+    def scoreboard():
+        return [extract_home_teams(html, datetime.strptime(game_date, '%Y-%m-%d')) for game_date, html in scoreboard_dict.items()]
+
+    def cache_write():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        cache = SqliteCache(cache_path)
+        cache.write_many([(key, datetime.strptime(key[4:12], '%Y%m%d'), html) for key, html in pbp_dict.items()])
+        cache.close()
+
+    def cache_lookup():
+        cache = SqliteCache(cache_path)
+        state['html_dict'] = {key : cache.read(key) for key, _ in cache.keys() if cache.exists(key)}
+        cache.close()
+
+    def parse_legacy():
+        for key, html in state['html_dict'].items():
+            game_soup = get_soup(html)
+            get_away_team(game_soup, key.split('.html')[0][-3:])
+            get_score_list(game_soup)
+
+    def parse():
+        state['timelines'] = [parse_game(key, html, parse_game_html) for key, html in state['html_dict'].items()]
+
+    def evaluate():
+        state['columns'] = evaluate_games(state['timelines'])
+
+    def build_frame():
+        builder = GameResultBuilder(len(state['timelines']))
+        builder.append_columns(*state['columns'])
+        state['games_df'] = builder.to_frame()
+
+    def load_csv():
+        shutil.rmtree(csv_path, ignore_errors=True)
+        os.makedirs(csv_path)
+        for game_date, day_df in state['games_df'].groupby('game_date'):
+            day_df.to_csv(f"{csv_path}lawler_{game_date}.csv", index=False)
+        concat_all_csv(csv_path, sorted(os.listdir(csv_path)))
+
+    def load_parquet():
+        shutil.rmtree(os.path.join(work_dir, 'parquet'), ignore_errors=True)
+        upsert_parquet(state['games_df'], os.path.join(work_dir, 'parquet'))
+
+    def load_sqlite():
+        load_games(state['games_df'], os.path.join(work_dir, 'lawler.db'))
+
+    return [('scoreboard', scoreboard), ('cache_write', cache_write), ('cache_lookup', cache_lookup)
+           ,('parse_legacy', parse_legacy), ('parse', parse), ('evaluate', evaluate), ('build_frame', build_frame)
+           ,('load_csv', load_csv), ('load_parquet', load_parquet), ('load_sqlite', load_sqlite)]
+
+def time_stage(stage  : callable
+              ,repeat : int) -> dict:
+    """
+    Best of repeat wall time, then one more run under tracemalloc for the peak python allocation.
+
+    Returns dict of seconds, peak_mb.
+    """
+
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds' : best, 'peak_mb' : peak / 1e6}
+
+def run_benchmark(n_games  : int = 200
+                 ,n_events : int = 450
+                 ,engine   : str = 'bs4'
+                 ,repeat   : int = 3) -> dict:
+    """
+    Generate the fixtures and time every stage in a scratch directory.
+    The parsed result cache and timeline index are switched off so every run does the full work.
+
+    Returns dict of run settings and per stage timings.
+    """
+
+    scoreboard_dict, pbp_dict = make_fixtures(n_games, n_events)
+    work_dir = tempfile.mkdtemp(prefix='lawler_bench_')
+    settings = (build_game_df.use_result_cache, build_game_df.index_timelines)
+    build_game_df.use_result_cache = build_game_df.index_timelines = False
+
+    stages = dict()
+
+    try:
+        for name, stage in run_stages(scoreboard_dict, pbp_dict, engine, work_dir):
+            stages[name] = time_stage(stage, repeat)
+            print(f"{name:14s} {stages[name]['seconds']:8.3f}s  peak {stages[name]['peak_mb']:8.1f} MB")
+    finally:
+        build_game_df.use_result_cache, build_game_df.index_timelines = settings
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {'created_at' : datetime.now().isoformat(timespec='seconds')
+           ,'games'      : n_games
+           ,'events'     : n_events
+           ,'pages_mb'   : sum(len(html) for html in pbp_dict.values()) / 1e6
+           ,'engine'     : engine
+           ,'repeat'     : repeat
+           ,'python'     : sys.version.split()[0]
+           ,'pandas'     : pd.__version__
+           ,'stages'     : stages}
+
+def compare_to_baseline(results   : dict
+                       ,baseline  : dict
+                       ,tolerance : float = 1.25) -> list:
+    """
+    Returns list of (stage, baseline seconds, seconds) for every stage slower than tolerance x its baseline
+    (and more than noise_seconds slower).
+    """
+
+    if (baseline['games'], baseline['events'], baseline['engine']) != (results['games'], results['events'], results['engine']):
+        print('Baseline was recorded with different settings, timings are not comparable')
+
+    regressions = []
+
+    for name, stats in results['stages'].items():
+        if name not in baseline['stages']:
+            continue
+
+        baseline_seconds = baseline['stages'][name]['seconds']
+        ratio = stats['seconds'] / baseline_seconds if baseline_seconds else 1.0
+        slower = ratio > tolerance and stats['seconds'] - baseline_seconds > noise_seconds
+        print(f"{name:14s} {baseline_seconds:8.3f}s -> {stats['seconds']:8.3f}s  x{ratio:.2f}{'  SLOWER' if slower else ''}")
+
+        if slower:
+            regressions.append((name, baseline_seconds, stats['seconds']))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+
+    results = run_benchmark(int(options.get('games', 200)), int(options.get('events', 450))
+                           ,options.get('engine', 'bs4'), int(options.get('repeat', 3)))
+
+    output = options.get('output', os.path.join(results_path, f"pipeline_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if '--save-baseline' in sys.argv:
+        with open(options.get('baseline', baseline_file), 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {options.get('baseline', baseline_file)}")
+
+    elif os.path.exists(options.get('baseline', baseline_file)):
+        with open(options.get('baseline', baseline_file)) as f:
+            regressions = compare_to_baseline(results, json.load(f), float(options.get('tolerance', 1.25)))
+
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than baseline")
+            sys.exit(1)
@@ -0,0 +1,64 @@
+import sys
+import time
+
+import pandas as pd
+
+from transform.game_schema import to_compact
+from transform.result_builder import GameResultBuilder
+
+### per-game overhead of building the result dataframe: 1-row dataframes + pd.concat vs GameResultBuilder ###
+# python -m bench.result_builder_benchmark [n_games]
+
+def make_rows(n_games : int) -> list:
+    """
+    Returns n_games synthetic parsed rows, every 10th game has no score list (all None).
+    """
+
+    rows = []
+
+    for i in range(n_games):
+        if i % 10 == 9:
+            rows.append({'game_date' : '2022-01-01', 'away_team' : 'BOS', 'home_team' : 'LAL', 'final_away' : None, 'final_home' : None
+                        ,'win_team' : None, 'lose_team' : None, 'reached_100_bool' : None, 'lawler_bool' : None
+                        ,'away_at_100' : None, 'home_at_100' : None, 'delta_at_100' : None})
+        else:
+            rows.append({'game_date' : '2022-01-01', 'away_team' : 'BOS', 'home_team' : 'LAL', 'final_away' : 110, 'final_home' : 96
+                        ,'win_team' : 'BOS', 'lose_team' : 'LAL', 'reached_100_bool' : True, 'lawler_bool' : i % 7 != 0
+                        ,'away_at_100' : 100, 'home_at_100' : 82, 'delta_at_100' : i % 30})
+
+    return rows
+
+def build_with_concat(rows : list) -> pd.DataFrame:
+    """
+    The original approach: one dataframe per game, .copy() into a dict, pd.concat at the end.
+    """
+
+    df_dict = dict()
+
+    for i, row in enumerate(rows):
+        df_dict[i] = pd.DataFrame({column : [value] for column, value in row.items()}).copy()
+
+    return pd.concat(df_dict).reset_index(drop=True)
+
+def build_with_builder(rows : list) -> pd.DataFrame:
+
+    builder = GameResultBuilder()
+    builder.extend(rows)
+
+    return builder.to_frame()
+
+
+if __name__ == "__main__":
+
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rows = make_rows(n_games)
+    frames = dict()
+
+    for name, build in [('concat', build_with_concat), ('builder', build_with_builder)]:
+        start = time.perf_counter()
+        frames[name] = build(rows)
+        elapsed = time.perf_counter() - start
+        print(f"{name:8s} {n_games} games in {elapsed:.3f}s = {elapsed / n_games * 1e6:.1f} us/game")
+
+    same_csv = to_compact(frames['concat']).to_csv(index=False) == frames['builder'].to_csv(index=False)
+    print(f"identical csv output: {same_csv}")
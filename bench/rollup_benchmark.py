@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench.schema_benchmark import best_time, make_games
+from load.sqlite_store import hit_rates, load_games, read_rollups
+
+### dashboard queries from the team_rollups vs grouping the games table, and the cost of an incremental load ###
+# python -m bench.rollup_benchmark [n_games]     default is about 30 seasons of games
+
+group_sql = """SELECT season, SUM(reached_100_bool), SUM(lawler_bool), 1.0 * SUM(lawler_bool) / SUM(reached_100_bool)
+               FROM games GROUP BY season ORDER BY season"""  # what hit_rates ran before the rollups
+
+
+if __name__ == "__main__":
+
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 36000
+    games_df = make_games(n_games + 6)
+    history_df, day_df = games_df.iloc[:n_games], games_df.iloc[n_games:]
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        db_path = os.path.join(tmp_path, 'lawler.db')
+
+        start = time.perf_counter()
+        load_games(history_df, db_path)
+        print(f"{n_games} games loaded in {time.perf_counter() - start:.2f}s")
+
+        conn = sqlite3.connect(db_path)
+        print(f"{'hit rate by season, group games':36s} {best_time(lambda: conn.execute(group_sql).fetchall()) * 1000:10.2f}ms")
+        print(f"{'hit rate by season, rollups':36s} {best_time(lambda: conn.execute('SELECT season, SUM(reached_100), SUM(lawler_hits) FROM team_rollups WHERE side = ? GROUP BY season', ('home',)).fetchall()) * 1000:10.2f}ms")
+        conn.close()
+
+        print(f"{'hit_rates(season)':36s} {best_time(lambda: hit_rates('season', db_path)) * 1000:10.2f}ms")
+        print(f"{'read_rollups(team, season)':36s} {best_time(lambda: read_rollups(['team', 'season'], db_path=db_path)) * 1000:10.2f}ms")
+        print(f"{'read_rollups(delta_bucket)':36s} {best_time(lambda: read_rollups(['delta_bucket'], db_path=db_path)) * 1000:10.2f}ms")
+        print(f"{'load one day (6 games)':36s} {best_time(lambda: load_games(day_df, db_path)) * 1000:10.2f}ms")
@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from load.load_game_data import concat_all_csv
+from transform.game_schema import team_dtype, to_legacy
+from transform.result_builder import GameResultBuilder
+
+### memory and filter speed of the compact games schema vs the old all-object layout ###
+# python -m bench.schema_benchmark [n_games]     default is about 30 seasons of games
+
+def make_games(n_games : int
+              ,seed    : int = 0) -> pd.DataFrame:
+    """
+    n_games random games, 6 a day from 1996-11-01, every 20th without a score list and 1 in 20 never reaching 100.
+
+    Returns compact games dataframe (as build_game_df.build_games_df returns it).
+    """
+
+    rng = np.random.default_rng(seed)
+    teams = np.array(team_dtype.categories, dtype=object)
+
+    away_teams = teams[rng.integers(0, len(teams), n_games)]
+    home_teams = teams[(np.searchsorted(teams, away_teams) + rng.integers(1, len(teams), n_games)) % len(teams)]
+    game_dates = (np.datetime64('1996-11-01') + np.arange(n_games) // 6).astype(str).astype(object)
+
+    final_away = rng.integers(80, 140, n_games)
+    final_home = rng.integers(80, 140, n_games)
+    has_scores = np.arange(n_games) % 20 != 19
+    reached = has_scores & (rng.random(n_games) > 0.05)
+    away_at = np.where(rng.random(n_games) < 0.5, 100, rng.integers(70, 100, n_games))
+    home_at = np.where(away_at == 100, rng.integers(70, 100, n_games), 100)
+    away_wins = final_away > final_home
+    win_team = np.where(away_wins, away_teams, home_teams)
+
+    columns = {'game_date'        : game_dates
+              ,'away_team'        : away_teams
+              ,'home_team'        : home_teams
+              ,'final_away'       : final_away
+              ,'final_home'       : final_home
+              ,'win_team'         : np.where(has_scores, win_team, None)
+              ,'lose_team'        : np.where(has_scores, np.where(away_wins, home_teams, away_teams), None)
+              ,'reached_100_bool' : reached
+              ,'lawler_bool'      : np.where(away_at >= home_at, away_teams, home_teams) == win_team
+              ,'away_at_100'      : away_at
+              ,'home_at_100'      : home_at
+              ,'delta_at_100'     : np.abs(away_at - home_at)}
+
+    nulls = {'final_away' : ~has_scores, 'final_home' : ~has_scores, 'reached_100_bool' : ~has_scores
+            ,'lawler_bool' : ~reached, 'away_at_100' : ~reached, 'home_at_100' : ~reached, 'delta_at_100' : ~reached}
+
+    builder = GameResultBuilder(n_games)
+    builder.append_columns(columns, nulls)
+
+    return builder.to_frame()
+
+def to_dates(game_dates : pd.Series) -> pd.Series:
+    """
+    Returns game_dates as datetimes, parsing the old layout's strings.
+    """
+
+    return game_dates if game_dates.dtype.kind == 'M' else pd.to_datetime(game_dates, format='%Y-%m-%d')
+
+def best_time(fn
+             ,repeat : int = 5) -> float:
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+if __name__ == "__main__":
+
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 36000
+    compact_df = make_games(n_games)
+    legacy_df = to_legacy(compact_df)
+    legacy_df['delta_at_100'] = legacy_df['delta_at_100'].astype('Int64')  # the old builder's IntegerArray
+
+    layouts = {'legacy' : legacy_df, 'compact' : compact_df}
+
+    filters = {'home team BOS, law held'  : lambda df: df[(df['home_team'] == 'BOS') & (df['lawler_bool'] == True)]
+              ,'hit rate by home team'    : lambda df: df[df['reached_100_bool'] == True].groupby('home_team', observed=True)['lawler_bool'].mean()
+              ,'one season'               : lambda df: df[to_dates(df['game_date']).between(pd.Timestamp('2021-10-19'), pd.Timestamp('2022-06-16'))]}
+
+    print(f"{n_games} games")
+    print(f"{'':28s} {'legacy':>12s} {'compact':>12s}")
+    print(f"{'memory (deep)':28s} " + ' '.join(f"{df.memory_usage(deep=True).sum() / 2**20:10.2f}MB" for df in layouts.values()))
+
+    for label, fn in filters.items():
+        print(f"{label:28s} " + ' '.join(f"{best_time(lambda: fn(df)) * 1000:10.2f}ms" for df in layouts.values()))
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        for name, df in layouts.items():
+            df.to_csv(os.path.join(tmp_path, f"{name}.csv"), index=False)
+            df.to_parquet(os.path.join(tmp_path, f"{name}.parquet"), index=False, compression='zstd')
+
+        print(f"{'csv size':28s} " + ' '.join(f"{os.path.getsize(os.path.join(tmp_path, f'{name}.csv')) / 2**20:10.2f}MB" for name in layouts))
+        print(f"{'parquet size (zstd)':28s} " + ' '.join(f"{os.path.getsize(os.path.join(tmp_path, f'{name}.parquet')) / 2**10:10.1f}KB" for name in layouts))
+
+        read_legacy = best_time(lambda: pd.read_csv(os.path.join(tmp_path, 'legacy.csv')), 3)  # what concat_all_csv used to do
+        read_compact = best_time(lambda: concat_all_csv(tmp_path + '/', ['compact.csv']), 3)
+        print(f"{'read csv (concat_all_csv)':28s} {read_legacy * 1000:10.2f}ms {read_compact * 1000:10.2f}ms")
+
+        same = concat_all_csv(tmp_path + '/', ['legacy.csv']).equals(concat_all_csv(tmp_path + '/', ['compact.csv']))
+        print(f"both csv layouts read back identical: {same}")
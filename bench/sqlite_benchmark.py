@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+import pandas as pd
+
+from load.sqlite_store import load_games, read_games, hit_rates
+
+### sqlite loader on full-history volume: bulk load, idempotent reload, indexed lookups vs a csv scan ###
+# python -m bench.sqlite_benchmark [n_games]
+
+teams = ['ATL', 'BOS', 'BKN', 'CHA', 'CHI', 'CLE', 'DAL', 'DEN', 'DET', 'GSW', 'HOU', 'IND', 'LAC', 'LAL', 'MEM'
+        ,'MIA', 'MIL', 'MIN', 'NOP', 'NYK', 'OKC', 'ORL', 'PHI', 'PHO', 'POR', 'SAC', 'SAS', 'TOR', 'UTA', 'WAS']
+
+def make_games_df(n_games : int) -> pd.DataFrame:
+    """
+    Returns n_games synthetic results spread over 25 seasons (15 games a day, Nov - Apr).
+    """
+
+    random.seed(0)
+    rows = []
+    start = pd.Timestamp('1997-11-01')
+
+    for i in range(n_games):
+        season, day = divmod(i // 15, 180)
+        game_date = (start + pd.DateOffset(years=season) + pd.Timedelta(days=day)).strftime('%Y-%m-%d')
+        away_team, home_team = random.sample(teams, 2)
+        away_score, home_score = random.randint(80, 130), random.randint(80, 130)
+        reached = max(away_score, home_score) >= 100
+        win_team, lose_team = (away_team, home_team) if away_score > home_score else (home_team, away_team)
+
+        rows.append({'game_date' : game_date, 'away_team' : away_team, 'home_team' : home_team
+                    ,'final_score' : f"{away_score}-{home_score}", 'win_team' : win_team, 'lose_team' : lose_team
+                    ,'reached_100_bool' : reached, 'lawler_bool' : (random.random() < 0.9) if reached else None
+                    ,'score_at_100' : '100-90' if reached else None, 'delta_at_100' : random.randint(0, 30) if reached else None})
+
+    return pd.DataFrame(rows).drop_duplicates(subset=['game_date', 'home_team'])
+
+def timed(label : str
+         ,fn
+         ,*args):
+
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f"{label:32s} {time.perf_counter() - start:8.3f}s")
+
+    return result
+
+
+if __name__ == "__main__":
+
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    games_df = make_games_df(n_games)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'lawler.db')
+        csv_path = os.path.join(tmp_dir, 'lawler.csv')
+        games_df.to_csv(csv_path, index=False)
+
+        print(f"{games_df.shape[0]} games")
+        timed('bulk load', load_games, games_df, db_path)
+        timed('idempotent reload', load_games, games_df, db_path)
+        timed('team/season lookup (sqlite)', read_games, 'BOS', '2010-11', db_path)
+        timed('team/season lookup (csv scan)', lambda: (lambda df: df[((df['home_team'] == 'BOS') | (df['away_team'] == 'BOS'))
+                                                                      & (df['game_date'].between('2010-11-01', '2011-06-30'))])(pd.read_csv(csv_path)))
+        timed('hit rate by season (sqlite)', hit_rates, 'season', db_path)
@@ -0,0 +1,36 @@
+import statistics
+import subprocess
+import sys
+import time
+
+### process startup time of the cli subcommands vs importing the whole pipeline ###
+# python -m bench.startup_benchmark [runs]
+
+commands = [('cli.py status', [sys.executable, 'cli.py', 'status'])
+           ,('cli.py usage', [sys.executable, 'cli.py'])
+           ,('import main', [sys.executable, '-c', 'import main'])
+           ,('python -c pass', [sys.executable, '-c', 'pass'])]
+
+def time_command(command : list
+                ,runs    : int) -> list:
+    """
+    Returns list of wall times (ms) of runs fresh processes running command.
+    """
+
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return times
+
+
+if __name__ == "__main__":
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for label, command in commands:
+        times = time_command(command, runs)
+        print(f"{label:16s} median {statistics.median(times):7.1f} ms  min {min(times):7.1f} ms")
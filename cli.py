@@ -0,0 +1,358 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from datetime import datetime, timedelta
+
+### command line entry point ###
+#
+# python cli.py run    [start] [end] [--stream] [--resume] [--pipeline] [--chunk-days=N] [--metrics]   full extract -> transform -> load (main.py)
+# python cli.py fetch  [start] [end]                                                    fetch pages into the html cache only
+# python cli.py parse  [start] [end] [--engine=bs4] [--workers=N] [--inventory]         parse cached pages into data/csv/
+# python cli.py load   [csv ...]                                                        load csvs into the parquet store and sqlite
+# python cli.py query  games [--team=BOS] [--season=2021-22] | rates [season|home_team|away_team] | first-to N [min_lead]
+#                      | rollup [season] [team] [side] [delta_bucket] [--season=S] [--team=T] [--side=home] | rebuild-rollups
+# python cli.py status                                                                  what has been fetched, parsed and loaded
+# python cli.py live   [date] [--teams=DEN,LAL] [--interval=30] [--max-polls=N] [--rate=R] [--base-url=URL]   track games as they are played
+# python cli.py inventory scan | report [start] [end] | invalid | requeue [--workers=N]  what the html cache holds and which pages are bad
+# python cli.py shard  start end [--workers=N] [--shard-months=M] [--reparse] [--rate=R]  sharded backfill, run on every host sharing data/
+# python cli.py daemon [--at=06:00] [--socket=PATH]                                     resident service with the stores kept open
+# python cli.py request run [start] [end] [--no-resume] | status | stop [--socket=PATH]   send a request to the daemon
+#
+# Dates are yyyy-mm-dd and default to yesterday. Only the standard library is imported up front, every
+# subcommand imports the modules it needs (pandas, numpy, requests, bs4) when it runs, so status starts
+# without paying for any of them.
+
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+
+status_tables = [('html pages cached', 'html_cache.db', 'pages')
+                ,('html pages inventoried', 'cache_inventory.db', 'pages')
+                ,('schedule dates indexed', 'schedule.db', 'schedule')
+                ,('http validators stored', 'http_validators.db', 'validators')
+                ,('parsed results cached', 'parse_cache.db', 'results')
+                ,('timelines indexed', 'timelines.db', 'timelines')
+                ,('games in sqlite', 'lawler.db', 'games')
+                ,('team rollup rows', 'lawler.db', 'team_rollups')]
+
+def parse_args(args : list) -> tuple:
+    """
+    Split args into positionals and --name=value / --flag options.
+
+    Returns list of positionals and dict of options (flags map to True).
+    """
+
+    positionals = [arg for arg in args if not arg.startswith('--')]
+    options = dict()
+
+    for arg in args:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            options[name] = value if value else True
+
+    return positionals, options
+
+def get_date_args(positionals : list) -> tuple:
+    """
+    Returns start and end date (yyyy-mm-dd), each defaulting to yesterday.
+    """
+
+    yesterday = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+    start_game_date = positionals[0] if len(positionals) > 0 else yesterday
+    end_game_date = positionals[1] if len(positionals) > 1 else yesterday
+
+    return start_game_date, end_game_date
+
+def setup_logging():
+
+    os.makedirs('log', exist_ok=True)
+    logging.basicConfig(filename='log/lawler.log', level=logging.INFO, format='%(message)s')
+
+### subcommands ###
+
+def run_command(positionals : list
+               ,options     : dict):
+
+    import main
+    from pipeline import metrics
+
+    metrics.enabled = 'metrics' in options
+    start_game_date, end_game_date = get_date_args(positionals)
+
+    if 'chunk-days' in options:
+        main.backfill(start_game_date, end_game_date, int(options['chunk-days']))
+    else:
+        main.main(start_game_date, end_game_date, 'stream' in options, 'resume' in options, 'pipeline' in options)
+
+def fetch_command(positionals : list
+                 ,options     : dict):
+
+    from extract.extract_game_data import iter_game_html_between_dates
+    from pipeline.manifest import get_manifest
+
+    setup_logging()
+    start_game_date, end_game_date = get_date_args(positionals)
+    manifest = get_manifest()
+    n_days = n_games = 0
+
+    for game_date, game_html_dict in iter_game_html_between_dates(start_game_date, end_game_date):
+        day = game_date.strftime('%Y-%m-%d')
+        if day not in manifest.date_states([day]):  # never move a parsed or loaded date back
+            manifest.mark_date(day, 'fetched')
+
+        n_days += 1
+        n_games += len(game_html_dict)
+
+    print(f"{n_games} games on {n_days} dates in the html cache")
+
+def parse_command(positionals : list
+                 ,options     : dict):
+
+    from extract.html_cache import get_cache
+    from transform.build_game_df import read_game_data_from_cache
+
+    setup_logging()
+    start_game_date, end_game_date = get_date_args(positionals)
+    start, end = datetime.strptime(start_game_date, '%Y-%m-%d'), datetime.strptime(end_game_date, '%Y-%m-%d')
+
+    if 'inventory' in options:  # only the pages the last inventory scan found valid
+        from extract.cache_inventory import cached_games
+        games = cached_games(start_game_date, end_game_date)
+    else:
+        games = [key for key, date in get_cache().keys() if key.startswith('pbp_') and start <= date <= end]
+
+    if not games:
+        print(f"No cached games between {start_game_date} and {end_game_date}, run fetch first")
+        return 1
+
+    all_games_df = read_game_data_from_cache(games, options.get('engine'), int(options['workers']) if 'workers' in options else None
+                                            ,verified='inventory' in options)
+
+    csv_path = os.path.join(data_path, 'csv', f"lawler_{start_game_date}_{end_game_date}.csv")
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    all_games_df.to_csv(csv_path, index=False)
+
+    print(f"Parsed {all_games_df.shape[0]} games into {csv_path}")
+
+def load_command(positionals : list
+                ,options     : dict):
+
+    from load.load_game_data import csv_file_path, concat_all_csv, upsert_parquet
+    from load.sqlite_store import load_games
+
+    setup_logging()
+    all_csvs = positionals or [file for file in sorted(os.listdir(csv_file_path)) if '.csv' in file and file != 'lawler.csv']
+
+    if not all_csvs:
+        print(f"No csvs found in {csv_file_path}")
+        return 1
+
+    all_games_df = concat_all_csv(csv_file_path + '/', [os.path.basename(csv) for csv in all_csvs])
+
+    print(f"Loaded {upsert_parquet(all_games_df)} rows into the parquet store and {load_games(all_games_df)} rows into sqlite")
+
+def query_command(positionals : list
+                 ,options     : dict):
+
+    query = positionals[0] if positionals else None
+
+    if query == 'games':
+        from load.sqlite_store import read_games
+        print(read_games(options.get('team'), options.get('season')).to_string(index=False))
+
+    elif query == 'rates':
+        from load.sqlite_store import hit_rates
+        print(hit_rates(positionals[1] if len(positionals) > 1 else 'season').to_string(index=False))
+
+    elif query == 'rollup':
+        from load.sqlite_store import read_rollups
+        print(read_rollups(positionals[1:], options.get('season'), options.get('team'), options.get('side')).to_string(index=False))
+
+    elif query == 'rebuild-rollups':
+        from load.sqlite_store import rebuild_rollups
+        print(f"Rebuilt {rebuild_rollups()} rollup rows")
+
+    elif query == 'first-to' and len(positionals) > 1:
+        from transform.timeline_index import get_index
+
+        threshold = int(positionals[1])
+        min_lead = int(positionals[2]) if len(positionals) > 2 else 0
+        rate, n_games = get_index().hit_rate(threshold, min_lead)
+
+        if n_games:
+            print(f"first to {threshold} (lead >= {min_lead}) won {rate:.1%} of {n_games} games")
+        else:
+            print(f"no indexed games reached {threshold} with lead >= {min_lead}")
+
+    else:
+        print('usage: python cli.py query games [--team=XXX] [--season=yyyy-yy] | rates [season|home_team|away_team] | first-to N [min_lead]'
+              ' | rollup [season] [team] [side] [delta_bucket] [--season=yyyy-yy] [--team=XXX] [--side=home|away] | rebuild-rollups')
+        return 1
+
+def count_rows(db_path : str
+              ,table   : str) -> int:
+    """
+    Returns row count of table, or None if the database does not exist yet (it is never created here).
+    """
+
+    if not os.path.exists(db_path):
+        return None
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def status_command(positionals : list
+                  ,options     : dict):
+
+    for label, db_file, table in status_tables:
+        count = count_rows(os.path.join(data_path, db_file), table)
+        print(f"{label:24s} {'-' if count is None else count}")
+
+    manifest_db = os.path.join(data_path, 'manifest.db')
+
+    if os.path.exists(manifest_db):
+        from pipeline.manifest import JobManifest
+
+        summary = JobManifest(manifest_db).summary()
+        print(f"{'dates':24s} {', '.join(f'{state} {count}' for state, count in sorted(summary['dates'].items())) or '-'}")
+        print(f"{'games':24s} {', '.join(f'{state} {count}' for state, count in sorted(summary['games'].items())) or '-'}")
+
+        if summary['failed_codes']:
+            print(f"{'failed by response code':24s} {', '.join(f'{code}: {count}' for code, count in sorted(summary['failed_codes'].items()))}")
+
+    metrics_file = os.path.join(data_path, 'metrics', 'lawler_metrics.json')
+
+    if os.path.exists(metrics_file):
+        with open(metrics_file) as f:
+            last_run = json.load(f)
+        print(f"{'last metered run':24s} {last_run['started_at']} ({last_run['run_seconds']:.1f}s)")
+
+
+def live_command(positionals : list
+                ,options     : dict):
+
+    from extract import extract_game_data
+    from extract.fetch_engine import set_rate
+    from pipeline.live import run_live
+
+    setup_logging()
+
+    if 'base-url' in options:
+        extract_game_data.base_url = options['base-url']
+    if 'rate' in options:
+        set_rate(float(options['rate']))
+
+    run_live(datetime.strptime(positionals[0], '%Y-%m-%d') if positionals else None
+            ,options['teams'].split(',') if 'teams' in options else None
+            ,float(options['interval']) if 'interval' in options else None
+            ,int(options['max-polls']) if 'max-polls' in options else None)
+
+def inventory_command(positionals : list
+                     ,options     : dict):
+
+    from extract import cache_inventory
+
+    setup_logging()
+    action = positionals[0] if positionals else None
+
+    if action == 'scan':
+        counts = cache_inventory.scan(workers=int(options['workers']) if 'workers' in options else None)
+        print(f"{sum(counts.values())} pages: {', '.join(f'{status} {count}' for status, count in sorted(counts.items())) or '-'}")
+
+    elif action == 'report':
+        for status, (count, size) in sorted(cache_inventory.get_inventory().summary().items()):
+            print(f"{status:24s} {count:8d} pages {size or 0:14d} bytes")
+
+        if len(positionals) > 1:
+            start_game_date, end_game_date = get_date_args(positionals[1:])
+            print(f"\n{'season':10s} {'expected':>9s} {'cached':>9s} {'invalid':>9s} {'missing':>9s} {'unknown dates':>14s}")
+            for season, counts in sorted(cache_inventory.coverage(start_game_date, end_game_date).items()):
+                print(f"{season:10s} {counts['expected']:9d} {counts['cached']:9d} {counts['invalid']:9d} {counts['missing']:9d} {counts['unknown_dates']:14d}")
+
+    elif action == 'invalid':
+        for key, game_date, status in cache_inventory.get_inventory().pages(status='invalid'):
+            print(f"{game_date} {key:28s} {status}")
+
+    elif action == 'requeue':
+        print(f"Requeued {cache_inventory.requeue_invalid()} pages, the next resumed run fetches them again")
+
+    else:
+        print('usage: python cli.py inventory scan [--workers=N] | report [start] [end] | invalid | requeue')
+        return 1
+
+def shard_command(positionals : list
+                 ,options     : dict):
+
+    from pipeline.shards import run_coordinator
+
+    setup_logging()
+    start_game_date, end_game_date = get_date_args(positionals)
+
+    n_games = run_coordinator(start_game_date, end_game_date
+                             ,int(options['workers']) if 'workers' in options else None
+                             ,int(options['shard-months']) if 'shard-months' in options else None
+                             ,'reparse' in options
+                             ,float(options['rate']) if 'rate' in options else None)
+
+    print(f"Merged {n_games} games" if n_games else "Every shard done, merged by this or another host")
+
+def daemon_command(positionals : list
+                  ,options     : dict):
+
+    from pipeline.daemon import LawlerDaemon
+
+    setup_logging()
+    LawlerDaemon(options.get('socket'), options.get('at')).serve()
+
+def request_command(positionals : list
+                   ,options     : dict):
+
+    from pipeline.daemon import send_request
+
+    if not positionals or positionals[0] not in ('run', 'status', 'stop'):
+        print('usage: python cli.py request run [start] [end] [--no-resume] | status | stop [--socket=PATH]')
+        return 1
+
+    request = {'command' : positionals[0]}
+
+    if positionals[0] == 'run':
+        request['start'], request['end'] = get_date_args(positionals[1:])
+        request['resume'] = 'no-resume' not in options
+
+    try:
+        reply = send_request(request, options.get('socket'))
+    except (ConnectionRefusedError, FileNotFoundError):
+        print('No daemon is listening, start one with python cli.py daemon')
+        return 1
+
+    print(json.dumps(reply, indent=2))
+
+    return 0 if reply.get('ok', True) else 1
+
+
+commands = {'run'       : run_command
+           ,'fetch'     : fetch_command
+           ,'parse'     : parse_command
+           ,'load'      : load_command
+           ,'query'     : query_command
+           ,'status'    : status_command
+           ,'live'      : live_command
+           ,'inventory' : inventory_command
+           ,'shard'     : shard_command
+           ,'daemon'    : daemon_command
+           ,'request'   : request_command}
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(f"usage: python cli.py {{{','.join(commands)}}} [args]  (see the top of cli.py)")
+        sys.exit(1)
+
+    sys.exit(commands[sys.argv[1]](*parse_args(sys.argv[2:])))
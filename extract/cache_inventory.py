@@ -0,0 +1,391 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from extract.html_cache import DirectoryCache, SqliteCache, get_cache
+from transform.parse_engines import pbp_table_bytes_pattern, in_comment
+
+### inventory of the html cache: what is cached, how big, its hash, and whether it is a usable page ###
+#
+# scan walks data/html/{yyyy-mm-dd}/ with os.scandir, one date directory per pool thread, and keeps one row per
+# page in data/cache_inventory.db. A file whose size and mtime match its inventory row is not read again, so a
+# rescan of an unchanged tree only stats files. The sqlite cache backend has no mtimes, its pages are read back in
+# batches and decompressed / checked on the same pool.
+#
+# status of a page:
+#   ok            complete page (pbp pages have a visible pbp table)
+#   empty         zero bytes
+#   rate_limited  a cached "429 Too Many Requests" body
+#   error_page    a cached "Page Not Found" / error body
+#   truncated     no closing </html>, the download stopped part way
+#   no_pbp_table  a complete pbp page without a pbp table
+#
+# python cli.py inventory scan | report [start] [end] | invalid | requeue
+# python cli.py parse [start] [end] --inventory      parse-only rerun of the ok pages, no per-file existence checks
+
+inventory_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache_inventory.db'))
+
+scan_workers = 8  # threads scanning date directories (stat, read and hash release the GIL)
+scan_batch_size = 500  # pages read from the sqlite backend at a time
+
+statuses = ['ok', 'empty', 'rate_limited', 'error_page', 'truncated', 'no_pbp_table']
+
+rate_limited_pattern = re.compile(rb'\b429\b|too many requests|rate limit', re.IGNORECASE)
+error_page_pattern = re.compile(rb'page not found|404 error|500 internal server error|service unavailable', re.IGNORECASE)
+title_pattern = re.compile(rb'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+html_end_pattern = re.compile(rb'</html\s*>\s*$', re.IGNORECASE)
+
+def check_page(key  : str
+              ,page : bytes) -> str:
+    """
+    Classify a cached page (raw bytes) without parsing it.
+
+    Returns status (see statuses).
+    """
+
+    if not page:
+        return 'empty'
+
+    title = title_pattern.search(page, 0, 4096)
+    head = title.group(1) if title else page if len(page) < 2048 else b''  # error bodies are short, or say what they are in the title
+
+    if rate_limited_pattern.search(head):
+        return 'rate_limited'
+    if error_page_pattern.search(head):
+        return 'error_page'
+    if not html_end_pattern.search(page[-1024:]):
+        return 'truncated'
+
+    if key.startswith('pbp_') and not any(not in_comment(page, match.start()) for match in pbp_table_bytes_pattern.finditer(page)):
+        return 'no_pbp_table'
+
+    return 'ok'
+
+def is_date(name : str) -> bool:
+
+    try:
+        datetime.strptime(name, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+class CacheInventory:
+    """
+    SQLite record of every cached page: key -> game date, size, mtime, sha1 and status.
+    """
+
+    def __init__(self
+                ,path : str = inventory_db):
+
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS pages (key        TEXT PRIMARY KEY
+                                                                   ,game_date  TEXT NOT NULL
+                                                                   ,size       INTEGER NOT NULL
+                                                                   ,mtime      REAL
+                                                                   ,sha1       TEXT NOT NULL
+                                                                   ,status     TEXT NOT NULL
+                                                                   ,scanned_at TEXT NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_game_date ON pages (game_date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_status ON pages (status)")
+
+    def known(self) -> dict:
+        """
+        Returns dict of key -> (size, mtime, sha1, status) for every inventoried page.
+        """
+
+        with self._lock:
+            rows = self._conn.execute("SELECT key, size, mtime, sha1, status FROM pages").fetchall()
+
+        return {key : (size, mtime, sha1, status) for key, size, mtime, sha1, status in rows}
+
+    def replace(self
+               ,records : list):
+        """
+        Make records (key, game_date, size, mtime, sha1, status) the whole inventory, in one transaction.
+        """
+
+        now = datetime.now().isoformat(timespec='seconds')
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.executemany("INSERT INTO pages (key, game_date, size, mtime, sha1, status, scanned_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+                                  ,[record + (now,) for record in records])
+
+    def remove(self
+              ,keys : list):
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pages WHERE key = ?", [(key,) for key in keys])
+
+    def pages(self
+             ,start_date : str = None
+             ,end_date   : str = None
+             ,status     : str = None
+             ,prefix     : str = None) -> list:
+        """
+        Returns list of (key, game_date, status) ordered by date and key, filtered by inclusive yyyy-mm-dd range,
+        status (or 'invalid' for anything but ok) and key prefix.
+        """
+
+        sql = "SELECT key, game_date, status FROM pages WHERE game_date BETWEEN ? AND ?"
+        params = [start_date or '0000-00-00', end_date or '9999-99-99']
+
+        if status == 'invalid':
+            sql += " AND status != 'ok'"
+        elif status:
+            sql += " AND status = ?"
+            params.append(status)
+
+        if prefix:
+            sql += " AND key LIKE ?"
+            params.append(f"{prefix}%")
+
+        with self._lock:
+            return self._conn.execute(sql + " ORDER BY game_date, key", params).fetchall()
+
+    def summary(self) -> dict:
+        """
+        Returns dict of status -> (pages, bytes).
+        """
+
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*), SUM(size) FROM pages GROUP BY status").fetchall()
+
+        return {status : (count, size) for status, count, size in rows}
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_inventory = None
+
+def get_inventory() -> CacheInventory:
+    """
+    Returns the process-wide inventory (opened on first use).
+    """
+
+    global _inventory
+
+    if _inventory is None:
+        _inventory = CacheInventory()
+
+    return _inventory
+
+
+### scanning ###
+
+def scan_date_dir(date_path : str
+                 ,game_date : str
+                 ,known     : dict) -> list:
+    """
+    Pool task: stat every page in one data/html/{yyyy-mm-dd}/ directory, reading and hashing only files that are
+    new or whose size or mtime changed since the last scan.
+
+    Returns list of (key, game_date, size, mtime, sha1, status).
+    """
+
+    records = []
+
+    with os.scandir(date_path) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+
+            stat = entry.stat()
+            previous = known.get(entry.name)
+
+            if previous is not None and previous[0] == stat.st_size and previous[1] == stat.st_mtime:
+                records.append((entry.name, game_date, stat.st_size, stat.st_mtime, previous[2], previous[3]))
+                continue
+
+            with open(entry.path, 'rb') as page_file:
+                page = page_file.read()
+
+            records.append((entry.name, game_date, stat.st_size, stat.st_mtime, hashlib.sha1(page).hexdigest(), check_page(entry.name, page)))
+
+    return records
+
+def scan_directory_cache(cache   : DirectoryCache
+                        ,known   : dict
+                        ,workers : int) -> list:
+    """
+    Scan every date directory of a DirectoryCache on a pool of threads.
+
+    Returns list of inventory records.
+    """
+
+    if not os.path.isdir(cache.root):
+        return []
+
+    with os.scandir(cache.root) as entries:
+        date_dirs = [(entry.path, entry.name) for entry in entries if entry.is_dir() and is_date(entry.name)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda date_dir: scan_date_dir(date_dir[0], date_dir[1], known), sorted(date_dirs))
+
+        return [record for records in results for record in records]
+
+def check_compressed(row : tuple) -> tuple:
+    """
+    Pool task: decompress one sqlite cache row (key, game_date, blob), hash and check it.
+
+    Returns inventory record.
+    """
+
+    key, game_date, blob = row
+    page = zlib.decompress(blob)
+
+    return (key, game_date, len(blob), None, hashlib.sha1(page).hexdigest(), check_page(key, page))
+
+def scan_sqlite_cache(cache   : SqliteCache
+                     ,workers : int) -> list:
+    """
+    Read every page of a SqliteCache back in batches of scan_batch_size and check them on a pool of threads.
+    size is the compressed size, there is no mtime.
+
+    Returns list of inventory records.
+    """
+
+    records = []
+    conn = sqlite3.connect(f"file:{cache.path}?mode=ro", uri=True, check_same_thread=False)  # a cursor of its own, the cache stays usable
+
+    try:
+        cursor = conn.execute("SELECT key, game_date, html FROM pages")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                rows = cursor.fetchmany(scan_batch_size)
+                if not rows:
+                    break
+                records.extend(pool.map(check_compressed, rows))
+    finally:
+        conn.close()
+
+    return records
+
+def scan(cache     = None
+        ,inventory : CacheInventory = None
+        ,workers   : int = None) -> dict:
+    """
+    Rebuild the inventory from the cache (the configured backend unless one is given).
+
+    Returns dict of status -> number of pages.
+    """
+
+    cache = cache or get_cache()
+    inventory = inventory or get_inventory()
+    workers = workers or scan_workers
+    start = time.perf_counter()
+
+    if isinstance(cache, DirectoryCache):
+        records = scan_directory_cache(cache, inventory.known(), workers)
+    else:
+        records = scan_sqlite_cache(cache, workers)
+
+    inventory.replace(records)
+
+    counts = dict()
+    for record in records:
+        counts[record[-1]] = counts.get(record[-1], 0) + 1
+
+    logging.info(f"Inventoried {len(records)} cached pages in {time.perf_counter() - start:.2f}s: {counts}")
+
+    return counts
+
+
+### using the inventory ###
+
+def coverage(start_date : str
+            ,end_date   : str
+            ,inventory  : CacheInventory = None) -> dict:
+    """
+    Compare the pbp pages in the inventory with the games the schedule index expects between start_date and end_date.
+    Dates the schedule index has never seen can't be judged and are counted separately.
+
+    Returns dict of season -> dict of expected, cached, invalid, missing counts and unknown_dates.
+    """
+
+    from extract.extract_game_data import get_date_range, get_season, is_off_season
+    from extract.schedule import get_schedule_index
+
+    inventory = inventory or get_inventory()
+    statuses_by_key = {key : status for key, game_date, status in inventory.pages(start_date, end_date, prefix='pbp_')}
+
+    game_dates = [game_date for game_date in get_date_range(start_date, end_date) if not is_off_season(game_date.strftime('%Y-%m-%d'))]
+    schedule = get_schedule_index().get(game_dates)
+    report = dict()
+
+    for game_date in game_dates:
+        day = game_date.strftime('%Y-%m-%d')
+        season = report.setdefault(get_season(day), {'expected' : 0, 'cached' : 0, 'invalid' : 0, 'missing' : 0, 'unknown_dates' : 0})
+
+        if day not in schedule:
+            season['unknown_dates'] += 1
+            continue
+
+        for home_team in schedule[day]:
+            status = statuses_by_key.get(f"pbp_{game_date.strftime('%Y%m%d')}0{home_team}.html")
+            season['expected'] += 1
+            season['cached' if status == 'ok' else 'missing' if status is None else 'invalid'] += 1
+
+    return report
+
+def requeue_invalid(cache     = None
+                   ,inventory : CacheInventory = None) -> int:
+    """
+    Drop every page the inventory flagged from the cache and the inventory. Their games are forgotten by the job
+    manifest and their dates moved back to fetched, so the next resumed run fetches them again.
+
+    Returns number of pages requeued.
+    """
+
+    from pipeline.manifest import get_manifest
+
+    cache = cache or get_cache()
+    inventory = inventory or get_inventory()
+    invalid = inventory.pages(status='invalid')
+
+    if not invalid:
+        return 0
+
+    cache.delete_many([(key, datetime.strptime(game_date, '%Y-%m-%d')) for key, game_date, status in invalid])
+    inventory.remove([key for key, game_date, status in invalid])
+
+    by_date = dict()
+    for key, game_date, status in invalid:
+        by_date.setdefault(game_date, []).append(key)
+
+    manifest = get_manifest()
+    for game_date, keys in by_date.items():
+        manifest.requeue([key for key in keys if key.startswith('pbp_')], game_date)
+
+    logging.info(f"Requeued {len(invalid)} invalid cached pages on {len(by_date)} dates")
+
+    return len(invalid)
+
+def cached_games(start_date : str
+                ,end_date   : str
+                ,inventory  : CacheInventory = None) -> list:
+    """
+    Returns list of pbp cache keys the inventory has as ok between start_date and end_date, ready for
+    build_game_df.read_game_data_from_cache(..., verified=True).
+    """
+
+    return [key for key, game_date, status in (inventory or get_inventory()).pages(start_date, end_date, 'ok', 'pbp_')]
@@ -1,16 +1,22 @@
 import logging
-import pandas as pd
-import numpy as np
-import requests 
-import time
-import re
-import os
+import bisect
 
 from datetime import datetime, timedelta 
-from bs4 import BeautifulSoup
+
+from extract.fetch_engine import fetch_url, fetch_all
+from extract.html_cache import get_cache, store_page, read_page
+from extract.http_validators import get_validators
+from pipeline import metrics
+from pipeline.manifest import get_manifest
+
+base_url = 'https://www.basketball-reference.com'  # override to point at a local stand-in server
+use_schedule = True  # plan dates with extract/schedule.py instead of requesting every daily scoreboard
+use_manifest = True  # record fetch results in pipeline/manifest.py and back off on known failures
+revalidate_days = 3  # cached pages of games this recent are revalidated with a conditional request (bball-ref corrects pbp after the final)
 
 season_dict = {'1996-11-01' : '1997-06-17'
               ,'1997-10-30' : '1998-06-15'
+              ,'1999-02-05' : '1999-06-25'  # lockout season
               ,'1999-11-02' : '2000-06-25'
               ,'2000-10-31' : '2001-06-15'
               ,'2001-10-30' : '2002-06-12'
@@ -78,6 +84,40 @@ team_dict = {'ATL' : ["Atlanta Hawks"]
 
 first_pbp_date = '1996-11-01'  # first game on bball reference that has play-by-play stats
 
+season_starts = sorted(season_dict.keys())
+
+def get_season(game_date : str) -> str:
+    """
+    Given game_date (yyyy-mm-dd), find its season in season_dict.
+    Dates outside every season fall back to the usual Oct-Jun convention.
+
+    Returns season label, e.g. '2021-22'.
+    """
+
+    i = bisect.bisect_right(season_starts, game_date) - 1  # last season that started on or before game_date
+
+    if i >= 0 and game_date <= season_dict[season_starts[i]]:
+        end_year = int(season_dict[season_starts[i]][:4])  # seasons are named after the year they end in (the 1999 lockout season started in 1999)
+    else:
+        end_year = int(game_date[:4]) + 1 if int(game_date[5:7]) >= 8 else int(game_date[:4])
+
+    return f"{end_year - 1}-{end_year % 100:02d}"
+
+def is_off_season(game_date : str) -> bool:
+    """
+    Given game_date (yyyy-mm-dd), check whether it falls in a known gap between two seasons in season_dict.
+    Dates after the last known season are never treated as off-season (season_dict may not be updated yet).
+
+    Returns True if no games can be played on game_date.
+    """
+
+    i = bisect.bisect_right(season_starts, game_date) - 1  # last season that started on or before game_date
+
+    if i < 0 or i == len(season_starts) - 1:
+        return False  # before the first or during/after the last known season
+
+    return game_date > season_dict[season_starts[i]]
+
 def get_date_parts(date : datetime) -> tuple:
     
     """
@@ -101,6 +141,8 @@ def get_soup(html : str):
     Return soup of html.
     """
 
+    from bs4 import BeautifulSoup  # only the scoreboard fallback parses with bs4
+
     try:
         soup = BeautifulSoup(html, features='html.parser')
 
@@ -130,28 +172,6 @@ def abbrev_url_to_file_name(url : str) -> str:
     
     return url_tail
 
-def get_full_file_path(file_name : str
-                      ,date      : datetime) -> str:
-    """
-    Given file_name and date, ensure correct directory exists: lawlers_law/data/html/{date}/
-
-    Returns full_file_path of corresponding directory.
-    """
-
-    script_path = os.path.dirname(__file__)  # get directory of this script
-    file_path = os.path.join(script_path, f"../data/html/{date.strftime('%Y-%m-%d')}/")  # use script_path to access lawlers_law/data/html directory
-    file_path = os.path.abspath(os.path.realpath(file_path))  # ensure file path is readable (changes /extract/../data to /lawlers/data/)
-
-    # ensure file path exists
-    if not os.path.exists(file_path):
-        os.makedirs(file_path)  # if not exists, create it
-        logging.info(f"New directory created: {file_path}")
-
-    full_file_path = file_path + '/' + file_name  # add file_name to get full_file_path
-
-    return full_file_path
-
-
 def extract_home_teams(date_html : str
                     ,game_date : str) -> list:
     """
@@ -200,54 +220,87 @@ def write_html(url     : str
     
     """
     Given a url, abbreviation, game_date scrape the corresponding html using requests.
+    The request waits on the shared rate limiter and reuses the pooled session from fetch_engine.
 
     Returns html and response_code.
     """
     
-    response_html = ''
-    response_code = 0
-    
-    full_file_path = get_full_file_path(abbrev, date)
-    
-    time.sleep(2)  # sleep to not overwhelm bball-ref with requests (will get banned)
-
-    
-    with requests.Session() as session:
-        response = session.get(url)  # request contents of url
-        response_html = response.text   # parse contents for html
-        response_code = response.status_code  # parse contents for status_code
+    response_html, response_code = fetch_url(url)  # request contents of url (rate limited)
         
-        if response_code == 200:  # successful response
-            
-            with open(full_file_path, 'w') as html_file:  # write html to file
-                html_file.write(response_html)
+    if response_code == 200:  # successful response
+        response_html = store_page(abbrev, date, response_html)  # write html to cache (pbp pages trimmed)
+
+    if use_manifest:
+        record_fetch(abbrev, date, response_code)
         
     return response_html, response_code
 
 
+def record_fetch(abbrev        : str
+                ,date          : datetime
+                ,response_code : int):
+    """
+    Record the outcome of a fetch in the job manifest (failed pages are backed off, not silently dropped).
+    """
+
+    if response_code == 200:
+        get_manifest().mark_games([abbrev], date.strftime('%Y-%m-%d'), 'fetched')
+    else:
+        logging.info(f'{abbrev} returned {response_code}, recorded as failed')
+        get_manifest().mark_failed(abbrev, date.strftime('%Y-%m-%d'), response_code)
+
+
+def write_html_batch(url_dict    : dict
+                    ,date        : datetime
+                    ,conditional : bool = False) -> dict:
+    """
+    Given dict of abbrev -> url for one date, scrape all of them concurrently using the fetch_engine pool.
+    Successful responses are written to the cache. With conditional the pages are already cached and only
+    a changed page (200) is recorded, a 304 or a failed revalidation leaves the cached page and manifest as they are.
+
+    Returns dict of abbrev -> (html, response_code).
+    """
+
+    results, stats = fetch_all(list(url_dict.values()), conditional=conditional)
+    html_dict = dict()
+
+    for abbrev, url in url_dict.items():
+        response_html, response_code = results[url]
+
+        if response_code == 200:  # successful response
+            response_html = store_page(abbrev, date, response_html)  # write html to cache (pbp pages trimmed)
+
+        if use_manifest and (response_code == 200 or not conditional):
+            record_fetch(abbrev, date, response_code)
+
+        html_dict[abbrev] = (response_html, response_code)
+
+    return html_dict
+
+
 def check_for_html(url  : str 
               ,abbrev    : str
               ,game_date : datetime) -> tuple:
 
     """
-    Given a url, abbreviation, game_date we look for the corresponding html locally.
+    Given a url, abbreviation, game_date we look for the corresponding html in the cache.
     Write/read the html depending on whether or not it exists. 
     
     Returns the html and response_code of request for the html.
     """
 
-    full_file_path = get_full_file_path(abbrev, game_date)
+    cache = get_cache()
 
-    if os.path.exists(full_file_path):
+    if cache.exists(abbrev, game_date):
         logging.info(f'{abbrev} already exists locally. Reading...')
         response_code = 200 # simulate successful response
-
-        with open(full_file_path, 'r') as read_file:
-            html = read_file.read()
+        html = cache.read(abbrev, game_date)
+        metrics.incr('html_cache_hits')
         
     else:
         logging.info(f'{abbrev} does not yet exist. Writing...')
         html, response_code = write_html(url, abbrev, game_date)
+        metrics.incr('html_cache_misses')
 
     return html, response_code
 
@@ -258,24 +311,115 @@ def get_all_games_on_date(game_date  : datetime
     For each date and list of home_teams, and search for the corresponding html
     for each game. (date / home_team combo) 
 
-    If we have the html for the game already, we iterate to the next home_team.
-    If we don't have the html, scrape it from bball ref and write it locally. 
+    If we have the html for the game already, we read it from the cache.
+    Games we don't have are scraped from bball ref concurrently and written to the cache. 
+    Cached games from the last revalidate_days are revalidated with a conditional request if their
+    validators were recorded, so a page corrected after it was cached is picked up for the cost of a 304.
 
     Returns dictionary containing all game html.
     """
     
+    cache = get_cache()
     format_date = game_date.strftime("%Y%m%d")
     game_html_dict = dict()
+    missing_url_dict = dict()
+    revalidate_url_dict = dict()
+    recent = (datetime.today() - game_date).days < revalidate_days
     
     for home_team in home_teams:
-        game_url = f"https://www.basketball-reference.com/boxscores/pbp/{format_date}0{home_team}.html"
+        game_url = f"{base_url}/boxscores/pbp/{format_date}0{home_team}.html"
         abbrev = abbrev_url_to_file_name(game_url)
-        game_html, game_response_code = check_for_html(game_url, abbrev, game_date)
-        
-        game_html_dict[abbrev] = game_html
+
+        if recent and cache.exists(abbrev, game_date) and get_validators().get(game_url):
+            logging.info(f'{abbrev} exists locally but is recent. Revalidating...')
+            revalidate_url_dict[abbrev] = game_url
+
+        elif cache.exists(abbrev, game_date):
+            logging.info(f'{abbrev} already exists locally. Reading...')
+            game_html_dict[abbrev] = read_page(abbrev, game_date)
+            metrics.incr('html_cache_hits')
+
+        elif use_manifest and get_manifest().in_backoff(abbrev):
+            logging.info(f'{abbrev} failed recently. Skipping until its retry time...')
+            metrics.incr('games_in_backoff')
+
+        else:
+            logging.info(f'{abbrev} does not yet exist. Writing...')
+            missing_url_dict[abbrev] = game_url
+            metrics.incr('html_cache_misses')
+
+    if missing_url_dict:
+        fetched_dict = write_html_batch(missing_url_dict, game_date)
+        game_html_dict.update({abbrev : html for abbrev, (html, response_code) in fetched_dict.items()
+                               if response_code == 200 or not use_manifest})  # failed pages are in the manifest, not parsed as games
+
+    if revalidate_url_dict:
+        revalidated_dict = write_html_batch(revalidate_url_dict, game_date, conditional=True)
+        game_html_dict.update({abbrev : html if response_code == 200 else read_page(abbrev, game_date)  # 304, or the server failed: keep the cached page
+                               for abbrev, (html, response_code) in revalidated_dict.items()})
+        metrics.incr('html_revalidated', len(revalidated_dict))
+
+    game_html_dict = {abbrev : game_html_dict[abbrev] for abbrev in sorted(game_html_dict)}  # keep output order independent of fetch order
         
     return game_html_dict
 
+def get_home_teams_from_scoreboard(game_date : datetime) -> list:
+    """
+    Given a date, read (or scrape) bball-ref's daily scoreboard page and pull out the home teams.
+
+    Returns list of home teams and the page's response_code (no home teams unless it is 200).
+    """
+
+    year, month, day = get_date_parts(game_date)
+    date_url = f'{base_url}/boxscores/?month={month}&day={day}&year={year}'
+    date_file = f"{game_date.strftime('%Y-%m-%d')}.html"  # file_name is formatted yyyy-mm-dd.html
+    date_html, date_response_code = check_for_html(date_url, date_file, game_date)
+
+    if date_response_code != 200:  # a throttled or failed page says nothing about the games on the date
+        return [], date_response_code
+
+    return extract_home_teams(date_html, game_date), date_response_code
+
+
+def iter_game_html_between_dates(start_game_date : str
+                                ,end_game_date   : str
+                                ,skip_dates      : set = None):
+    """
+    Generator version of get_game_html_between_dates. Walks the inclusive date range one day at a time,
+    so only one day of html is held in memory. Dates (yyyy-mm-dd) in skip_dates are not visited.
+
+    With use_schedule the home teams come from the schedule planner (extract/schedule.py) and the daily
+    scoreboard page is only requested for dates the planner could not resolve.
+
+    Yields game_date and dictionary of that day's game htmls.
+    """
+
+    game_dates = get_date_range(start_game_date, end_game_date)
+
+    if skip_dates:
+        game_dates = [game_date for game_date in game_dates if game_date.strftime('%Y-%m-%d') not in skip_dates]
+
+    if use_schedule:
+        from extract.schedule import plan_game_dates, get_schedule_index  # schedule imports this module
+        with metrics.timer('schedule'):
+            date_plan = plan_game_dates(game_dates)
+    else:
+        date_plan = [(game_date, None) for game_date in game_dates]
+
+    for game_date, home_teams in date_plan:
+        if home_teams is None:
+            home_teams, response_code = get_home_teams_from_scoreboard(game_date)
+
+            if response_code != 200:  # the manifest has the scoreboard as failed, the date is revisited by the next resumed run
+                logging.info(f"Scoreboard for {game_date.strftime('%Y-%m-%d')} returned {response_code}, its games are not planned")
+            elif use_schedule:
+                get_schedule_index().record({game_date.strftime('%Y-%m-%d') : home_teams})
+
+        game_html_dict = get_all_games_on_date(game_date, home_teams)  # get dict of all game_htmls
+
+        yield game_date, game_html_dict
+
+
 def get_game_html_between_dates(start_game_date : datetime 
                                 ,end_game_date  : datetime):
     """
@@ -288,19 +432,7 @@ def get_game_html_between_dates(start_game_date : datetime
     Returns dictionary of all game htmls between dates.
     """
 
-    game_dates = get_date_range(start_game_date, end_game_date)
-    all_html_list = []
-
-    for game_date in game_dates:
-        year, month, day = get_date_parts(game_date)
-        date_url = f'https://www.basketball-reference.com/boxscores/?month={month}&day={day}&year={year}'
-        date_file = f"{game_date.strftime('%Y-%m-%d')}.html"  # file_name is formatted yyyy-mm-dd.html
-        date_html, date_response_code = check_for_html(date_url, date_file, game_date)
-        
-        home_teams = extract_home_teams(date_html, game_date)
-        game_html_dict = get_all_games_on_date(game_date, home_teams)  # get dict of all game_htmls
-
-        all_html_list.append(game_html_dict)  # store html dict in list
+    all_html_list = [game_html_dict for game_date, game_html_dict in iter_game_html_between_dates(start_game_date, end_game_date)]
 
     all_html_dict = {key : value for html_dict in all_html_list for key, value in html_dict.items()}  # concatenate list of dicts into 1 dict
 
@@ -0,0 +1,469 @@
+import fcntl
+import logging
+import os
+import random
+import threading
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from extract.http_validators import get_validators
+from pipeline import metrics
+
+### rate limited, pooled, adaptive http client for every bball-ref request ###
+#
+# - one token bucket caps requests across all workers (SharedTokenBucket across processes, see pipeline/shards.py)
+# - the session asks for every encoding urllib3 can decode (gzip, deflate, plus br / zstd when installed)
+# - a 429 or 503 halves the limiter's rate for every worker and pauses it for the Retry-After the server asked for,
+#   each successful response then adds a rate_increase share back, up to requests_per_second (AIMD)
+# - connection errors, timeouts and 429 / 5xx responses are retried up to max_attempts times, with full jitter
+#   backoff when the server gave no Retry-After
+# - with conditional=True the ETag / Last-Modified stored for the url (extract/http_validators.py) are sent back
+#   and an unchanged page comes back as a 304 with empty html
+# Bytes on the wire, bytes saved by compression and by 304s, retries and throttle responses are counted in
+# transfer_stats() (and in the metrics registry when it is on).
+
+requests_per_second = 0.5  # global cap across all workers (0.5/s matches the old flat 2 second sleep, bball-ref bans aggressive scrapers)
+max_workers = 4  # size of the fetch worker pool
+
+request_timeout = 30  # seconds to connect / between bytes, a stalled connection used to hold its worker forever
+max_attempts = 4  # per url, counting the first request
+backoff_base = 2.0  # seconds, retry n sleeps uniform(0, min(backoff_cap, backoff_base * 2 ** n))
+backoff_cap = 60.0
+max_retry_after = 900  # longest Retry-After honoured, in seconds
+
+min_requests_per_second = 0.02  # the rate never backs off below this
+rate_decrease = 0.5  # rate multiplier on a throttle response
+rate_increase = 0.02  # share of requests_per_second added back per successful response
+
+throttle_codes = {429, 503}
+retry_codes = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every fetch worker.
+
+    Tokens refill at `rate` per second up to `capacity`. A worker that finds the bucket empty
+    reserves the next token (the count goes negative) and sleeps outside the lock until it is due,
+    so the cap holds no matter how many workers are waiting.
+    """
+
+    def __init__(self
+                ,rate     : float
+                ,capacity : int = 1):
+
+        self.rate = rate
+        self.max_rate = rate  # what the rate recovers to after throttling
+        self.capacity = capacity
+        self.throttled_at = 0.0
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one token, blocking until it is available.
+
+        Returns seconds spent waiting.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)  # refill since last call
+            self._last = now
+            self._tokens -= 1  # reserve a token (may go negative)
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    def pause(self
+             ,seconds : float):
+        """
+        Hold every worker back: no token is handed out for the next `seconds`.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)  # the next reservation is due in `seconds`
+
+
+class SharedTokenBucket:
+    """
+    Token bucket shared by every process (and every host) that points at the same state file.
+
+    The file holds the wall clock time the next request may go out. acquire() takes an exclusive flock,
+    reserves that slot and pushes it 1 / rate further, then sleeps outside the lock until the slot is due.
+    Hosts sharing the file should keep their clocks in sync (ntp), a host running ahead would get ahead of the cap.
+    """
+
+    def __init__(self
+                ,path : str
+                ,rate : float):
+
+        self.path = path
+        self.rate = rate
+        self.max_rate = rate
+        self.throttled_at = 0.0
+        self._lock = threading.Lock()  # set_rate changes rate under it, same as TokenBucket
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _take_slot(self
+                  ,not_before : float
+                  ,step       : float) -> float:
+        """
+        Under the file lock, take the first slot at or after not_before and push the next one step seconds past it.
+
+        Returns the slot's wall clock time.
+        """
+
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            f.seek(0)
+            raw = f.read().strip()
+            slot = max(not_before, float(raw) if raw else 0.0)
+            f.seek(0)
+            f.truncate()
+            f.write(repr(slot + step))
+            f.flush()
+
+        return slot
+
+    def acquire(self) -> float:
+        """
+        Take the next slot of the shared budget, blocking until it is due.
+
+        Returns seconds spent waiting.
+        """
+
+        now = time.time()
+        wait = self._take_slot(now, 1 / self.rate) - now
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    def pause(self
+             ,seconds : float):
+        """
+        Hold every process sharing the file back for `seconds` (a Retry-After applies to the whole host).
+        """
+
+        self._take_slot(time.time() + seconds, 0.0)
+
+
+class TransferStats:
+    """
+    Thread-safe counters of what the http client did, since the process started.
+    """
+
+    names = ['requests', 'retries', 'throttled', 'not_modified', 'connection_errors'
+            ,'bytes_on_wire', 'bytes_decoded', 'bytes_saved_compression', 'bytes_saved_not_modified']
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.names, 0)
+
+    def add(self
+           ,**counts):
+
+        with self._lock:
+            for name, value in counts.items():
+                self._counts[name] += value
+
+        for name, value in counts.items():
+            metrics.incr(f"http_{name}", value)
+
+    def snapshot(self) -> dict:
+
+        with self._lock:
+            return dict(self._counts)
+
+_stats = TransferStats()
+
+def transfer_stats() -> dict:
+    """
+    Returns dict of the http client's counters (requests, retries, throttled, not_modified, bytes on the wire and saved).
+    """
+
+    return _stats.snapshot()
+
+
+def build_session(pool_size : int) -> requests.Session:
+    """
+    Build a requests session with a keep-alive connection pool large enough for pool_size workers.
+
+    Returns session.
+    """
+
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING  # every encoding urllib3 can decode here
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)  # every request goes to one host
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+_session = None
+_limiter = None
+_shared_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide pooled session (created on first use).
+    """
+
+    global _session
+
+    with _shared_lock:
+        if _session is None:
+            _session = build_session(max_workers)
+
+    return _session
+
+def get_limiter() -> TokenBucket:
+    """
+    Returns the process-wide limiter (created on first use with requests_per_second).
+    """
+
+    global _limiter
+
+    with _shared_lock:
+        if _limiter is None:
+            _limiter = TokenBucket(requests_per_second)
+
+    return _limiter
+
+def set_rate(rate : float):
+    """
+    Change the global requests-per-second cap. Takes effect for all workers immediately.
+    """
+
+    global requests_per_second
+
+    requests_per_second = rate
+    limiter = get_limiter()
+
+    with limiter._lock:
+        limiter.rate = rate
+        limiter.max_rate = rate
+
+def throttle(limiter     : TokenBucket
+            ,retry_after : float = None):
+    """
+    Back off after a throttle response: cut the limiter's rate by rate_decrease (once per burst of responses
+    that were already in flight) and pause it for retry_after seconds, or one request interval.
+    """
+
+    with limiter._lock:
+        now = time.monotonic()
+
+        if now - limiter.throttled_at >= max_workers / limiter.rate:
+            limiter.rate = max(min_requests_per_second, limiter.rate * rate_decrease)
+            limiter.throttled_at = now
+            logging.info(f"Throttled, request rate lowered to {limiter.rate:.3f}/s")
+
+    limiter.pause(retry_after if retry_after is not None else 1 / limiter.rate)
+
+def recover(limiter : TokenBucket):
+    """
+    Add rate_increase of the limiter's max_rate back to its rate after a successful response, up to max_rate.
+    """
+
+    if limiter.rate < limiter.max_rate:
+        with limiter._lock:
+            limiter.rate = min(limiter.max_rate, limiter.rate + rate_increase * limiter.max_rate)
+
+def retry_after_seconds(value : str) -> float:
+    """
+    Parse a Retry-After header, either delay seconds or an http date.
+
+    Returns seconds to wait (capped at max_retry_after), or None if value is missing or malformed.
+    """
+
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max_retry_after, max(0.0, seconds))
+
+def backoff_seconds(retry : int) -> float:
+    """
+    Returns full jitter backoff before retry number `retry` (0 based).
+    """
+
+    return random.uniform(0, min(backoff_cap, backoff_base * 2 ** retry))
+
+def record_transfer(url      : str
+                   ,response : requests.Response):
+    """
+    Count a response's wire and decoded bytes, and store the validators of a full page.
+    """
+
+    decoded = len(response.content)
+
+    try:
+        on_wire = response.raw.tell()  # bytes read off the socket, before decoding
+    except (AttributeError, OSError):
+        on_wire = 0
+
+    on_wire = on_wire or decoded
+    _stats.add(requests=1, bytes_on_wire=on_wire, bytes_decoded=decoded, bytes_saved_compression=max(0, decoded - on_wire))
+
+    if response.status_code == 200:
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+        if etag or last_modified:
+            get_validators().record(url, etag, last_modified, decoded)
+
+def share_limiter(path : str
+                 ,rate : float = None) -> SharedTokenBucket:
+    """
+    Replace this process's limiter with a SharedTokenBucket on path, so every process using the same
+    path draws from one requests_per_second budget (see pipeline/shards.py).
+
+    Returns the shared limiter.
+    """
+
+    global _limiter
+
+    with _shared_lock:
+        _limiter = SharedTokenBucket(path, rate or requests_per_second)
+
+    return _limiter
+
+
+def fetch_url(url         : str
+             ,session     : requests.Session = None
+             ,limiter     : TokenBucket = None
+             ,conditional : bool = False) -> tuple:
+    """
+    Wait for a token then GET url on the pooled session. Connection errors, timeouts, 429 and 5xx responses
+    are retried (see the top of this module), a throttle response slows the limiter for every worker.
+    With conditional, the validators stored for url are sent and an unchanged page returns code 304 and empty html.
+
+    Returns html and response_code (of the last attempt).
+    """
+
+    session = session or get_session()
+    limiter = limiter or get_limiter()
+    headers = get_validators().headers(url) if conditional else dict()
+
+    for attempt in range(max_attempts):
+        metrics.add_time('rate_limit_sleep', limiter.acquire())
+        last_attempt = attempt + 1 == max_attempts
+
+        try:
+            with metrics.timer('fetch'):
+                response = session.get(url, headers=headers, timeout=request_timeout)  # request contents of url
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _stats.add(connection_errors=1)
+
+            if last_attempt:
+                raise
+
+            logging.info(f"{e.__class__.__name__} fetching {url}, retry {attempt + 1} of {max_attempts - 1}")
+            _stats.add(retries=1)
+            time.sleep(backoff_seconds(attempt))
+            continue
+
+        record_transfer(url, response)
+        metrics.incr('http_responses', labels={'code' : response.status_code})
+        metrics.incr('bytes_fetched', len(response.content))
+
+        retry_after = None
+
+        if response.status_code in throttle_codes:
+            retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+            _stats.add(throttled=1)
+            throttle(limiter, retry_after)
+
+        if response.status_code not in retry_codes or last_attempt:
+            break
+
+        logging.info(f"{url} returned {response.status_code}, retry {attempt + 1} of {max_attempts - 1}")
+        _stats.add(retries=1)
+
+        if retry_after is None:  # a Retry-After already paused the limiter
+            time.sleep(backoff_seconds(attempt))
+
+    if response.status_code == 304:
+        validators = get_validators().get(url)
+        _stats.add(not_modified=1, bytes_saved_not_modified=validators[2] if validators else 0)
+
+    if response.status_code in (200, 304):
+        recover(limiter)
+
+    return response.text, response.status_code
+
+
+def fetch_all(urls        : list
+             ,workers     : int = None
+             ,rate        : float = None
+             ,conditional : bool = False) -> tuple:
+    """
+    Fetch every url on a bounded pool of workers behind one shared token bucket.
+    If rate is given a dedicated limiter is used, otherwise the global one. conditional is passed to fetch_url.
+
+    Returns dict of url -> (html, response_code) and dict of throughput and transfer stats.
+    """
+
+    workers = workers or max_workers
+    limiter = TokenBucket(rate) if rate else get_limiter()
+    session = get_session()
+
+    results = dict()
+    responses = []
+    start = time.monotonic()
+    before = transfer_stats()
+
+    def fetch(url):
+        try:
+            return url, fetch_url(url, session, limiter, conditional)
+        except requests.RequestException as e:
+            logging.error(f"The following error occurred when fetching {url}:\n{e}")
+            metrics.incr('http_errors')
+            return url, ('', 0)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for url, result in pool.map(fetch, urls):
+            results[url] = result
+            responses.append(result)
+
+    elapsed = time.monotonic() - start
+    n_bytes = sum(len(html) for html, _ in responses)
+    after = transfer_stats()  # other fetches running at the same time are counted here too
+
+    stats = {'requests'            : len(responses)
+            ,'ok'                  : sum(1 for _, code in responses if code == 200)
+            ,'bytes'               : n_bytes
+            ,'seconds'             : elapsed
+            ,'requests_per_second' : len(responses) / elapsed if elapsed > 0 else 0.0
+            ,'rate'                : limiter.rate
+            ,**{name : after[name] - before[name] for name in TransferStats.names if name != 'requests'}}
+
+    if responses:
+        logging.info(f"Fetched {stats['requests']} pages ({stats['ok']} ok, {stats['not_modified']} not modified, {n_bytes} chars, "
+                     f"{stats['bytes_on_wire']} bytes on the wire, {stats['bytes_saved_compression'] + stats['bytes_saved_not_modified']} saved) "
+                     f"in {elapsed:.2f}s = {stats['requests_per_second']:.2f} req/s with {workers} workers, "
+                     f"{stats['throttled']} throttled, {stats['retries']} retries, rate now {limiter.rate:.2f}/s")
+
+    return results, stats
@@ -0,0 +1,438 @@
+import logging
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+
+from datetime import datetime
+
+from pipeline import metrics
+from transform.parse_engines import trim_page
+
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))  # lawlers_law/data/
+html_dir = os.path.join(data_path, 'html')  # legacy layout: data/html/{date}/{key}
+cache_db = os.path.join(data_path, 'html_cache.db')  # single-file compressed store
+raw_cache_db = os.path.join(data_path, 'html_raw.db')  # untrimmed originals, only written with keep_raw_pages
+
+cache_backend = 'sqlite'  # 'sqlite' or 'directory'
+trim_pages = True  # store and read pbp pages as just their meta tags and pbp table (see parse_engines.trim_page)
+keep_raw_pages = False  # also keep the untrimmed pbp pages in raw_cache_db
+
+class DirectoryCache:
+    """
+    Legacy cache: one uncompressed file per page under data/html/{yyyy-mm-dd}/.
+
+    Directories are only created on write, lookups never touch makedirs.
+    """
+
+    def __init__(self
+                ,root : str = html_dir):
+
+        self.root = root
+
+    def path(self
+            ,key  : str
+            ,date : datetime) -> str:
+
+        return os.path.join(self.root, date.strftime('%Y-%m-%d'), key)
+
+    def exists(self
+              ,key  : str
+              ,date : datetime) -> bool:
+
+        return os.path.exists(self.path(key, date))
+
+    def read(self
+            ,key  : str
+            ,date : datetime) -> str:
+
+        with open(self.path(key, date), 'r') as read_file:
+            html = read_file.read()
+
+        metrics.incr('bytes_read', len(html))
+
+        return html
+
+    def read_trimmed(self
+                    ,key  : str
+                    ,date : datetime) -> str:
+        """
+        Memory-map the page and slice the meta tags and pbp table out of it in place, so a full legacy page
+        is never decoded or copied. Falls back to the whole page when it has no pbp table.
+
+        Returns html.
+        """
+
+        with open(self.path(key, date), 'rb') as read_file:
+            if os.fstat(read_file.fileno()).st_size == 0:
+                return ''
+
+            with mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ) as page:
+                html = trim_page(page)
+
+                if html is None:
+                    html = page[:].decode('utf-8')
+
+        metrics.incr('bytes_read', len(html))
+
+        return html
+
+    def write(self
+             ,key  : str
+             ,date : datetime
+             ,html : str):
+
+        full_file_path = self.path(key, date)
+        os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
+
+        with open(full_file_path, 'w') as html_file:
+            html_file.write(html)
+
+    def delete_many(self
+                   ,pages : list):
+        """
+        Remove a list of (key, date) from the cache, pages that are already gone are ignored.
+        """
+
+        for key, date in pages:
+            try:
+                os.remove(self.path(key, date))
+            except FileNotFoundError:
+                pass
+
+    def keys(self) -> list:
+        """
+        Returns list of (key, date) for every cached page.
+        """
+
+        found = []
+
+        for date_dir in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            try:
+                date = datetime.strptime(date_dir, '%Y-%m-%d')
+            except ValueError:
+                continue  # not a date directory
+
+            for key in sorted(os.listdir(os.path.join(self.root, date_dir))):
+                found.append((key, date))
+
+        return found
+
+
+class SqliteCache:
+    """
+    Single-file cache: every page zlib-compressed in one SQLite table keyed by abbrev_url_to_file_name.
+
+    The key set is loaded into memory when the store is opened so a hit in exists() is an O(1) set lookup.
+    A key missing from the set is looked up in the table (another process, the daemon or a shard worker,
+    may have written it since) and then in the fallback directory cache, if one is given: a page found
+    there is copied in, so a cache upgraded from the legacy data/html/ layout is migrated as it is read
+    instead of being fetched again.
+    """
+
+    def __init__(self
+                ,path     : str = cache_db
+                ,fallback : DirectoryCache = None):
+
+        self.path = path
+        self.fallback = fallback
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # shard workers share the file
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS pages (key       TEXT PRIMARY KEY
+                                                               ,game_date TEXT NOT NULL
+                                                               ,html      BLOB NOT NULL)""")
+        self._conn.commit()
+        self._keys = set(row[0] for row in self._conn.execute("SELECT key FROM pages"))
+
+    def exists(self
+              ,key  : str
+              ,date : datetime = None) -> bool:
+
+        if key in self._keys:
+            return True
+
+        with self._lock:
+            found = self._conn.execute("SELECT 1 FROM pages WHERE key = ?", (key,)).fetchone() is not None
+
+        if found:
+            self._keys.add(key)
+            return True
+
+        return self._migrate(key, date)
+
+    def _migrate(self
+                ,key  : str
+                ,date : datetime) -> bool:
+        """
+        Copy key from the fallback directory cache, if it is there.
+
+        Returns whether the page was found.
+        """
+
+        if self.fallback is None or date is None or not self.fallback.exists(key, date):
+            return False
+
+        self.write(key, date, self.fallback.read(key, date))
+        metrics.incr('html_cache_migrated')
+
+        return True
+
+    def read(self
+            ,key  : str
+            ,date : datetime = None) -> str:
+
+        with self._lock:
+            row = self._conn.execute("SELECT html FROM pages WHERE key = ?", (key,)).fetchone()
+
+        if row is None and self._migrate(key, date):
+            with self._lock:
+                row = self._conn.execute("SELECT html FROM pages WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        metrics.incr('bytes_read', len(row[0]))  # compressed bytes off disk
+
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def read_trimmed(self
+                    ,key  : str
+                    ,date : datetime = None) -> str:
+        """
+        Returns html cut down to its meta tags and pbp table (pages are stored compressed, so this can't be sliced in place;
+        pages trimmed at fetch time come back unchanged).
+        """
+
+        html = self.read(key, date)
+
+        return trim_page(html) or html
+
+    def write(self
+             ,key  : str
+             ,date : datetime
+             ,html : str):
+
+        self.write_many([(key, date, html)])
+
+    def write_many(self
+                  ,pages : list):
+        """
+        Write a list of (key, date, html) in one transaction.
+        """
+
+        rows = [(key, date.strftime('%Y-%m-%d'), zlib.compress(html.encode('utf-8'))) for key, date, html in pages]
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO pages (key, game_date, html) VALUES (?, ?, ?)", rows)
+
+        self._keys.update(row[0] for row in rows)
+
+    def delete_many(self
+                   ,pages : list):
+        """
+        Remove a list of (key, date) from the cache in one transaction.
+        """
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pages WHERE key = ?", [(key,) for key, date in pages])
+
+        self._keys.difference_update(key for key, date in pages)
+
+    def keys(self) -> list:
+        """
+        Returns list of (key, date) for every cached page.
+        """
+
+        with self._lock:
+            rows = self._conn.execute("SELECT key, game_date FROM pages ORDER BY game_date, key").fetchall()
+
+        return [(key, datetime.strptime(game_date, '%Y-%m-%d')) for key, game_date in rows]
+
+    def count(self) -> int:
+        """
+        Returns number of pages in the table (including those written by other processes).
+        """
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+
+def get_cache():
+    """
+    Returns the process-wide cache for cache_backend (opened on first use). The sqlite cache falls back to
+    the legacy data/html/ directory when it exists.
+    """
+
+    global _cache
+
+    if _cache is None:
+        if cache_backend == 'sqlite':
+            _cache = SqliteCache(fallback=DirectoryCache() if os.path.isdir(html_dir) else None)
+        else:
+            _cache = DirectoryCache()
+
+    return _cache
+
+
+_raw_cache = None
+
+def get_raw_cache() -> SqliteCache:
+    """
+    Returns the process-wide store of untrimmed pages (opened on first use).
+    """
+
+    global _raw_cache
+
+    if _raw_cache is None:
+        _raw_cache = SqliteCache(raw_cache_db)
+
+    return _raw_cache
+
+def store_page(key  : str
+              ,date : datetime
+              ,html : str):
+    """
+    Write a fetched page to the cache. With trim_pages a pbp page is stored as just its meta tags and pbp table,
+    with keep_raw_pages the original is kept in the raw store as well.
+
+    Returns the html as stored.
+    """
+
+    if trim_pages and key.startswith('pbp_'):
+        if keep_raw_pages:
+            get_raw_cache().write(key, date, html)
+
+        html = trim_page(html) or html
+
+    get_cache().write(key, date, html)
+
+    return html
+
+def read_page(key  : str
+             ,date : datetime) -> str:
+    """
+    Read a cached page, pbp pages come back trimmed when trim_pages is on.
+
+    Returns html.
+    """
+
+    cache = get_cache()
+
+    if trim_pages and key.startswith('pbp_'):
+        return cache.read_trimmed(key, date)
+
+    return cache.read(key, date)
+
+
+def trim_cache(cache      : SqliteCache
+              ,raw_cache  : SqliteCache = None
+              ,batch_size : int = 500) -> tuple:
+    """
+    Rewrite every pbp page in cache as its trimmed version, copying the original to raw_cache first if given.
+    Pages without a pbp table and pages that are already trimmed are left alone, so it can be re-run safely.
+
+    Returns number of pages trimmed and bytes saved (uncompressed).
+    """
+
+    batch = []
+    trimmed = saved = 0
+
+    for key, date in cache.keys():
+        if not key.startswith('pbp_'):
+            continue
+
+        html = cache.read(key, date)
+        trimmed_html = trim_page(html)
+
+        if trimmed_html is None or len(trimmed_html) >= len(html):
+            continue
+
+        if raw_cache is not None and not raw_cache.exists(key, date):
+            raw_cache.write(key, date, html)
+
+        batch.append((key, date, trimmed_html))
+        saved += len(html) - len(trimmed_html)
+
+        if len(batch) >= batch_size:
+            cache.write_many(batch)
+            trimmed += len(batch)
+            batch = []
+
+    if batch:
+        cache.write_many(batch)
+        trimmed += len(batch)
+
+    with cache._lock:
+        cache._conn.execute("VACUUM")  # hand the freed pages back to the filesystem
+
+    logging.info(f"Trimmed {trimmed} pages in {cache.path}, {saved} bytes saved before compression")
+
+    return trimmed, saved
+
+
+def migrate_directory_cache(source     : DirectoryCache
+                           ,target     : SqliteCache
+                           ,batch_size : int = 500) -> int:
+    """
+    Copy every page from the legacy data/html/{date}/ layout into target. Pages already in target are skipped,
+    so the migration can be re-run safely. Source files are left in place.
+
+    Returns number of pages migrated.
+    """
+
+    batch = []
+    migrated = 0
+
+    for key, date in source.keys():
+        if target.exists(key, date):
+            continue
+
+        batch.append((key, date, source.read(key, date)))
+
+        if len(batch) >= batch_size:
+            target.write_many(batch)
+            migrated += len(batch)
+            batch = []
+
+    if batch:
+        target.write_many(batch)
+        migrated += len(batch)
+
+    logging.info(f"Migrated {migrated} pages from {source.root} to {target.path}")
+
+    return migrated
+
+
+if __name__ == "__main__":
+
+    # python -m extract.html_cache migrate [html_dir] [cache_db]
+    # python -m extract.html_cache trim [--keep-raw] [cache_db]     trim the pbp pages of an existing sqlite cache in place
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        source = DirectoryCache(sys.argv[2] if len(sys.argv) > 2 else html_dir)
+        target = SqliteCache(sys.argv[3] if len(sys.argv) > 3 else cache_db)
+
+        print(f"Migrated {migrate_directory_cache(source, target)} pages into {target.path}")
+
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'trim':
+        args = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+        cache = SqliteCache(args[0] if args else cache_db)
+        raw_cache = get_raw_cache() if '--keep-raw' in sys.argv else None
+
+        before = os.path.getsize(cache.path)
+        trimmed, saved = trim_cache(cache, raw_cache)
+        print(f"Trimmed {trimmed} pages, {cache.path} went from {before} to {os.path.getsize(cache.path)} bytes")
+
+    else:
+        print('usage: python -m extract.html_cache migrate [html_dir] [cache_db] | trim [--keep-raw] [cache_db]')
+        sys.exit(1)
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+
+### ETag / Last-Modified of every page fetched, for conditional requests ###
+#
+# fetch_engine records the validators a 200 response came with. A later fetch of the same url with
+# conditional=True sends them back as If-None-Match / If-Modified-Since, and an unchanged page costs a
+# 304 with no body instead of a full download. size is the length of the page the validators belong to,
+# counted as bytes saved when the server answers 304.
+
+validators_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'http_validators.db'))
+
+class ValidatorStore:
+    """
+    Persisted url -> (etag, last_modified, size) of the last full response.
+    """
+
+    def __init__(self
+                ,path : str = validators_db):
+
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # shard workers share the file
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS validators (url           TEXT PRIMARY KEY
+                                                                    ,etag          TEXT
+                                                                    ,last_modified TEXT
+                                                                    ,size          INTEGER NOT NULL
+                                                                    ,fetched_at    REAL NOT NULL)""")
+        self._conn.commit()
+
+    def get(self
+           ,url : str) -> tuple:
+        """
+        Returns etag, last_modified and size stored for url, or None if it has none.
+        """
+
+        with self._lock:
+            return self._conn.execute("SELECT etag, last_modified, size FROM validators WHERE url = ?", (url,)).fetchone()
+
+    def headers(self
+               ,url : str) -> dict:
+        """
+        Returns the If-None-Match / If-Modified-Since headers for url (empty if nothing is stored).
+        """
+
+        row = self.get(url)
+
+        if row is None:
+            return dict()
+
+        etag, last_modified, _ = row
+        headers = dict()
+
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        return headers
+
+    def record(self
+              ,url           : str
+              ,etag          : str
+              ,last_modified : str
+              ,size          : int):
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO validators (url, etag, last_modified, size, fetched_at) VALUES (?, ?, ?, ?, ?)"
+                              ,(url, etag, last_modified, size, time.time()))
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+
+def get_validators() -> ValidatorStore:
+    """
+    Returns the process-wide validator store (opened on first use).
+    """
+
+    global _store
+
+    if _store is None:
+        _store = ValidatorStore()
+
+    return _store
@@ -0,0 +1,166 @@
+import calendar
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from datetime import datetime
+
+from extract import extract_game_data
+from extract.extract_game_data import season_dict, team_dict, get_season, is_off_season
+from extract.fetch_engine import fetch_url
+
+### schedule planner: which home teams played on which date, without a scoreboard request per day ###
+#
+# 1. dates in a known off-season gap of season_dict are skipped outright
+# 2. dates already in the schedule index are answered from it (an empty list means "no games", negative cache)
+# 3. everything else is discovered from bball-ref's monthly schedule pages, one request per month
+
+schedule_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'schedule.db'))
+
+box_score_pattern = re.compile(r'/boxscores/(\d{8})0([A-Z]{3})\.html')
+
+class ScheduleIndex:
+    """
+    Persisted date -> home teams index. Only dates that are already over are recorded,
+    so a day can't be cached before all of its games are listed.
+    """
+
+    def __init__(self
+                ,path : str = schedule_db):
+
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # shard workers share the file
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS schedule (game_date  TEXT PRIMARY KEY
+                                                                  ,home_teams TEXT NOT NULL)""")
+        self._conn.commit()
+
+    def get(self
+           ,game_dates : list) -> dict:
+        """
+        Returns dict of yyyy-mm-dd -> list of home teams for the dates that are indexed.
+        """
+
+        found = dict()
+        keys = [game_date.strftime('%Y-%m-%d') for game_date in game_dates]
+
+        with self._lock:
+            for i in range(0, len(keys), 500):  # stay under sqlite's bound parameter limit
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(f"SELECT game_date, home_teams FROM schedule WHERE game_date IN ({', '.join('?' for _ in chunk)})", chunk)
+                found.update({game_date : home_teams.split(',') if home_teams else [] for game_date, home_teams in rows})
+
+        return found
+
+    def record(self
+              ,day_dict : dict):
+        """
+        Given dict of yyyy-mm-dd -> list of home teams, store every date that is already over.
+        """
+
+        today = datetime.today().strftime('%Y-%m-%d')
+        rows = [(game_date, ','.join(sorted(home_teams))) for game_date, home_teams in day_dict.items() if game_date < today]
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO schedule (game_date, home_teams) VALUES (?, ?)", rows)
+
+
+_index = None
+
+def get_schedule_index() -> ScheduleIndex:
+    """
+    Returns the process-wide schedule index (opened on first use).
+    """
+
+    global _index
+
+    if _index is None:
+        _index = ScheduleIndex()
+
+    return _index
+
+
+def get_month_url(game_date : datetime) -> str:
+    """
+    Given a date, build the url of bball-ref's schedule page for that month of its season.
+
+    Returns month_url.
+    """
+
+    season = get_season(game_date.strftime('%Y-%m-%d'))
+    end_year = int(season[:4]) + 1
+    month = calendar.month_name[game_date.month].lower()
+
+    # a season that covers the same month twice (2019-20 bubble) has year suffixed month pages
+    for start, end in season_dict.items():
+        if start <= game_date.strftime('%Y-%m-%d') <= end and start[5:7] == end[5:7] == f"{game_date.month:02d}" and start[:4] != end[:4]:
+            month = f"{month}-{game_date.year}"
+
+    return f"{extract_game_data.base_url}/leagues/NBA_{end_year}_games-{month}.html"
+
+def extract_month_schedule(month_html : str) -> dict:
+    """
+    Pull every played game out of a monthly schedule page.
+
+    Returns dict of yyyy-mm-dd -> list of home teams.
+    """
+
+    day_dict = dict()
+
+    for raw_date, home_team in box_score_pattern.findall(month_html):
+        if home_team not in team_dict:
+            continue
+
+        game_date = f"{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:]}"
+        day_dict.setdefault(game_date, set()).add(home_team)
+
+    return {game_date : sorted(home_teams) for game_date, home_teams in day_dict.items()}
+
+
+def plan_game_dates(game_dates : list) -> list:
+    """
+    Work out which home teams played on every date in game_dates with as few requests as possible.
+
+    Returns list of (game_date, home_teams) in date order, off-season dates are left out and
+    home_teams is None for dates the planner could not resolve (caller falls back to the scoreboard page).
+    """
+
+    index = get_schedule_index()
+
+    in_season = [game_date for game_date in game_dates if not is_off_season(game_date.strftime('%Y-%m-%d'))]
+    known = index.get(in_season)
+
+    # group the unknown dates by schedule page, one request per month
+    month_dict = dict()
+    for game_date in in_season:
+        if game_date.strftime('%Y-%m-%d') not in known:
+            month_dict.setdefault(get_month_url(game_date), []).append(game_date)
+
+    for month_url, month_dates in month_dict.items():
+        try:
+            month_html, response_code = fetch_url(month_url)
+        except Exception as e:
+            logging.error(f"The following error occurred when fetching {month_url}:\n{e}")
+            continue
+
+        if response_code != 200:
+            logging.info(f"Schedule page {month_url} returned {response_code}, falling back to daily scoreboards")
+            continue
+
+        day_dict = extract_month_schedule(month_html)
+
+        for game_date in month_dates:  # dates on the page with no box score played no games (negative cache)
+            day_dict.setdefault(game_date.strftime('%Y-%m-%d'), [])
+
+        index.record(day_dict)
+        known.update({game_date : home_teams for game_date, home_teams in index.get(month_dates).items()})
+
+    skipped = len(game_dates) - len(in_season)
+    if skipped:
+        logging.info(f"Skipped {skipped} off-season dates")
+
+    return [(game_date, known.get(game_date.strftime('%Y-%m-%d'))) for game_date in in_season]
@@ -1,2 +1,3 @@
-# run the main script with no arguments (defaults start_date and end_date to yesterday's date)
-python main.py
\ No newline at end of file
+# run the full pipeline with no dates (defaults start_date and end_date to yesterday's date)
+# on the resident daemon when one is running (python cli.py daemon), its stores and http pool are already open
+python cli.py request run || python cli.py run
@@ -1,22 +1,31 @@
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 
+from extract.extract_game_data import get_season
+from transform.game_schema import csv_dtypes, to_compact
+
+csv_file_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'data/csv/'))  # get cwd, go one level up, and join data/csv to get full path
+parquet_file_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'data/parquet/'))  # season partitioned store: data/parquet/season=yyyy-yy/
+
+key_columns = ['game_date', 'home_team']  # natural key of a game
+
 def concat_all_csv(file_path : str
                     ,all_csvs : list) -> list:
 
     """
-    Reads all csv file names into dataframes. 
+    Reads all csv file names into dataframes, in either the compact or the old score string layout.
     
-    Returns all dataframes concatenated into one dataframe.
+    Returns all dataframes concatenated into one dataframe in the compact schema (transform/game_schema.py).
     """
 
     df_dict = dict()
 
     for csv in all_csvs:
         try:
-            df = pd.read_csv(file_path+csv)
-            df_dict[csv] = df.copy()
+            df = pd.read_csv(file_path+csv, dtype=csv_dtypes)
+            df_dict[csv] = to_compact(df)
         except:
             print(f"Unable to read {csv}")
         
@@ -40,5 +49,156 @@ def write_all_csv(file_path):
 
     return
 
-csv_file_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'data/csv/'))  # get cwd, go one level up, and join data/csv to get full path
-write_all_csv(csv_file_path+'/')  # run function with csv_file_path
\ No newline at end of file
+### functions below are for the incremental season partitioned parquet store ###
+
+def type_games_df(all_games_df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast a games dataframe to the store's column types, the compact schema of transform/game_schema.py
+    (partitions written before the score columns were split are read through the same cast).
+
+    Returns typed copy of all_games_df.
+    """
+
+    return to_compact(all_games_df)
+
+def get_partition_path(season    : str
+                      ,file_path : str = parquet_file_path) -> str:
+
+    return os.path.join(file_path, f"season={season}")
+
+def read_partition(season    : str
+                  ,file_path : str = parquet_file_path
+                  ,columns   : list = None) -> pd.DataFrame:
+    """
+    Reads every part file of one season partition, cast to the compact schema unless only some columns are read
+    (part files written before the score columns were split are converted on the way).
+
+    Returns dataframe (empty if the partition does not exist yet).
+    """
+
+    partition_path = get_partition_path(season, file_path)
+
+    if not os.path.isdir(partition_path):
+        return pd.DataFrame()
+
+    part_files = sorted(file for file in os.listdir(partition_path) if file.endswith('.parquet'))
+
+    if not part_files:
+        return pd.DataFrame()
+
+    season_df = pd.concat([pd.read_parquet(os.path.join(partition_path, part), columns=columns) for part in part_files]).reset_index(drop=True)
+
+    return season_df if columns else to_compact(season_df)
+
+def write_partition(season_df   : pd.DataFrame
+                   ,season      : str
+                   ,file_path   : str = parquet_file_path
+                   ,replace_all : bool = False):
+    """
+    Writes season_df as a new zstd compressed part file in the season's partition.
+    With replace_all the partition's existing part files are removed once the new one is in place.
+    """
+
+    partition_path = get_partition_path(season, file_path)
+    os.makedirs(partition_path, exist_ok=True)
+
+    old_parts = [file for file in os.listdir(partition_path) if file.endswith('.parquet')] if replace_all else []
+
+    part_name = f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.parquet"
+    tmp_path = os.path.join(partition_path, f".{part_name}.tmp")
+
+    season_df.to_parquet(tmp_path, index=False, compression='zstd')
+    os.replace(tmp_path, os.path.join(partition_path, part_name))  # readers never see a half written part
+
+    for part in old_parts:
+        os.remove(os.path.join(partition_path, part))
+
+def upsert_parquet(all_games_df : pd.DataFrame
+                  ,file_path    : str = parquet_file_path) -> int:
+    """
+    Incrementally loads all_games_df into the season partitioned parquet store, keyed on (game_date, home_team).
+
+    Only the seasons present in all_games_df are touched. New games are appended as a new part file,
+    unchanged games are skipped, and a season is only rewritten when one of its games changed.
+
+    Returns number of rows written.
+    """
+
+    if all_games_df.shape[0] == 0:
+        return 0
+
+    typed_df = type_games_df(all_games_df).drop_duplicates(subset=key_columns, keep='last')
+    seasons = typed_df['game_date'].dt.strftime('%Y-%m-%d').map(get_season)
+    n_written = 0
+
+    for season, season_df in typed_df.groupby(seasons, sort=True):
+        existing_keys = read_partition(season, file_path, columns=key_columns)
+
+        if existing_keys.shape[0] == 0:
+            write_partition(season_df, season, file_path)
+            n_written += season_df.shape[0]
+            continue
+
+        is_existing = pd.MultiIndex.from_frame(season_df[key_columns]).isin(pd.MultiIndex.from_frame(existing_keys[key_columns]))
+        new_df = season_df[~is_existing]
+        overlap_df = season_df[is_existing]
+
+        if overlap_df.shape[0] > 0:
+            existing_df = type_games_df(read_partition(season, file_path))
+            new_rows = overlap_df.set_index(key_columns)
+            old_rows = existing_df.set_index(key_columns).loc[new_rows.index, new_rows.columns]
+            same = old_rows.eq(new_rows).fillna(False) | (old_rows.isna() & new_rows.isna())  # NA == NA counts as unchanged
+
+            if not same.all(axis=None):  # something we already had changed, rewrite the season
+                merged_df = pd.concat([existing_df, season_df]).drop_duplicates(subset=key_columns, keep='last')
+                merged_df = merged_df.sort_values(key_columns).reset_index(drop=True)
+                write_partition(merged_df, season, file_path, replace_all=True)
+                n_written += season_df.shape[0]
+                continue
+
+        if new_df.shape[0] > 0:
+            write_partition(new_df, season, file_path)
+            n_written += new_df.shape[0]
+
+    return n_written
+
+def read_parquet_store(seasons   : list = None
+                      ,file_path : str = parquet_file_path
+                      ,columns   : list = None) -> pd.DataFrame:
+    """
+    Reads the parquet store. Only the partitions of the given seasons are opened (all if seasons is None).
+
+    Returns dataframe with a season column.
+    """
+
+    if not os.path.isdir(file_path):
+        return pd.DataFrame()
+
+    all_seasons = sorted(file.split('=', 1)[1] for file in os.listdir(file_path) if file.startswith('season='))
+    seasons = [season for season in all_seasons if seasons is None or season in seasons]
+
+    df_list = []
+
+    for season in seasons:
+        season_df = read_partition(season, file_path, columns)
+
+        if season_df.shape[0] > 0:
+            season_df['season'] = season
+            df_list.append(season_df)
+
+    if not df_list:
+        return pd.DataFrame()
+
+    return pd.concat(df_list).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+
+    # python -m load.load_game_data           rebuild lawler.csv from every csv in data/csv/ (with backup)
+    # python -m load.load_game_data parquet   incrementally load every csv in data/csv/ into the parquet store
+    if len(sys.argv) > 1 and sys.argv[1] == 'parquet':
+        all_csvs = [file for file in os.listdir(csv_file_path) if '.csv' in file and file != 'lawler.csv']
+        print(f"Loaded {upsert_parquet(concat_all_csv(csv_file_path+'/', all_csvs))} rows into {parquet_file_path}")
+
+    else:
+        write_all_csv(csv_file_path+'/')  # run function with csv_file_path
@@ -0,0 +1,174 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from transform.game_schema import to_compact
+
+### materialized season / team rollups of the games table, kept up to date by every load ###
+#
+# team_rollups has one row per (season, team, side, delta_bucket) with counts:
+#   games              games with a final score
+#   reached_100        games in which a team reached 100
+#   lawler_hits        reached games won by the first team to 100
+#   first_to_100       games in which this team got to 100 first
+#   first_to_100_wins  ... and went on to win
+#   wins
+# delta_bucket is the lead at 100 rounded down to delta_bucket_size (capped at max_delta_bucket), -1 if no team
+# reached 100. Every game counts once with side 'home' (its home team) and once with side 'away', so a game level
+# question (hit rate per season) reads the home rows only.
+#
+# sqlite_store.load_games reads the rows it is about to replace, and in the same transaction subtracts their
+# contributions and adds the new ones, so a reload or a corrected game never double counts and a load costs
+# O(games loaded), not O(history). The table holds at most seasons x teams x 2 x buckets rows, so any
+# dashboard query over it is a few milliseconds.
+
+delta_bucket_size = 5
+max_delta_bucket = 30  # leads of 30 and more share a bucket
+
+dimensions = ['season', 'team', 'side', 'delta_bucket']
+measures = ['games', 'reached_100', 'lawler_hits', 'first_to_100', 'first_to_100_wins', 'wins']
+
+create_sql = """CREATE TABLE IF NOT EXISTS team_rollups (season            TEXT NOT NULL
+                                                       ,team              TEXT NOT NULL
+                                                       ,side              TEXT NOT NULL
+                                                       ,delta_bucket      INTEGER NOT NULL
+                                                       ,games             INTEGER NOT NULL DEFAULT 0
+                                                       ,reached_100       INTEGER NOT NULL DEFAULT 0
+                                                       ,lawler_hits       INTEGER NOT NULL DEFAULT 0
+                                                       ,first_to_100      INTEGER NOT NULL DEFAULT 0
+                                                       ,first_to_100_wins INTEGER NOT NULL DEFAULT 0
+                                                       ,wins              INTEGER NOT NULL DEFAULT 0
+                                                       ,PRIMARY KEY (season, team, side, delta_bucket))"""
+
+increment_sql = f"""INSERT INTO team_rollups ({', '.join(dimensions + measures)}) VALUES ({', '.join('?' for _ in dimensions + measures)})
+                    ON CONFLICT (season, team, side, delta_bucket) DO UPDATE SET {', '.join(f'{measure} = {measure} + excluded.{measure}' for measure in measures)}"""
+
+def contributions(games_df : pd.DataFrame
+                 ,sign     : int = 1) -> pd.DataFrame:
+    """
+    What every game in games_df (any layout, with a season column) adds to the rollups, times sign.
+
+    Returns dataframe of dimensions + measures, one row per rollup key touched.
+    """
+
+    compact_df = to_compact(games_df)
+    seasons = games_df['season'].to_numpy(dtype=object)
+
+    has_scores = compact_df['final_away'].notna().to_numpy()
+    reached = compact_df['reached_100_bool'].fillna(False).to_numpy(dtype=bool)
+    lawler = compact_df['lawler_bool'].fillna(False).to_numpy(dtype=bool)
+    away_first = reached & (compact_df['away_at_100'].fillna(0) >= compact_df['home_at_100'].fillna(0)).to_numpy(dtype=bool)
+
+    delta = compact_df['delta_at_100'].fillna(0).to_numpy(dtype=np.int64)
+    delta_bucket = np.where(reached, np.minimum(delta // delta_bucket_size * delta_bucket_size, max_delta_bucket), -1)
+
+    win_team = compact_df['win_team'].astype(object).to_numpy()
+    sides = []
+
+    for side, team_column, first in [('home', 'home_team', reached & ~away_first), ('away', 'away_team', away_first)]:
+        teams = compact_df[team_column].astype(object).to_numpy()
+        won = has_scores & (win_team == teams)
+
+        sides.append(pd.DataFrame({'season'            : seasons
+                                  ,'team'              : teams
+                                  ,'side'              : side
+                                  ,'delta_bucket'      : delta_bucket
+                                  ,'games'             : has_scores.astype(np.int64)
+                                  ,'reached_100'       : reached.astype(np.int64)
+                                  ,'lawler_hits'       : lawler.astype(np.int64)
+                                  ,'first_to_100'      : first.astype(np.int64)
+                                  ,'first_to_100_wins' : (first & won).astype(np.int64)
+                                  ,'wins'              : won.astype(np.int64)}))
+
+    rows_df = pd.concat(sides, ignore_index=True)
+    rows_df = rows_df[rows_df['team'].notna()]
+    rows_df[measures] *= sign
+
+    return rows_df.groupby(dimensions, sort=True, as_index=False)[measures].sum()
+
+def apply_contributions(conn     : sqlite3.Connection
+                       ,rows_df  : pd.DataFrame):
+    """
+    Add rows_df (from contributions) to team_rollups. Run inside the load's transaction.
+    """
+
+    rows_df = rows_df[(rows_df[measures] != 0).any(axis=1)]
+
+    conn.executemany(increment_sql, [tuple(value.item() if hasattr(value, 'item') else value for value in row)
+                                     for row in rows_df[dimensions + measures].itertuples(index=False, name=None)])
+
+def update_rollups(conn   : sqlite3.Connection
+                  ,new_df : pd.DataFrame
+                  ,old_df : pd.DataFrame):
+    """
+    Move the rollups from old_df (the stored versions of the games being replaced) to new_df.
+    """
+
+    parts = [contributions(new_df)]
+
+    if old_df.shape[0] > 0:
+        parts.append(contributions(old_df, -1))
+
+    rows_df = pd.concat(parts, ignore_index=True).groupby(dimensions, as_index=False)[measures].sum()
+    apply_contributions(conn, rows_df)
+
+    if old_df.shape[0] > 0:  # a corrected game can leave its old key with nothing in it
+        conn.execute(f"DELETE FROM team_rollups WHERE {' AND '.join(f'{measure} = 0' for measure in measures)}")
+
+def rebuild_rollups(conn : sqlite3.Connection) -> int:
+    """
+    Recompute team_rollups from the whole games table (databases loaded before the rollups existed).
+
+    Returns number of rollup rows.
+    """
+
+    games_df = pd.read_sql_query("SELECT * FROM games", conn)
+
+    with conn:
+        conn.execute("DELETE FROM team_rollups")
+        if games_df.shape[0] > 0:
+            apply_contributions(conn, contributions(games_df))
+
+    return conn.execute("SELECT COUNT(*) FROM team_rollups").fetchone()[0]
+
+def query_rollups(conn     : sqlite3.Connection
+                 ,group_by : list = None
+                 ,season   : str = None
+                 ,team     : str = None
+                 ,side     : str = None) -> pd.DataFrame:
+    """
+    Sum the rollups by any of season, team, side and delta_bucket, optionally for one season, team or side.
+    Unless the result is per team or a side is given, only home rows are read so every game counts once.
+
+    Returns dataframe of group_by columns, the measures, hit_rate (lawler_hits / reached_100) and
+    first_to_100_win_rate.
+    """
+
+    group_by = group_by or ['season']
+
+    if any(column not in dimensions for column in group_by):
+        raise ValueError(f"Can't group by {group_by}, expected any of {dimensions}")
+
+    where = []
+    params = []
+
+    for column, value in [('season', season), ('team', team), ('side', side)]:
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+
+    if not side and 'team' not in group_by and not team and 'side' not in group_by:
+        where.append("side = 'home'")  # one row per game
+
+    sql = f"""SELECT {', '.join(group_by)}, {', '.join(f'SUM({measure}) AS {measure}' for measure in measures)}
+              FROM team_rollups
+              {'WHERE ' + ' AND '.join(where) if where else ''}
+              GROUP BY {', '.join(group_by)}
+              ORDER BY {', '.join(group_by)}"""
+
+    rollup_df = pd.read_sql_query(sql, conn, params=params)
+    rollup_df['hit_rate'] = rollup_df['lawler_hits'] / rollup_df['reached_100'].where(rollup_df['reached_100'] > 0)
+    rollup_df['first_to_100_win_rate'] = rollup_df['first_to_100_wins'] / rollup_df['first_to_100'].where(rollup_df['first_to_100'] > 0)
+
+    return rollup_df
@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import sys
+import threading
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+from load import rollups
+from load.load_game_data import get_season
+from transform.game_schema import to_legacy
+
+db_file_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'data/lawler.db'))
+
+game_columns = ['game_date', 'away_team', 'home_team', 'final_score', 'win_team', 'lose_team'
+               ,'reached_100_bool', 'lawler_bool', 'score_at_100', 'delta_at_100', 'season']
+
+create_sql = ["""CREATE TABLE IF NOT EXISTS games (game_date        TEXT NOT NULL
+                                                 ,away_team        TEXT
+                                                 ,home_team        TEXT NOT NULL
+                                                 ,final_score      TEXT
+                                                 ,win_team         TEXT
+                                                 ,lose_team        TEXT
+                                                 ,reached_100_bool INTEGER
+                                                 ,lawler_bool      INTEGER
+                                                 ,score_at_100     TEXT
+                                                 ,delta_at_100     INTEGER
+                                                 ,season           TEXT NOT NULL
+                                                 ,PRIMARY KEY (game_date, home_team))"""
+             ,"CREATE INDEX IF NOT EXISTS games_season ON games (season)"
+             ,"CREATE INDEX IF NOT EXISTS games_home_team ON games (home_team, season)"
+             ,"CREATE INDEX IF NOT EXISTS games_away_team ON games (away_team, season)"
+             ,rollups.create_sql]
+
+upsert_sql = f"""INSERT INTO games ({', '.join(game_columns)}) VALUES ({', '.join('?' for _ in game_columns)})
+                 ON CONFLICT (game_date, home_team) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in game_columns[:2] + game_columns[3:])}"""
+
+key_batch_size = 400  # (game_date, home_team) pairs per lookup of the rows a load replaces
+
+def connect(db_path : str = db_file_path) -> sqlite3.Connection:
+    """
+    Open the games database, creating the tables and indexes if needed. A database loaded before the
+    rollups existed gets them built from its games once.
+
+    Returns connection.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)  # a held connection serves the daemon's request threads
+    conn.execute("PRAGMA journal_mode = WAL")  # readers don't block the nightly load
+
+    with conn:
+        for sql in create_sql:
+            conn.execute(sql)
+
+    if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM team_rollups) AND EXISTS (SELECT 1 FROM games)").fetchone()[0]:
+        rollups.rebuild_rollups(conn)
+
+    return conn
+
+_held = None  # (db_path, connection) kept open by hold_connection
+_held_lock = threading.RLock()
+
+def hold_connection(db_path : str = None) -> sqlite3.Connection:
+    """
+    Keep one connection to db_path open until release_connection, used by every load and read that doesn't ask for
+    another database. A resident process (pipeline/daemon.py) opens the database once instead of on every load.
+
+    Returns connection.
+    """
+
+    global _held
+
+    with _held_lock:
+        release_connection()
+        db_path = os.path.abspath(db_path or db_file_path)
+        _held = (db_path, connect(db_path))
+
+        return _held[1]
+
+def release_connection():
+    """
+    Close the held connection, if any.
+    """
+
+    global _held
+
+    with _held_lock:
+        if _held is not None:
+            _held[1].close()
+            _held = None
+
+@contextmanager
+def open_db(db_path : str = None):
+    """
+    The held connection when db_path is None or the held database (one user at a time), otherwise a connection
+    of its own that is closed afterwards.
+
+    Returns context manager yielding a connection.
+    """
+
+    with _held_lock:
+        held = _held if _held is not None and (db_path is None or os.path.abspath(db_path) == _held[0]) else None
+
+        if held is not None:
+            yield held[1]
+            return
+
+    conn = connect(db_path or db_file_path)
+
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def read_stored(conn      : sqlite3.Connection
+               ,games_df  : pd.DataFrame) -> pd.DataFrame:
+    """
+    The stored versions of the games in games_df (by game_date and home_team), the rows a load will replace.
+
+    Returns games dataframe, empty if none of them are stored yet.
+    """
+
+    keys = list(games_df[['game_date', 'home_team']].itertuples(index=False, name=None))
+    parts = []
+
+    for i in range(0, len(keys), key_batch_size):
+        batch = keys[i:i + key_batch_size]
+        sql = (f"SELECT {', '.join(game_columns)} FROM games "
+               f"WHERE (game_date, home_team) IN (VALUES {', '.join('(?, ?)' for _ in batch)})")
+        parts.append(pd.read_sql_query(sql, conn, params=[value for key in batch for value in key]))
+
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=game_columns)
+
+def to_db_value(value):
+    """
+    Turn a pandas/numpy value into something sqlite3 can bind (None for missing).
+    """
+
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()  # numpy scalar -> python scalar
+
+    return value
+
+def load_games(all_games_df : pd.DataFrame
+              ,db_path      : str = None
+              ,batch_size   : int = 5000) -> int:
+    """
+    Upsert all_games_df into the games table on (game_date, home_team).
+    Every batch goes through executemany and the whole load is one transaction, so it is idempotent
+    and either fully applied or not at all. The team_rollups move by the difference between the
+    replaced rows and the new ones in the same transaction.
+
+    Returns number of rows loaded.
+    """
+
+    if all_games_df.shape[0] == 0:
+        return 0
+
+    if 'final_score' in all_games_df.columns:
+        games_df = all_games_df.copy()
+        games_df['game_date'] = pd.to_datetime(games_df['game_date']).dt.strftime('%Y-%m-%d')
+    else:  # the table keeps the "away-home" score strings
+        games_df = to_legacy(all_games_df)
+
+    games_df['season'] = games_df['game_date'].map(get_season)
+    games_df = games_df.drop_duplicates(['game_date', 'home_team'], keep='last')  # the upsert keeps the last one too
+
+    rows = [tuple(to_db_value(value) for value in row) for row in games_df[game_columns].itertuples(index=False, name=None)]
+
+    with open_db(db_path) as conn:
+        with conn:  # one transaction
+            rollups.update_rollups(conn, games_df, read_stored(conn, games_df))
+
+            for i in range(0, len(rows), batch_size):
+                conn.executemany(upsert_sql, rows[i:i + batch_size])
+
+    return len(rows)
+
+def read_games(team      : str = None
+              ,season    : str = None
+              ,db_path   : str = None) -> pd.DataFrame:
+    """
+    Games for a team (home or away) and/or season, served from the indexes.
+
+    Returns games dataframe.
+    """
+
+    where = []
+    params = []
+
+    if season:
+        where.append("season = ?")
+        params.append(season)
+
+    sql = f"SELECT {', '.join(game_columns)} FROM games"
+
+    if team:
+        team_where = ' AND '.join(where + ['{side}_team = ?'])
+        sql = (f"{sql} WHERE {team_where.format(side='home')} UNION ALL "
+               f"{sql} WHERE {team_where.format(side='away')}")  # two index lookups instead of an OR scan
+        params = params + [team] + params + [team]
+    elif where:
+        sql = f"{sql} WHERE {' AND '.join(where)}"
+
+    with open_db(db_path) as conn:
+        games_df = pd.read_sql_query(f"{sql} ORDER BY game_date, home_team", conn, params=params)
+
+    return games_df
+
+def hit_rates(group_by  : str = 'season'
+             ,db_path   : str = None) -> pd.DataFrame:
+    """
+    Lawler hit rate (share of games that reached 100 where the first team to 100 won), grouped by
+    'season', 'home_team' or 'away_team', read from the rollups.
+
+    Returns dataframe of group, games_reached_100, lawler_hits, hit_rate.
+    """
+
+    if group_by not in ['season', 'home_team', 'away_team']:
+        raise ValueError(f"Can't group by {group_by}")
+
+    if group_by == 'season':
+        rates_df = read_rollups(['season'], db_path=db_path)
+    else:
+        rates_df = read_rollups(['team'], side=group_by.split('_')[0], db_path=db_path).rename(columns={'team' : group_by})
+
+    return rates_df.rename(columns={'reached_100' : 'games_reached_100'})[[group_by, 'games_reached_100', 'lawler_hits', 'hit_rate']]
+
+def read_rollups(group_by : list = None
+                ,season   : str = None
+                ,team     : str = None
+                ,side     : str = None
+                ,db_path  : str = None) -> pd.DataFrame:
+    """
+    Counts and rates from the team_rollups by any of season, team, side and delta_bucket (see rollups.query_rollups).
+
+    Returns rollup dataframe.
+    """
+
+    with open_db(db_path) as conn:
+        rollup_df = rollups.query_rollups(conn, group_by, season, team, side)
+
+    return rollup_df
+
+def rebuild_rollups(db_path : str = None) -> int:
+    """
+    Recompute the team_rollups from every stored game.
+
+    Returns number of rollup rows.
+    """
+
+    with open_db(db_path) as conn:
+        return rollups.rebuild_rollups(conn)
+
+if __name__ == "__main__":
+
+    # python -m load.sqlite_store   load every csv in data/csv/ into data/lawler.db
+    from load.load_game_data import csv_file_path, concat_all_csv
+
+    all_csvs = [file for file in os.listdir(csv_file_path) if '.csv' in file and file != 'lawler.csv']
+
+    if not all_csvs:
+        print(f"No csvs found in {csv_file_path}")
+        sys.exit(1)
+
+    print(f"Loaded {load_games(concat_all_csv(csv_file_path+'/', all_csvs))} rows into {db_file_path}")
@@ -1,41 +1,142 @@
+import os
 import sys
 import logging 
 import time
 from datetime import datetime, timedelta
 
-from extract.extract_game_data import get_game_html_between_dates
-from transform.build_game_df import read_game_data_from_html 
+from extract.extract_game_data import get_game_html_between_dates, iter_game_html_between_dates, get_date_range
+from transform.build_game_df import read_game_data_from_html, iter_game_data_from_html
+from load.load_game_data import upsert_parquet
+from load.sqlite_store import load_games
+from pipeline import metrics
+from pipeline.manifest import get_manifest
+from pipeline.stages import pipeline
+
+def parse_day(day : tuple) -> tuple:
+    """
+    Parse stage of the pipelined run: (game_date, game_html_dict) -> (game_date, game_df).
+    """
+
+    game_date, game_html_dict = day
+
+    return game_date, read_game_data_from_html(game_html_dict)
 
 def main(start_game_date : str
-        ,end_game_date   : str):
+        ,end_game_date   : str
+        ,stream          : bool = False
+        ,resume          : bool = False
+        ,pipelined       : bool = False):
     
     start = datetime.now()
     logging.basicConfig(filename='log/lawler.log', level=logging.INFO, format='%(message)s')
     logging.info(f"***Started run at {start}\n")
 
-    all_html_dict = get_game_html_between_dates(start_game_date, end_game_date)  # write the html between dates
+    csv_path = f'data/csv/lawler_{start_game_date}_{end_game_date}.csv'
+
+    if stream or resume or pipelined:  # extract -> transform -> write one day at a time, memory stays bounded by a single day of html
+        manifest = get_manifest()
+        skip_dates = set()
+
+        if resume:  # skip every date a previous run already loaded
+            skip_dates = manifest.loaded_dates([game_date.strftime('%Y-%m-%d') for game_date in get_date_range(start_game_date, end_game_date)])
+            logging.info(f"Resuming, {len(skip_dates)} dates already loaded")
+
+        write_header = not (resume and os.path.exists(csv_path))  # a resumed run appends to what the previous run wrote
+
+        html_iter = iter_game_html_between_dates(start_game_date, end_game_date, skip_dates)
+
+        if pipelined:  # fetch, parse and load overlap, linked by bounded queues (pipeline/stages.py)
+            day_iter = pipeline(html_iter, [('parse', parse_day)])
+        else:
+            day_iter = iter_game_data_from_html(html_iter)
+
+        for game_date, game_df in day_iter:
+            day = game_date.strftime('%Y-%m-%d')
+            game_keys = [f"pbp_{game_date.strftime('%Y%m%d')}0{home_team}.html" for home_team in (game_df['home_team'] if game_df.shape[0] > 0 else [])]
+            failed_keys = set(manifest.failed_games(day))
+            loaded_keys = manifest.loaded_games(day) if resume else set()  # a resumed run only appends the games it did not load last time
+            manifest.mark_games([game_key for game_key in game_keys if game_key not in failed_keys | loaded_keys], day, 'parsed')
+            manifest.mark_date(day, 'parsed')
+
+            if game_df.shape[0] > 0:
+                new_df = game_df[[game_key not in loaded_keys for game_key in game_keys]]
+                with metrics.timer('write_csv'):
+                    new_df.to_csv(csv_path, index=False, mode='w' if write_header else 'a', header=write_header)  # append each completed day
+                with metrics.timer('load_parquet'):
+                    upsert_parquet(game_df)  # incremental load into the season partitioned store
+                with metrics.timer('load_sqlite'):
+                    load_games(game_df)  # upsert into the sqlite database
+                write_header = False
+
+            manifest.mark_games([game_key for game_key in game_keys if game_key not in failed_keys], day, 'loaded')
+            manifest.mark_date(day, 'failed' if failed_keys else 'loaded')  # failed days are revisited by the next resumed run
+            metrics.incr('dates_processed')
+
+        if metrics.enabled:
+            metrics.export()
+
+        logging.info(f"***Completed run in {datetime.now() - start}\n")
+
+        return
+
+    with metrics.timer('extract'):
+        all_html_dict = get_game_html_between_dates(start_game_date, end_game_date)  # write the html between dates
 
     all_games_df = read_game_data_from_html(all_html_dict)  # read the data from the html files
     
-    # TODO: build load function to concat all resulting dataframes into 1, eventually load into database
-    
     if all_games_df.shape[0] > 0:  # if df is non-empty, write it to csv
-        all_games_df.to_csv(f'data/csv/lawler_{start_game_date}_{end_game_date}.csv', index=False)
+        with metrics.timer('write_csv'):
+            all_games_df.to_csv(csv_path, index=False)
+        with metrics.timer('load_parquet'):
+            upsert_parquet(all_games_df)  # incremental load into the season partitioned store
+        with metrics.timer('load_sqlite'):
+            load_games(all_games_df)  # upsert into the sqlite database
+
+    if metrics.enabled:
+        metrics.export()
     
     logging.info(f"***Completed run in {datetime.now() - start}\n")
 
     return
 
+def backfill(start_game_date : str
+            ,end_game_date   : str
+            ,chunk_days      : int = 30
+            ,pipelined       : bool = True):
+    """
+    Run a long date range as resumable chunks of chunk_days, each with its own csv.
+    Killing and re-running the same backfill picks up at the first date that was not loaded.
+    Chunks are pipelined by default, so parsing and loading hide behind the rate limited fetches.
+    """
+
+    game_dates = get_date_range(start_game_date, end_game_date)
+
+    for i in range(0, len(game_dates), chunk_days):
+        chunk_dates = game_dates[i:i + chunk_days]
+        main(chunk_dates[0].strftime('%Y-%m-%d'), chunk_dates[-1].strftime('%Y-%m-%d'), resume=True, pipelined=pipelined)
+
+    return
+
 if __name__ == "__main__":
 
+    stream = '--stream' in sys.argv  # stream day by day instead of holding the whole range in memory
+    resume = '--resume' in sys.argv  # skip dates a previous run already loaded
+    pipelined = '--pipeline' in sys.argv  # overlap fetch, parse and load (implies streaming)
+    chunk_days = [int(arg.split('=')[1]) for arg in sys.argv if arg.startswith('--chunk-days=')]  # resumable backfill in chunks
+    metrics.enabled = '--metrics' in sys.argv  # per-stage timings and counters in data/metrics/ (json + prometheus textfile)
+    args = [arg for arg in sys.argv if not arg.startswith('--')]
+
     try:
-        start_game_date = sys.argv[1]  # first date input (if one was given)
+        start_game_date = args[1]  # first date input (if one was given)
     except:
         start_game_date = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')  # if no input is given, take yesterday as default
 
     try:
-        end_game_date = sys.argv[2]  # second date input (if one was given)
+        end_game_date = args[2]  # second date input (if one was given)
     except:
         end_game_date = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')  # if no input is given, take yesterday as default
 
-    main(start_game_date, end_game_date)  # call the main function with given date range
\ No newline at end of file
+    if chunk_days:
+        backfill(start_game_date, end_game_date, chunk_days[0])
+    else:
+        main(start_game_date, end_game_date, stream, resume, pipelined)  # call the main function with given date range
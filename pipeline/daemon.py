@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+### resident service: keeps the stores, indexes and http pool open between runs ###
+#
+# The nightly cron used to start a fresh `python main.py` every day, paying for interpreter and library start up,
+# reopening every sqlite store and reloading the html cache's key set before it fetched anything. The daemon does
+# that once: imports main, opens the html cache, schedule index, manifest, parse result cache, timeline index,
+# lawler.db (held by load/sqlite_store.py for every load) and the pooled http session, then
+#   - runs yesterday's dates every day at daily_at (resumed, so a date that is already loaded is skipped)
+#   - serves json line requests on a unix socket, one request and one reply per connection:
+#       {"command": "run", "start": "yyyy-mm-dd", "end": "yyyy-mm-dd", "resume": true}
+#       {"command": "status"}
+#       {"command": "stop"}
+# Jobs run one at a time, a request arriving while a job runs waits for it.
+#
+# python cli.py daemon [--at=06:00] [--socket=data/lawler.sock]     start the service (foreground)
+# python cli.py request run [start] [end] [--no-resume] | status | stop   talk to it
+
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+socket_path = os.path.join(data_path, 'lawler.sock')
+
+daily_at = '06:00'  # local time of the scheduled run for yesterday's games
+max_request_bytes = 65536
+
+class LawlerDaemon:
+    """
+    Resident process holding every store open, with a daily timer and a unix socket for ad-hoc runs.
+    """
+
+    def __init__(self
+                ,path    : str = None
+                ,run_at  : str = None
+                ,db_path : str = None):
+
+        self.path = path or socket_path
+        self.run_at = run_at or daily_at
+        self.db_path = db_path  # None for data/lawler.db
+        self.started_at = datetime.now()
+        self.jobs = []  # summaries of finished jobs, newest last
+        self.current_job = None
+
+        self._job_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+
+    def warm(self):
+        """
+        Import the pipeline and open every store once, so the first job pays nothing extra.
+        """
+
+        import main  # pandas, numpy, requests and bs4 come with it
+        from extract.fetch_engine import get_session
+        from extract.html_cache import get_cache
+        from extract.http_validators import get_validators
+        from extract.schedule import get_schedule_index
+        from load.sqlite_store import hold_connection
+        from pipeline.manifest import get_manifest
+        from transform.result_cache import get_result_cache
+        from transform.timeline_index import get_index
+
+        start = time.perf_counter()
+
+        get_cache()
+        get_schedule_index()
+        get_validators()
+        get_manifest()
+        get_result_cache()
+        get_index()
+        hold_connection(self.db_path)  # every load_games in a job reuses it
+        get_session()
+        os.makedirs(os.path.join(data_path, 'csv'), exist_ok=True)  # main writes its csv there
+
+        logging.info(f"Daemon warmed up in {time.perf_counter() - start:.2f}s")
+
+    def run_job(self
+               ,start_game_date : str
+               ,end_game_date   : str
+               ,resume          : bool = True) -> dict:
+        """
+        Run main.main on the date range (pipelined, resumable) with the stores that are already open.
+
+        Returns dict summary of the job.
+        """
+
+        import main
+
+        with self._job_lock:
+            self.current_job = f"{start_game_date} to {end_game_date}"
+            start = time.perf_counter()
+
+            try:
+                main.main(start_game_date, end_game_date, resume=resume, pipelined=True)
+                job = {'start' : start_game_date, 'end' : end_game_date, 'ok' : True}
+            except Exception as e:
+                logging.exception(f"Daemon job {self.current_job} failed")
+                job = {'start' : start_game_date, 'end' : end_game_date, 'ok' : False, 'error' : str(e)}
+            finally:
+                self.current_job = None
+
+            job.update({'seconds' : round(time.perf_counter() - start, 3), 'finished_at' : datetime.now().isoformat(timespec='seconds')})
+            self.jobs = self.jobs[-99:] + [job]
+
+        return job
+
+    def status(self) -> dict:
+
+        from extract.html_cache import get_cache
+
+        cache = get_cache()
+
+        return {'started_at'   : self.started_at.isoformat(timespec='seconds')
+               ,'next_run'     : self.next_run_time().isoformat(timespec='seconds')
+               ,'current_job'  : self.current_job
+               ,'jobs_run'     : len(self.jobs)
+               ,'last_job'     : self.jobs[-1] if self.jobs else None
+               ,'cached_pages' : cache.count() if hasattr(cache, 'count') else None}
+
+    def handle(self
+              ,request : dict) -> dict:
+        """
+        Dispatch one socket request.
+
+        Returns the reply.
+        """
+
+        command = request.get('command')
+
+        if command == 'run':
+            yesterday = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+            start_game_date = request.get('start') or yesterday
+            return self.run_job(start_game_date, request.get('end') or start_game_date, request.get('resume', True))
+
+        if command == 'status':
+            return self.status()
+
+        if command == 'stop':
+            threading.Thread(target=self.stop, daemon=True).start()  # shutdown() waits for this request to finish
+            return {'ok' : True}
+
+        return {'ok' : False, 'error' : f"unknown command {command!r}, expected run, status or stop"}
+
+    def next_run_time(self) -> datetime:
+
+        hour, minute = (int(part) for part in self.run_at.split(':'))
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+        return next_run if next_run > now else next_run + timedelta(days=1)
+
+    def _timer(self):
+        """
+        Thread body: run yesterday's dates every day at run_at.
+        """
+
+        while not self._stop.wait(max(0.0, (self.next_run_time() - datetime.now()).total_seconds())):
+            yesterday = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+            logging.info(f"Daemon scheduled run for {yesterday}")
+            self.run_job(yesterday, yesterday)
+            time.sleep(1)  # next_run_time() has moved on to tomorrow
+
+    def serve(self):
+        """
+        Warm up, start the timer and serve the socket until a stop request (or ctrl-c).
+        """
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                try:
+                    reply = daemon.handle(json.loads(self.rfile.readline(max_request_bytes)))
+                except ValueError as e:
+                    reply = {'ok' : False, 'error' : f"bad request: {e}"}
+
+                self.wfile.write((json.dumps(reply) + '\n').encode())
+
+        self.warm()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left behind by a daemon that was killed
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._timer, daemon=True).start()
+        logging.info(f"Daemon listening on {self.path}, next scheduled run {self.next_run_time()}")
+
+        try:
+            self._server.serve_forever()
+        finally:
+            from load.sqlite_store import release_connection
+
+            self._stop.set()
+            self._server.server_close()
+            os.remove(self.path)
+            release_connection()
+            logging.info('Daemon stopped')
+
+    def stop(self):
+
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def send_request(request : dict
+                ,path    : str = None
+                ,timeout : float = None) -> dict:
+    """
+    Send one request to a running daemon and wait for the reply (a run replies once the job is done).
+
+    Returns the reply.
+    """
+
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path or socket_path)
+        client.sendall((json.dumps(request) + '\n').encode())
+
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+if __name__ == "__main__":
+
+    os.makedirs('log', exist_ok=True)
+    logging.basicConfig(filename='log/lawler.log', level=logging.INFO, format='%(message)s')
+
+    LawlerDaemon().serve()
@@ -0,0 +1,224 @@
+import json
+import logging
+import time
+
+from datetime import datetime
+
+from extract import extract_game_data
+from extract.extract_game_data import extract_home_teams, get_date_parts
+from extract.fetch_engine import fetch_url, fetch_all
+from pipeline import metrics
+from transform.parse_engines import (away_team_from_meta, hidden_pattern, meta_tag_pattern, content_attr_pattern, td_tag_pattern
+                                     ,class_attr_pattern, cell_pattern, score_pattern, find_pbp_table, in_comment)
+
+### live mode: poll today's pbp pages and call Lawler's law the moment a team reaches 100 ###
+#
+# Every game keeps where the previous poll stopped reading its pbp table (offset from the table start plus a
+# short anchor of the text just before it). A poll re-fetches the page but only scans the rows appended since,
+# with the same td.center / score rules as the parser engines. If the anchor no longer matches (bball-ref
+# corrected an earlier row), that game is re-read from the top. Once a page has been read, later polls are
+# conditional requests, so a game with no new plays costs a 304.
+#
+# python cli.py live [yyyy-mm-dd] [--teams=DEN,LAL] [--interval=30] [--max-polls=N] [--rate=2] [--base-url=...]
+# python -m pipeline.replay_server yyyy-mm-dd     stand-in server that replays cached pages a few rows per request
+
+poll_interval = 30  # seconds between polls
+rediscover_polls = 10  # re-read the scoreboard every this many polls for games that were not listed yet
+threshold = 100
+anchor_size = 32  # chars before the resume offset that must be unchanged for an incremental read
+
+class LiveGame:
+    """
+    In-memory state of one game being tracked: how far its pbp table was read and the last score seen.
+    """
+
+    def __init__(self
+                ,game_date : datetime
+                ,home_team : str):
+
+        self.game_date = game_date
+        self.home_team = home_team
+        self.away_team = None
+        self.url = f"{extract_game_data.base_url}/boxscores/pbp/{game_date.strftime('%Y%m%d')}0{home_team}.html"
+        self.reset()
+
+    def reset(self):
+
+        self.offset = 0  # chars of the pbp table already read
+        self.anchor = ''
+        self.last_score = None
+        self.n_scores = 0
+        self.score_at = None  # (away, home) when a team first reached threshold
+
+    @property
+    def reached(self) -> bool:
+
+        return self.score_at is not None
+
+    def new_scores(self
+                  ,table_html : str) -> list:
+        """
+        Scan the rows of table_html after self.offset for td.center score cells and move the offset to the last complete row.
+
+        Returns list of (away_score, home_score) in page order, repeats of the previous score left out.
+        """
+
+        end = table_html.rfind('</tr>', self.offset)
+
+        if end < 0:
+            return []
+
+        end += len('</tr>')
+        region = hidden_pattern.sub('', table_html[self.offset:end])
+        scores = []
+
+        for attrs, inner in td_tag_pattern.findall(region):
+            class_attr = class_attr_pattern.search(attrs)
+            if not (class_attr and 'center' in ''.join(part for part in class_attr.groups() if part).split()):
+                continue
+
+            match = cell_pattern.search(f'<td>{inner}</td>')
+            if match is None or not score_pattern.match(match.group(1)) or match.group(1) == self.last_score:
+                continue
+
+            self.last_score = match.group(1)
+            away_score, home_score = match.group(1).split('-', 1)
+            scores.append((int(away_score), int(home_score)))
+
+        self.offset = end
+        self.anchor = table_html[max(0, end - anchor_size):end]
+
+        return scores
+
+    def update(self
+              ,game_html : str) -> list:
+        """
+        Read whatever was added to the page since the last update.
+
+        Returns list of events (at most one, when a team reaches threshold).
+        """
+
+        if self.away_team is None:
+            contents = [content_attr_pattern.search(tag.group(0)) for tag in meta_tag_pattern.finditer(game_html) if not in_comment(game_html, tag.start())]
+            meta_strs = [f'<meta content="{content.group(1) if content.group(1) is not None else content.group(2)}">' for content in contents if content]
+            self.away_team = away_team_from_meta(meta_strs, self.home_team)
+
+        table = find_pbp_table(game_html)  # never a commented-out copy
+
+        if table is None:
+            return []
+
+        table_html = table.group(0)
+
+        if self.offset and table_html[max(0, self.offset - anchor_size):self.offset] != self.anchor:
+            logging.info(f"{self.home_team} pbp changed before the last read row, re-reading it")
+            metrics.incr('live_rereads')
+            self.reset()
+
+        events = []
+
+        for away_score, home_score in self.new_scores(table_html):
+            self.n_scores += 1
+
+            if not self.reached and max(away_score, home_score) >= threshold:
+                self.score_at = (away_score, home_score)
+                events.append(self.event())
+
+        return events
+
+    def event(self) -> dict:
+
+        away_score, home_score = self.score_at
+
+        return {'event'        : f"reached_{threshold}"
+               ,'game_date'    : self.game_date.strftime('%Y-%m-%d')
+               ,'away_team'    : self.away_team
+               ,'home_team'    : self.home_team
+               ,'lawler_team'  : self.away_team if away_score >= home_score else self.home_team
+               ,'score_at_100' : f"{away_score}-{home_score}"
+               ,'delta_at_100' : abs(away_score - home_score)
+               ,'detected_at'  : datetime.now().isoformat(timespec='seconds')}
+
+
+def get_live_home_teams(game_date : datetime) -> list:
+    """
+    Read the scoreboard for game_date straight from bball-ref (never from the cache, it changes during the day).
+
+    Returns list of home teams.
+    """
+
+    year, month, day = get_date_parts(game_date)
+    date_html, response_code = fetch_url(f'{extract_game_data.base_url}/boxscores/?month={month}&day={day}&year={year}')
+
+    if response_code != 200:
+        logging.info(f"Scoreboard for {game_date.strftime('%Y-%m-%d')} returned {response_code}")
+        return []
+
+    return sorted(extract_home_teams(date_html, game_date))
+
+def emit_event(event : dict):
+    """
+    Default event handler: one json line on stdout and in the log.
+    """
+
+    print(json.dumps(event), flush=True)
+    logging.info(f"Live event: {event}")
+
+def run_live(game_date  : datetime = None
+            ,home_teams : list = None
+            ,interval   : float = None
+            ,max_polls  : int = None
+            ,on_event   = emit_event) -> list:
+    """
+    Poll every game on game_date (default today) until each has reached threshold, or for max_polls polls.
+    Games come from home_teams if given, otherwise from the scoreboard (re-read every rediscover_polls polls).
+    Pages are fetched through the shared rate limiter, so a poll of n games takes at least n / requests_per_second.
+
+    Returns list of events in the order they were emitted.
+    """
+
+    game_date = game_date or datetime.today()
+    interval = poll_interval if interval is None else interval
+    games = dict()
+    events = []
+    polls = 0
+
+    while max_polls is None or polls < max_polls:
+        start = time.monotonic()
+
+        if home_teams is None and polls % rediscover_polls == 0:
+            for home_team in get_live_home_teams(game_date):
+                games.setdefault(home_team, LiveGame(game_date, home_team))
+        elif home_teams is not None and not games:
+            games = {home_team : LiveGame(game_date, home_team) for home_team in home_teams}
+
+        pending = [game for game in games.values() if not game.reached]
+        results = dict()
+
+        for conditional in [False, True]:  # a page already read this session is polled conditionally, 304 = nothing new
+            urls = [game.url for game in pending if bool(game.offset) == conditional]
+            if urls:
+                results.update(fetch_all(urls, conditional=conditional)[0])
+
+        with metrics.timer('live_parse'):
+            for game in pending:
+                game_html, response_code = results[game.url]
+
+                if response_code != 200:  # not started (or not published) yet, or unchanged since the last poll
+                    continue
+
+                for event in game.update(game_html):
+                    events.append(event)
+                    on_event(event)
+
+        polls += 1
+        metrics.incr('live_polls')
+
+        if games and all(game.reached for game in games.values()):
+            logging.info(f"Every game on {game_date.strftime('%Y-%m-%d')} reached {threshold}")
+            break
+
+        if max_polls is None or polls < max_polls:
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+    return events
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+
+from datetime import datetime, timedelta
+
+### persistent job manifest: per-date and per-game state so an interrupted backfill resumes where it stopped ###
+#
+# game states : fetched -> parsed -> loaded, or failed (with the http response code)
+# date states : fetched -> parsed -> loaded, or failed when any of its games failed
+# failed games are retried with exponential backoff, and a rerun skips every date that is already loaded.
+
+manifest_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'manifest.db'))
+
+retry_base = timedelta(minutes=15)  # first retry delay after a failure, doubles with every attempt
+retry_cap = timedelta(days=7)
+
+class JobManifest:
+    """
+    SQLite backed record of what every run has done so far.
+    """
+
+    def __init__(self
+                ,path : str = manifest_db):
+
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # shard workers share the file
+
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS dates (game_date  TEXT PRIMARY KEY
+                                                                   ,state      TEXT NOT NULL
+                                                                   ,updated_at TEXT NOT NULL)""")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS games (game_key      TEXT PRIMARY KEY
+                                                                   ,game_date     TEXT NOT NULL
+                                                                   ,state         TEXT NOT NULL
+                                                                   ,response_code INTEGER
+                                                                   ,attempts      INTEGER NOT NULL DEFAULT 0
+                                                                   ,retry_after   TEXT
+                                                                   ,updated_at    TEXT NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS games_game_date ON games (game_date)")
+
+    def mark_date(self
+                 ,game_date : str
+                 ,state     : str):
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO dates (game_date, state, updated_at) VALUES (?, ?, ?)"
+                              ,(game_date, state, datetime.now().isoformat(timespec='seconds')))
+
+    def mark_games(self
+                  ,game_keys : list
+                  ,game_date : str
+                  ,state     : str):
+        """
+        Move every game in game_keys to state (fetched, parsed or loaded), clearing any failure.
+        """
+
+        now = datetime.now().isoformat(timespec='seconds')
+
+        with self._lock, self._conn:
+            self._conn.executemany("""INSERT INTO games (game_key, game_date, state, response_code, attempts, retry_after, updated_at)
+                                      VALUES (?, ?, ?, 200, 0, NULL, ?)
+                                      ON CONFLICT (game_key) DO UPDATE SET state = excluded.state, response_code = 200
+                                                                          ,retry_after = NULL, updated_at = excluded.updated_at"""
+                                  ,[(game_key, game_date, state, now) for game_key in game_keys])
+
+    def mark_failed(self
+                   ,game_key      : str
+                   ,game_date     : str
+                   ,response_code : int):
+        """
+        Record a failed fetch. The game is not retried before retry_base * 2^(attempts - 1) has passed.
+        """
+
+        now = datetime.now()
+
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts FROM games WHERE game_key = ?", (game_key,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            retry_after = now + min(retry_base * 2 ** (attempts - 1), retry_cap)
+
+            self._conn.execute("""INSERT OR REPLACE INTO games (game_key, game_date, state, response_code, attempts, retry_after, updated_at)
+                                  VALUES (?, ?, 'failed', ?, ?, ?, ?)"""
+                              ,(game_key, game_date, response_code, attempts
+                               ,retry_after.isoformat(timespec='seconds'), now.isoformat(timespec='seconds')))
+
+    def requeue(self
+               ,game_keys : list
+               ,game_date : str):
+        """
+        Forget every game in game_keys (their cached page was bad) and move game_date back to fetched,
+        so the next resumed run fetches them again straight away instead of waiting out a backoff.
+        """
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM games WHERE game_key = ?", [(game_key,) for game_key in game_keys])
+            self._conn.execute("INSERT OR REPLACE INTO dates (game_date, state, updated_at) VALUES (?, 'fetched', ?)"
+                              ,(game_date, datetime.now().isoformat(timespec='seconds')))
+
+    def in_backoff(self
+                  ,game_key : str) -> bool:
+        """
+        Returns True if game_key failed recently and should not be requested yet.
+        """
+
+        with self._lock:
+            row = self._conn.execute("SELECT retry_after FROM games WHERE game_key = ? AND state = 'failed'", (game_key,)).fetchone()
+
+        return row is not None and row[0] > datetime.now().isoformat(timespec='seconds')
+
+    def failed_games(self
+                    ,game_date : str) -> list:
+        """
+        Returns list of game keys on game_date whose last fetch failed.
+        """
+
+        with self._lock:
+            rows = self._conn.execute("SELECT game_key FROM games WHERE game_date = ? AND state = 'failed'", (game_date,)).fetchall()
+
+        return [row[0] for row in rows]
+
+    def loaded_games(self
+                    ,game_date : str) -> set:
+        """
+        Returns set of game keys on game_date that are already loaded.
+        """
+
+        with self._lock:
+            rows = self._conn.execute("SELECT game_key FROM games WHERE game_date = ? AND state = 'loaded'", (game_date,)).fetchall()
+
+        return {row[0] for row in rows}
+
+    def date_states(self
+                   ,game_dates : list) -> dict:
+        """
+        Returns dict of yyyy-mm-dd -> state for the given dates that have one.
+        """
+
+        states = dict()
+
+        with self._lock:
+            for i in range(0, len(game_dates), 500):  # stay under sqlite's bound parameter limit
+                chunk = game_dates[i:i + 500]
+                rows = self._conn.execute(f"SELECT game_date, state FROM dates WHERE game_date IN ({', '.join('?' for _ in chunk)})", chunk)
+                states.update(dict(rows))
+
+        return states
+
+    def loaded_dates(self
+                    ,game_dates : list) -> set:
+        """
+        Returns set of the given dates (yyyy-mm-dd) that are fully loaded.
+        """
+
+        return {game_date for game_date, state in self.date_states(game_dates).items() if state == 'loaded'}
+
+    def summary(self) -> dict:
+        """
+        Returns dict of counts per state for dates and games, plus failed games per response code.
+        """
+
+        with self._lock:
+            date_counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM dates GROUP BY state"))
+            game_counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM games GROUP BY state"))
+            failed_codes = dict(self._conn.execute("SELECT response_code, COUNT(*) FROM games WHERE state = 'failed' GROUP BY response_code"))
+
+        return {'dates' : date_counts, 'games' : game_counts, 'failed_codes' : failed_codes}
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_manifest = None
+
+def get_manifest() -> JobManifest:
+    """
+    Returns the process-wide manifest (opened on first use).
+    """
+
+    global _manifest
+
+    if _manifest is None:
+        _manifest = JobManifest()
+
+    return _manifest
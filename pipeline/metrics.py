@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+### per-stage instrumentation for production runs, exported as json and a prometheus textfile ###
+#
+# Off by default. Every recording function checks `enabled` first and returns, so instrumented code pays one
+# global lookup per call when it is disabled. Switch on with main.py --metrics (or metrics.enabled = True).
+#
+#   timers   : stage -> calls, total seconds (fetch, rate_limit_sleep, parse, evaluate, write_csv, ...)
+#   counters : name + labels -> value (html_cache_hits, bytes_fetched, http_responses{code="200"}, ...)
+#   samples  : name -> observed values, exported as percentiles (parse_seconds per game)
+#
+# Parse pool workers return their per-game latency to the parent (see transform/build_game_df.py),
+# nothing recorded inside another process is exported.
+
+enabled = False
+metrics_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'metrics'))
+prometheus_textfile = os.path.join(metrics_path, 'lawler.prom')  # point node_exporter's --collector.textfile.directory here
+json_file = os.path.join(metrics_path, 'lawler_metrics.json')
+
+quantiles = [0.5, 0.9, 0.99]
+max_samples = 100000  # per sample name, later observations only count towards _count and _sum
+
+class Metrics:
+    """
+    Thread-safe in-process registry of timers, labelled counters and latency samples.
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+
+        with self._lock:
+            self.started_at = time.time()
+            self.timers = dict()  # stage -> [calls, seconds]
+            self.counters = dict()  # (name, ((label, value), ...)) -> value
+            self.samples = dict()  # name -> [values, count, total]
+
+    def add_time(self
+                ,stage   : str
+                ,seconds : float):
+
+        with self._lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    def incr(self
+            ,name   : str
+            ,value  : float = 1
+            ,labels : dict = None):
+
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self
+               ,name  : str
+               ,value : float):
+
+        with self._lock:
+            sample = self.samples.setdefault(name, [[], 0, 0.0])
+            if len(sample[0]) < max_samples:
+                sample[0].append(value)
+            sample[1] += 1
+            sample[2] += value
+
+    def snapshot(self) -> dict:
+        """
+        Returns dict of timers, counters and sample percentiles (json serializable).
+        """
+
+        with self._lock:
+            timers = {stage : {'calls' : calls, 'seconds' : seconds} for stage, (calls, seconds) in sorted(self.timers.items())}
+            counters = [{'name' : name, 'labels' : dict(labels), 'value' : value} for (name, labels), value in sorted(self.counters.items())]
+            samples = {name : summarize(values, count, total) for name, (values, count, total) in sorted(self.samples.items())}
+
+        return {'started_at'  : datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds')
+               ,'run_seconds' : time.time() - self.started_at
+               ,'timers'      : timers
+               ,'counters'    : counters
+               ,'samples'     : samples}
+
+
+def summarize(values : list
+             ,count  : int
+             ,total  : float) -> dict:
+    """
+    Nearest rank percentiles of values.
+
+    Returns dict of count, sum, max and one entry per quantile (p50, p90, p99).
+    """
+
+    ordered = sorted(values)
+    summary = {'count' : count, 'sum' : total, 'max' : ordered[-1] if ordered else 0.0}
+
+    for quantile in quantiles:
+        summary[f"p{round(quantile * 100)}"] = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] if ordered else 0.0
+
+    return summary
+
+def label_str(labels : dict) -> str:
+
+    return '{' + ','.join(f'{label}="{value}"' for label, value in labels.items()) + '}' if labels else ''
+
+def to_prometheus(snapshot : dict) -> str:
+    """
+    Render a snapshot in the prometheus text exposition format, every name prefixed with lawler_.
+
+    Returns text.
+    """
+
+    lines = ['# HELP lawler_stage_seconds_total Wall time spent per pipeline stage.'
+            ,'# TYPE lawler_stage_seconds_total counter']
+    lines += [f'lawler_stage_seconds_total{{stage="{stage}"}} {timer["seconds"]:.6f}' for stage, timer in snapshot['timers'].items()]
+    lines += ['# TYPE lawler_stage_calls_total counter']
+    lines += [f'lawler_stage_calls_total{{stage="{stage}"}} {timer["calls"]}' for stage, timer in snapshot['timers'].items()]
+
+    typed = set()
+    for counter in snapshot['counters']:
+        name = f"lawler_{counter['name']}_total"
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f"{name}{label_str(counter['labels'])} {counter['value']}")
+
+    for sample_name, summary in snapshot['samples'].items():
+        name = f"lawler_{sample_name}"
+        lines.append(f'# TYPE {name} summary')
+        lines += [f'{name}{{quantile="{quantile}"}} {summary[f"p{round(quantile * 100)}"]:.6f}' for quantile in quantiles]
+        lines += [f'{name}_sum {summary["sum"]:.6f}', f'{name}_count {summary["count"]}']
+
+    lines += ['# TYPE lawler_run_seconds gauge', f"lawler_run_seconds {snapshot['run_seconds']:.3f}"
+             ,'# TYPE lawler_last_run_timestamp_seconds gauge', f"lawler_last_run_timestamp_seconds {time.time():.0f}"]
+
+    return '\n'.join(lines) + '\n'
+
+def write_atomic(path : str
+                ,text : str):
+    """
+    Write text to path through a temporary file, so a scrape never reads a half written file.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+
+    os.replace(tmp_path, path)
+
+
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """
+    Returns the process-wide registry.
+    """
+
+    return _metrics
+
+def add_time(stage   : str
+            ,seconds : float):
+
+    if enabled:
+        _metrics.add_time(stage, seconds)
+
+def incr(name   : str
+        ,value  : float = 1
+        ,labels : dict = None):
+
+    if enabled:
+        _metrics.incr(name, value, labels)
+
+def observe(name  : str
+           ,value : float):
+
+    if enabled:
+        _metrics.observe(name, value)
+
+@contextmanager
+def _timed(stage : str):
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.add_time(stage, time.perf_counter() - start)
+
+_disabled_timer = nullcontext()
+
+def timer(stage : str):
+    """
+    Context manager adding the wall time of its block to stage (a shared no-op when disabled).
+    """
+
+    return _timed(stage) if enabled else _disabled_timer
+
+def export(json_path       : str = None
+          ,prometheus_path : str = None) -> dict:
+    """
+    Write the current snapshot as json and as a prometheus textfile, and log the stage totals.
+
+    Returns snapshot.
+    """
+
+    snapshot = _metrics.snapshot()
+
+    write_atomic(json_path or json_file, json.dumps(snapshot, indent=2))
+    write_atomic(prometheus_path or prometheus_textfile, to_prometheus(snapshot))
+
+    logging.info('Stage timings: ' + ', '.join(f"{stage} {timer['seconds']:.2f}s" for stage, timer in snapshot['timers'].items()))
+
+    return snapshot
@@ -0,0 +1,150 @@
+import re
+import sys
+import threading
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from extract.html_cache import get_cache, read_page
+from transform.parse_engines import find_pbp_table
+
+### stand-in for bball-ref during a game: replays cached pbp pages a few rows at a time ###
+#
+# python -m pipeline.replay_server yyyy-mm-dd [--port=8766] [--rows-per-request=25]
+#
+# Serves the cached games of one date as if they were being played right now:
+#   /boxscores/?month=..&day=..&year=..        scoreboard linking every cached game of the date
+#   /boxscores/pbp/yyyymmdd0HOM.html           the page with only the first n rows of its pbp table,
+#                                              n grows by rows_per_request with every request for that page
+# Point live mode at it with --base-url=http://127.0.0.1:8766
+
+rows_per_request = 25
+
+pbp_path_pattern = re.compile(r'^/boxscores/pbp/(\d{8}0[A-Z]{3}\.html)$')
+
+class ReplayState:
+    """
+    Cached pages of one date and how many rows of each have been revealed so far.
+    """
+
+    def __init__(self
+                ,game_date        : datetime
+                ,rows_per_request : int = rows_per_request):
+
+        self.game_date = game_date
+        self.rows_per_request = rows_per_request
+        self.requests = dict()
+        self._lock = threading.Lock()
+
+        prefix = f"pbp_{game_date.strftime('%Y%m%d')}"
+        self.pages = {key[len('pbp_'):] : read_page(key, date) for key, date in get_cache().keys() if key.startswith(prefix)}
+
+    def scoreboard(self) -> str:
+
+        links = ''.join(f'<p><a href="/boxscores/{name}">Box Score</a></p>' for name in sorted(self.pages))
+
+        return f'<html><body>{links}</body></html>'
+
+    def next_page(self
+                 ,name : str) -> str:
+        """
+        Returns the page cut after the rows revealed so far (one more step each call), or None if it is not cached.
+        """
+
+        if name not in self.pages:
+            return None
+
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            n_rows = self.requests[name] * self.rows_per_request
+
+        return cut_page(self.pages[name], n_rows)
+
+
+def cut_page(game_html : str
+            ,n_rows    : int) -> str:
+    """
+    Keep the first n_rows rows of the pbp table in game_html.
+
+    Returns html.
+    """
+
+    table = find_pbp_table(game_html)
+
+    if table is None:
+        return game_html
+
+    table_html = table.group(0)
+    end = 0
+
+    for _ in range(n_rows):
+        row_end = table_html.find('</tr>', end)
+        if row_end < 0:
+            return game_html  # every row is out, the game is over
+        end = row_end + len('</tr>')
+
+    return game_html[:table.start()] + table_html[:end] + '</table>' + game_html[table.end():]
+
+
+def make_handler(state : ReplayState):
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            match = pbp_path_pattern.match(self.path)
+
+            if self.path.startswith('/boxscores/?'):
+                body = state.scoreboard()
+            elif match:
+                body = state.next_page(match.group(1))
+            else:
+                body = None
+
+            if body is None:
+                self.send_error(404)
+                return
+
+            payload = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return ReplayHandler
+
+def serve(state : ReplayState
+         ,port  : int = 8766) -> ThreadingHTTPServer:
+    """
+    Returns a started replay server (serving on a background thread) for state's games.
+    """
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+
+    if not args:
+        print('usage: python -m pipeline.replay_server yyyy-mm-dd [--port=8766] [--rows-per-request=25]')
+        sys.exit(1)
+
+    state = ReplayState(datetime.strptime(args[0], '%Y-%m-%d'), int(options.get('rows-per-request', rows_per_request)))
+    port = int(options.get('port', 8766))
+    server = serve(state, port)
+
+    print(f"Replaying {len(state.pages)} games of {args[0]} on http://127.0.0.1:{port}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
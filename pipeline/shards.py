@@ -0,0 +1,523 @@
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+### sharded backfill: worker processes (on one or several hosts sharing data/) split a long date range ###
+#
+# data/shards/{mode}_{start}_{end}/
+#   plan.json             the shards, calendar months so no schedule page is needed by two shards
+#   {shard}.lease         holds its owner, claimed by hard linking it into place, renewed (mtime) after every day
+#   {shard}.done          written once the shard's csv is complete, a done shard is never claimed again
+#   {shard}.csv           that shard's games
+#   budget                next free request slot, every worker fetches through one SharedTokenBucket on it
+#   merge.lease / .done   the first host that sees every shard done merges and loads
+#
+# A lease whose mtime is older than lease_seconds belongs to a dead worker and is taken over. Renew, release and
+# complete check the owner first, and a worker that finds its lease taken over stops instead of racing the new
+# owner. Pages are keyed by date and shards never share a date (or a month), so no page is fetched twice. The
+# merged csv is sorted by game_date, home_team, so it comes out the same whichever workers ran which shards.
+#
+# python -m pipeline.shards start end [--workers=N] [--shard-months=1] [--reparse] [--rate=R]
+#   run the same command on every host, each starts N local workers against the shared job directory.
+#   --reparse re-parses pages already in the html cache instead of fetching (no network at all).
+
+shards_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'shards'))
+
+shard_months = 1  # calendar months per shard
+shard_workers = 2  # worker processes per host
+lease_seconds = 600  # a lease not renewed for this long is considered abandoned
+merge_lease_seconds = 3600  # the same for merge.lease, one load step of a long backfill can take minutes
+claim_poll_seconds = 5  # how often an idle worker looks for abandoned leases while other shards are still running
+
+def get_job_path(start_game_date : str
+                ,end_game_date   : str
+                ,reparse         : bool = False) -> str:
+
+    return os.path.join(shards_path, f"{'reparse' if reparse else 'fetch'}_{start_game_date}_{end_game_date}")
+
+def plan_shards(start_game_date : str
+               ,end_game_date   : str
+               ,months          : int = None) -> list:
+    """
+    Split the inclusive date range at calendar month boundaries into shards of months months.
+
+    Returns list of dicts with name, start and end (yyyy-mm-dd).
+    """
+
+    months = months or shard_months
+    start = datetime.strptime(start_game_date, '%Y-%m-%d')
+    end = datetime.strptime(end_game_date, '%Y-%m-%d')
+    shards = []
+
+    while start <= end:
+        month_index = start.year * 12 + start.month - 1 + months  # first month of the next shard
+        next_start = datetime(month_index // 12, month_index % 12 + 1, 1)
+        shard_end = min(end, next_start - timedelta(days=1))
+        shards.append({'name'  : f"shard-{len(shards):04d}"
+                      ,'start' : start.strftime('%Y-%m-%d')
+                      ,'end'   : shard_end.strftime('%Y-%m-%d')})
+        start = next_start
+
+    return shards
+
+def write_plan(job_path : str
+              ,shards   : list) -> list:
+    """
+    Write plan.json unless another host already did, first writer wins.
+
+    Returns the plan in the job directory.
+    """
+
+    os.makedirs(job_path, exist_ok=True)
+    plan_path = os.path.join(job_path, 'plan.json')
+    tmp_path = f"{plan_path}.{socket.gethostname()}.{os.getpid()}"
+
+    with open(tmp_path, 'w') as f:
+        json.dump(shards, f, indent=2)
+
+    try:
+        os.link(tmp_path, plan_path)  # atomic and fails if it exists, unlike a rename
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+
+    return read_plan(job_path)
+
+def read_plan(job_path : str) -> list:
+
+    with open(os.path.join(job_path, 'plan.json')) as f:
+        return json.load(f)
+
+
+### leases ###
+
+def is_done(job_path : str
+           ,name     : str) -> bool:
+
+    return os.path.exists(os.path.join(job_path, f"{name}.done"))
+
+def claim(job_path : str
+         ,name     : str
+         ,owner    : str) -> bool:
+    """
+    Try to take the lease on name. An expired lease is first moved aside to a path of this owner's, and only taken
+    over if the moved file is still expired: a lease renewed or re-claimed between the stat and the rename is put back.
+
+    Returns True if owner now holds the lease.
+    """
+
+    lease_path = os.path.join(job_path, f"{name}.lease")
+    timeout = merge_lease_seconds if name == 'merge' else lease_seconds
+
+    try:
+        if time.time() - os.stat(lease_path).st_mtime > timeout:
+            expired_path = f"{lease_path}.expired.{owner}"
+            os.rename(lease_path, expired_path)
+
+            if time.time() - os.stat(expired_path).st_mtime <= timeout:  # another worker's fresh lease, not the expired one
+                restore_lease(expired_path, lease_path)
+                return False
+
+            os.remove(expired_path)
+            logging.info(f"Taking over abandoned lease on {name}")
+    except FileNotFoundError:  # no lease, or another worker moved the expired one first
+        pass
+
+    tmp_path = f"{lease_path}.{owner}"
+
+    with open(tmp_path, 'w') as f:
+        json.dump({'owner' : owner, 'claimed_at' : datetime.now().isoformat(timespec='seconds')}, f)
+
+    try:
+        os.link(tmp_path, lease_path)  # atomic and fails if it exists, the lease is never seen without its owner
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+    return True
+
+def restore_lease(moved_path : str
+                 ,lease_path : str):
+    """
+    Put a lease moved aside by mistake back, unless a new one was claimed meanwhile (its old owner then finds
+    out at its next renew).
+    """
+
+    try:
+        os.link(moved_path, lease_path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(moved_path)
+
+def lease_owner(path : str) -> str:
+    """
+    Returns the owner written into the lease file at path, or None if there is no lease.
+    """
+
+    try:
+        with open(path) as f:
+            return json.load(f)['owner']
+    except (FileNotFoundError, ValueError):  # gone, or a lease from before owners were written into it
+        return None
+
+def renew(job_path : str
+         ,name     : str
+         ,owner    : str) -> bool:
+    """
+    Extend owner's lease on name.
+
+    Returns False if the lease is no longer owner's (it expired and another worker took it over).
+    """
+
+    lease_path = os.path.join(job_path, f"{name}.lease")
+
+    if lease_owner(lease_path) != owner:
+        logging.info(f"{owner} lost its lease on {name}")
+        return False
+
+    os.utime(lease_path)
+
+    return True
+
+def release(job_path : str
+           ,name     : str
+           ,owner    : str):
+    """
+    Drop owner's lease on name. The lease is moved aside before its owner is checked, so a lease another worker
+    took over is put back instead of deleted.
+    """
+
+    lease_path = os.path.join(job_path, f"{name}.lease")
+    released_path = f"{lease_path}.released.{owner}"
+
+    try:
+        os.rename(lease_path, released_path)
+    except FileNotFoundError:
+        return
+
+    if lease_owner(released_path) != owner:
+        logging.info(f"{owner} lost its lease on {name}, leaving it to its new owner")
+        restore_lease(released_path, lease_path)
+        return
+
+    os.remove(released_path)
+
+def complete(job_path : str
+            ,name     : str
+            ,owner    : str
+            ,result   : dict) -> bool:
+    """
+    Mark name done (atomically, with its result) and drop the lease, if owner still holds it.
+
+    Returns False if the lease was lost and nothing was written.
+    """
+
+    if not renew(job_path, name, owner):
+        return False
+
+    done_path = os.path.join(job_path, f"{name}.done")
+
+    with open(f"{done_path}.{owner}.tmp", 'w') as f:
+        json.dump(result, f)
+
+    os.replace(f"{done_path}.{owner}.tmp", done_path)
+    release(job_path, name, owner)
+
+    return True
+
+
+### workers ###
+
+def reset_process_state():
+    """
+    Drop every store handle and http session inherited through fork, the worker opens its own.
+    """
+
+    from extract import fetch_engine, html_cache, http_validators, schedule
+    from pipeline import manifest
+    from transform import result_cache, timeline_index
+
+    html_cache._cache = None
+    html_cache._raw_cache = None
+    schedule._index = None
+    http_validators._store = None
+    manifest._manifest = None
+    result_cache._cache = None
+    timeline_index._index = None
+    fetch_engine._session = None
+    fetch_engine._limiter = None
+
+def run_shard(job_path : str
+             ,shard    : dict
+             ,reparse  : bool) -> dict:
+    """
+    Fetch (or with reparse, read from the html cache) and parse every game in shard, renewing the lease after every
+    day, and write the shard's csv.
+
+    Returns dict of dates and games processed, or None if the lease was lost on the way.
+    """
+
+    import pandas as pd
+
+    from main import parse_day
+    from extract.extract_game_data import iter_game_html_between_dates
+    from extract.html_cache import get_cache, read_page
+    from pipeline.manifest import get_manifest
+    from pipeline.stages import pipeline
+    from transform.build_game_df import read_game_data_from_html
+
+    name = shard['name']
+    manifest = get_manifest()
+    frames = []
+    dates = []
+
+    if reparse:
+        start, end = datetime.strptime(shard['start'], '%Y-%m-%d'), datetime.strptime(shard['end'], '%Y-%m-%d')
+        games = sorted(key for key, date in get_cache().keys() if key.startswith('pbp_') and start <= date <= end)
+        all_html_dict = {game : read_page(game, datetime.strptime(game[4:12], '%Y%m%d')) for game in games}
+        frames.append(read_game_data_from_html(all_html_dict, workers=1))
+        dates = sorted({f"{game[4:8]}-{game[8:10]}-{game[10:12]}" for game in games})
+
+    else:
+        for game_date, game_df in pipeline(iter_game_html_between_dates(shard['start'], shard['end']), [('parse', parse_day)]):
+            day = game_date.strftime('%Y-%m-%d')
+            game_keys = [f"pbp_{game_date.strftime('%Y%m%d')}0{home_team}.html" for home_team in (game_df['home_team'] if game_df.shape[0] > 0 else [])]
+            done_keys = set(manifest.failed_games(day)) | manifest.loaded_games(day)  # never move a loaded game back
+            manifest.mark_games([game_key for game_key in game_keys if game_key not in done_keys], day, 'parsed')
+            manifest.mark_date(day, 'parsed')
+            frames.append(game_df)
+            dates.append(day)
+
+            if not renew(job_path, name, shard['owner']):
+                return None
+
+    if not renew(job_path, name, shard['owner']):  # never overwrite the csv of the shard's new owner
+        return None
+
+    frames = [frame for frame in frames if frame.shape[0] > 0]
+    games_df = pd.concat(frames, ignore_index=True) if frames else read_game_data_from_html(dict())  # keeps the columns
+    csv_path = os.path.join(job_path, f"{name}.csv")
+    games_df.to_csv(f"{csv_path}.tmp", index=False)
+    os.replace(f"{csv_path}.tmp", csv_path)  # a csv is never seen half written
+
+    return {'dates' : dates, 'games' : int(games_df.shape[0]), 'owner' : shard.get('owner')}
+
+def run_worker(job_path : str
+              ,owner    : str
+              ,reparse  : bool = False
+              ,rate     : float = None) -> int:
+    """
+    Claim and run shards until every shard in the plan is done.
+
+    Returns number of shards this worker completed.
+    """
+
+    from extract.fetch_engine import share_limiter
+
+    reset_process_state()
+    share_limiter(os.path.join(job_path, 'budget'), rate)
+    plan = read_plan(job_path)
+    completed = 0
+
+    while True:
+        pending = [shard for shard in plan if not is_done(job_path, shard['name'])]
+
+        if not pending:
+            return completed
+
+        claimed = next((shard for shard in pending if claim(job_path, shard['name'], owner)), None)
+
+        if claimed is None:  # the rest are leased by live workers, wait in case one of them dies
+            time.sleep(claim_poll_seconds)
+            continue
+
+        if is_done(job_path, claimed['name']):  # finished between the listing and the claim
+            release(job_path, claimed['name'], owner)
+            continue
+
+        logging.info(f"{owner} running {claimed['name']} ({claimed['start']} to {claimed['end']})")
+
+        try:
+            result = run_shard(job_path, dict(claimed, owner=owner), reparse)
+        except BaseException:
+            release(job_path, claimed['name'], owner)  # let another worker retry it straight away
+            raise
+
+        if result is None or not complete(job_path, claimed['name'], owner, result):  # this worker stalled past lease_seconds
+            logging.info(f"{owner} stopping, {claimed['name']} was taken over")
+            return completed
+
+        completed += 1
+
+def _worker_main(job_path : str
+                ,owner    : str
+                ,reparse  : bool
+                ,rate     : float):
+    """
+    Process entry point of a local worker.
+    """
+
+    try:
+        completed = run_worker(job_path, owner, reparse, rate)
+        logging.info(f"{owner} finished after {completed} shards")
+    except Exception:
+        logging.exception(f"{owner} failed")
+        sys.exit(1)
+
+
+### merge ###
+
+def read_shard(job_path : str
+              ,name     : str) -> tuple:
+    """
+    Read a done shard's result and csv. A missing csv, or one with fewer games than the shard reported, raises
+    instead of being skipped, so a merge never loads a partial backfill as if it were complete.
+
+    Returns result dict and games dataframe (compact schema).
+    """
+
+    import pandas as pd
+
+    from transform.game_schema import csv_dtypes, to_compact
+
+    with open(os.path.join(job_path, f"{name}.done")) as f:
+        result = json.load(f)
+
+    csv_path = os.path.join(job_path, f"{name}.csv")
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"{name} is done but its csv {csv_path} is missing, delete {name}.done and rerun to redo the shard")
+
+    shard_df = to_compact(pd.read_csv(csv_path, dtype=csv_dtypes))
+
+    if shard_df.shape[0] != result['games']:
+        raise RuntimeError(f"{csv_path} has {shard_df.shape[0]} games, {name} reported {result['games']}")
+
+    return result, shard_df
+
+def merge_shards(job_path        : str
+                ,start_game_date : str
+                ,end_game_date   : str
+                ,owner           : str) -> int:
+    """
+    Concatenate every shard csv (each checked by read_shard), sort by the natural key and drop repeats, write
+    data/csv/lawler_{start}_{end}.csv and load it into the parquet store and sqlite. Only the host holding merge.lease
+    runs this, renewing it between steps and stopping if it was taken over (every step is an idempotent upsert, the
+    new owner redoes them).
+
+    Returns number of games merged, 0 if the merge was taken over.
+    """
+
+    import pandas as pd
+
+    from load.load_game_data import csv_file_path, upsert_parquet, key_columns
+    from load.sqlite_store import load_games
+    from pipeline.manifest import get_manifest
+
+    plan = read_plan(job_path)
+    results, frames = zip(*[read_shard(job_path, shard['name']) for shard in plan])
+    all_games_df = pd.concat(frames, ignore_index=True)
+
+    if all_games_df.shape[0] > 0:
+        all_games_df = all_games_df.drop_duplicates(subset=key_columns, keep='last').sort_values(key_columns).reset_index(drop=True)
+
+    os.makedirs(csv_file_path, exist_ok=True)
+    all_games_df.to_csv(os.path.join(csv_file_path, f"lawler_{start_game_date}_{end_game_date}.csv"), index=False)
+
+    for load_step in ([upsert_parquet, load_games] if all_games_df.shape[0] > 0 else []):
+        if not renew(job_path, 'merge', owner):
+            return 0
+        load_step(all_games_df)
+
+    manifest = get_manifest()
+    merged_days = all_games_df['game_date'].dt.strftime('%Y-%m-%d') if all_games_df.shape[0] > 0 else None
+
+    for result in results:
+        if not renew(job_path, 'merge', owner):
+            return 0
+
+        for day in result['dates']:
+            home_teams = all_games_df.loc[merged_days == day, 'home_team'] if merged_days is not None else []
+            game_keys = [f"pbp_{day.replace('-', '')}0{home_team}.html" for home_team in home_teams]
+            failed_keys = set(manifest.failed_games(day))
+            manifest.mark_games([game_key for game_key in game_keys if game_key not in failed_keys], day, 'loaded')
+            manifest.mark_date(day, 'failed' if failed_keys else 'loaded')
+
+    if not complete(job_path, 'merge', owner, {'games' : int(all_games_df.shape[0]), 'merged_at' : datetime.now().isoformat(timespec='seconds')}):
+        return 0
+
+    return all_games_df.shape[0]
+
+def run_coordinator(start_game_date : str
+                   ,end_game_date   : str
+                   ,workers         : int = None
+                   ,months          : int = None
+                   ,reparse         : bool = False
+                   ,rate            : float = None) -> int:
+    """
+    This host's part of a sharded run: join (or create) the plan, run workers local processes until every shard
+    is done, then merge unless another host already is.
+
+    Returns number of games merged by this host (0 if another host merged).
+    """
+
+    workers = workers or shard_workers
+    job_path = get_job_path(start_game_date, end_game_date, reparse)
+    plan = write_plan(job_path, plan_shards(start_game_date, end_game_date, months))
+    host = f"{socket.gethostname()}-{os.getpid()}"
+
+    logging.info(f"{host} joining {job_path}: {len(plan)} shards, {workers} local workers")
+
+    context = multiprocessing.get_context('fork')  # workers inherit module settings such as base_url
+    processes = [context.Process(target=_worker_main, args=(job_path, f"{host}-w{i}", reparse, rate)) for i in range(workers)]
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    failed = [process for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {workers} shard workers failed, see log/lawler.log (rerun to retry their shards)")
+
+    if all(is_done(job_path, shard['name']) for shard in plan) and not is_done(job_path, 'merge') and claim(job_path, 'merge', host):
+        try:
+            n_games = merge_shards(job_path, start_game_date, end_game_date, host)
+        except BaseException:
+            release(job_path, 'merge', host)  # a rerun merges again straight away
+            raise
+
+        logging.info(f"{host} merged {n_games} games from {len(plan)} shards")
+        return n_games
+
+    return 0
+
+
+if __name__ == "__main__":
+
+    os.makedirs('log', exist_ok=True)
+    logging.basicConfig(filename='log/lawler.log', level=logging.INFO, format='%(message)s')
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].partition('=')[::2] for arg in sys.argv[1:] if arg.startswith('--'))
+
+    if len(args) != 2:
+        print('usage: python -m pipeline.shards start end [--workers=N] [--shard-months=M] [--reparse] [--rate=R]')
+        sys.exit(1)
+
+    n_games = run_coordinator(args[0], args[1]
+                             ,int(options['workers']) if options.get('workers') else None
+                             ,int(options['shard-months']) if options.get('shard-months') else None
+                             ,'reparse' in options
+                             ,float(options['rate']) if options.get('rate') else None)
+
+    print(f"Merged {n_games} games" if n_games else "Every shard done, merged by this or another host")
@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+
+from pipeline import metrics
+
+### overlapped stages connected by bounded queues ###
+#
+#   source -> [queue] -> stage 1 -> [queue] -> ... -> stage n -> [queue] -> caller
+#
+# The source and every stage run on their own thread, the caller consumes the last queue. Each queue holds at
+# most stage_queue_size items, so a fast producer blocks (backpressure) instead of piling up days of html in memory.
+# Time a stage spends blocked on a full queue is recorded as <stage>_blocked in pipeline/metrics.py.
+#
+# Stages are threads, not processes: the fetch stage spends its time sleeping on the rate limiter and waiting on
+# the network with the GIL released, which is exactly when the parse stage gets to run.
+
+stage_queue_size = 4  # items (days) buffered between two stages
+
+_done = object()  # end of stream marker
+
+def _put(out_queue : queue.Queue
+        ,item
+        ,stop      : threading.Event) -> bool:
+    """
+    Put item on out_queue, blocking while it is full. Gives up once stop is set.
+
+    Returns True if the item was queued.
+    """
+
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+def _drain(in_queue : queue.Queue
+          ,stop     : threading.Event):
+    """
+    Yields items from in_queue until the end of stream marker, or until stop is set and the queue is empty.
+    """
+
+    while True:
+        try:
+            item = in_queue.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+
+        if item is _done:
+            return
+
+        yield item
+
+def _run_stage(name      : str
+              ,items
+              ,fn
+              ,out_queue : queue.Queue
+              ,stop      : threading.Event
+              ,errors    : list):
+    """
+    Thread body: apply fn to every item (pass through if fn is None) and queue the results.
+    The first exception stops the whole pipeline and is re-raised to the caller.
+    """
+
+    try:
+        for item in items:
+            if stop.is_set():
+                return
+
+            result = item if fn is None else fn(item)
+
+            start = time.perf_counter()
+            if not _put(out_queue, result, stop):
+                return
+            metrics.add_time(f"{name}_blocked", time.perf_counter() - start)
+
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+    finally:
+        _put(out_queue, _done, stop)
+
+def pipeline(source
+            ,stages      : list
+            ,queue_size  : int = None
+            ,source_name : str = 'fetch'):
+    """
+    Run source (any iterable, e.g. a generator that fetches) and every (name, fn) in stages concurrently,
+    each fn taking the previous stage's item and returning the next one.
+
+    Yields the last stage's results in source order. Exceptions from any stage are re-raised here.
+    """
+
+    queue_size = queue_size or stage_queue_size
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    threads = [threading.Thread(target=_run_stage, args=(source_name, iter(source), None, queues[0], stop, errors), daemon=True)]
+    threads += [threading.Thread(target=_run_stage, args=(name, _drain(queues[i], stop), fn, queues[i + 1], stop, errors), daemon=True)
+                for i, (name, fn) in enumerate(stages)]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        yield from _drain(queues[-1], stop)
+
+        if errors:
+            raise errors[0]
+
+    finally:
+        stop.set()  # unblocks every stage if the caller stopped early or a stage failed
+
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+### shared fixtures: the repo root on sys.path (the packages are run from it) and small local http servers ###
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def http_server():
+    """
+    Start local servers for a handler class on a free port, shut down after the test.
+
+    Returns function handler_class -> base url.
+    """
+
+    servers = []
+
+    def start(handler_class):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fresh_fetch_engine(monkeypatch):
+    """
+    A fetch engine with its own session and limiter, so tests don't share rate or throttle state.
+
+    Returns the fetch_engine module.
+    """
+
+    from extract import fetch_engine
+
+    monkeypatch.setattr(fetch_engine, '_session', None)
+    monkeypatch.setattr(fetch_engine, '_limiter', None)
+    monkeypatch.setattr(fetch_engine, 'requests_per_second', fetch_engine.requests_per_second)
+
+    return fetch_engine
+
+
+@pytest.fixture
+def isolated_stores(tmp_path, monkeypatch):
+    """
+    Point every process-wide store (html cache, schedule index, manifest, validators, parse caches) at tmp_path.
+
+    Returns tmp_path.
+    """
+
+    from extract import html_cache, http_validators, schedule
+    from pipeline import manifest
+    from transform import result_cache, timeline_index
+
+    monkeypatch.setattr(html_cache, '_cache', html_cache.SqliteCache(str(tmp_path / 'html_cache.db')))
+    monkeypatch.setattr(schedule, '_index', schedule.ScheduleIndex(str(tmp_path / 'schedule.db')))
+    monkeypatch.setattr(manifest, '_manifest', manifest.JobManifest(str(tmp_path / 'manifest.db')))
+    monkeypatch.setattr(http_validators, '_store', http_validators.ValidatorStore(str(tmp_path / 'http_validators.db')))
+    monkeypatch.setattr(result_cache, '_cache', result_cache.ParseResultCache(str(tmp_path / 'parse_cache.db')))
+    monkeypatch.setattr(timeline_index, '_index', timeline_index.TimelineIndex(str(tmp_path / 'timelines.db')))
+
+    return tmp_path
@@ -0,0 +1,53 @@
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+from transform import build_game_df
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def no_stores(monkeypatch):
+    """
+    Parse without the result cache or timeline index, so nothing is read from or written to data/.
+    """
+
+    monkeypatch.setattr(build_game_df, 'use_result_cache', False)
+    monkeypatch.setattr(build_game_df, 'index_timelines', False)
+
+
+def read_fixtures() -> dict:
+
+    html_dict = dict()
+
+    for path in sorted(glob.glob(os.path.join(fixtures_path, 'pbp_*.html'))):
+        with open(path) as fixture:
+            html_dict[os.path.basename(path)] = fixture.read()
+
+    return html_dict
+
+
+def test_parallel_parse_matches_serial_for_uncached_html(no_stores):
+
+    html_dict = read_fixtures()  # none of these pages are in the html cache
+
+    serial_df = build_game_df.read_game_data_from_html(html_dict, engine='scan', workers=1)
+    parallel_df = build_game_df.read_game_data_from_html(html_dict, engine='scan', workers=2, chunksize=1)
+
+    assert serial_df.shape[0] == len(html_dict)
+    assert serial_df['reached_100_bool'].sum() == 3
+    assert parallel_df.equals(serial_df)
+
+
+def test_transform_does_not_import_the_http_client():
+
+    code = ("import sys, transform.build_game_df, transform.game_schema; "
+            "print(sorted(m for m in ('requests', 'urllib3', 'extract.extract_game_data') if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__))
+                        ,capture_output=True, text=True, check=True).stdout
+
+    assert out.strip() == '[]'
@@ -0,0 +1,65 @@
+import os
+
+from datetime import datetime
+
+import pytest
+
+from extract import cache_inventory
+from extract.html_cache import DirectoryCache, SqliteCache
+from pipeline.manifest import get_manifest
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+game_date = datetime(2022, 1, 3)
+
+
+def read_fixture(name : str) -> str:
+
+    with open(os.path.join(fixtures_path, name)) as fixture:
+        return fixture.read()
+
+
+lal_page = read_fixture('pbp_202201030LAL.html')
+
+
+@pytest.mark.parametrize('page, status', [(lal_page, 'ok')
+                                         ,(read_fixture('pbp_202201070NYK.html'), 'ok')  # a commented copy next to the real table
+                                         ,(read_fixture('pbp_202201090PHO.html'), 'error_page')
+                                         ,('', 'empty')
+                                         ,('<html><head><title>429 Too Many Requests</title></head><body></body></html>', 'rate_limited')
+                                         ,(lal_page[:len(lal_page) // 2], 'truncated')  # the download stopped part way
+                                         ,('<html><body><!-- <table id="pbp"></table> --></body></html>', 'no_pbp_table')]
+                        ,ids=['ok', 'ok_commented_copy', 'error_page', 'empty', 'rate_limited', 'truncated', 'no_pbp_table'])
+def test_check_page_classifies_cached_pages(page, status):
+
+    assert cache_inventory.check_page('pbp_202201030LAL.html', page.encode('utf-8')) == status
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'directory'])
+def test_scan_then_requeue_drops_bad_pages_and_reopens_their_dates(backend, isolated_stores):
+
+    cache = SqliteCache(str(isolated_stores / 'pages.db')) if backend == 'sqlite' else DirectoryCache(str(isolated_stores / 'html'))
+    inventory = cache_inventory.CacheInventory(str(isolated_stores / 'cache_inventory.db'))
+    manifest = get_manifest()
+
+    pages = {'pbp_202201030LAL.html' : read_fixture('pbp_202201030LAL.html')
+            ,'pbp_202201030BOS.html' : '<html><head><title>429 Too Many Requests</title></head><body></body></html>'
+            ,'pbp_202201030DEN.html' : lal_page[:len(lal_page) // 2]}
+
+    for key, html in pages.items():
+        cache.write(key, game_date, html)
+
+    manifest.mark_games(list(pages), '2022-01-03', 'loaded')
+    manifest.mark_date('2022-01-03', 'loaded')
+
+    assert cache_inventory.scan(cache, inventory, workers=2) == {'ok' : 1, 'rate_limited' : 1, 'truncated' : 1}
+    assert cache_inventory.scan(cache, inventory, workers=2) == {'ok' : 1, 'rate_limited' : 1, 'truncated' : 1}  # a rescan agrees
+
+    assert cache_inventory.requeue_invalid(cache, inventory) == 2
+
+    assert [key for key, date in cache.keys()] == ['pbp_202201030LAL.html']
+    assert [key for key, date, status in inventory.pages()] == ['pbp_202201030LAL.html']
+    assert manifest.loaded_games('2022-01-03') == {'pbp_202201030LAL.html'}  # the requeued games are forgotten
+    assert manifest.date_states(['2022-01-03']) == {'2022-01-03' : 'fetched'}  # so a resumed run revisits the date
+    assert cache_inventory.requeue_invalid(cache, inventory) == 0
+
+    inventory.close()
@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+import main
+from test_extract_game_data import SiteHandler
+from extract import extract_game_data
+from load import sqlite_store
+from load.load_game_data import upsert_parquet
+from pipeline import daemon
+
+
+def test_job_submitted_over_the_socket_loads_through_one_connection(tmp_path, http_server, fresh_fetch_engine, isolated_stores, monkeypatch):
+
+    monkeypatch.chdir(tmp_path)  # main logs to log/ and writes its csv to data/csv/
+    os.makedirs('log')
+    monkeypatch.setattr(daemon, 'data_path', str(tmp_path / 'data'))
+    monkeypatch.setattr(main, 'upsert_parquet', lambda games_df: upsert_parquet(games_df, str(tmp_path / 'parquet')))
+    monkeypatch.setattr(extract_game_data, 'base_url', http_server(type('Handler', (SiteHandler,), {'paths' : []})))
+    fresh_fetch_engine.set_rate(1000)
+
+    connections = []
+    connect = sqlite_store.connect
+    monkeypatch.setattr(sqlite_store, 'connect', lambda db_path: connections.append(db_path) or connect(db_path))
+
+    sock_path = str(tmp_path / 'lawler.sock')
+    db_path = str(tmp_path / 'lawler.db')
+    run_at = (datetime.now() - timedelta(minutes=1)).strftime('%H:%M')  # the timer's next run is a day away
+    service = daemon.LawlerDaemon(sock_path, run_at, db_path)
+    server_thread = threading.Thread(target=service.serve, daemon=True)
+    server_thread.start()
+
+    for _ in range(200):
+        if os.path.exists(sock_path):
+            break
+        time.sleep(0.05)
+
+    try:
+        job = daemon.send_request({'command' : 'run', 'start' : '2021-10-20', 'end' : '2021-10-20'}, sock_path, timeout=30)
+        rerun = daemon.send_request({'command' : 'run', 'start' : '2021-10-20', 'resume' : False}, sock_path, timeout=30)
+        status = daemon.send_request({'command' : 'status'}, sock_path, timeout=30)
+        games_df = sqlite_store.read_games(db_path=db_path)  # while held, reads of lawler.db share the connection too
+    finally:
+        assert daemon.send_request({'command' : 'stop'}, sock_path, timeout=30) == {'ok' : True}
+        server_thread.join(10)
+
+    assert job['ok'] and rerun['ok'], (job, rerun)
+    assert status['jobs_run'] == 2 and status['last_job']['end'] == '2021-10-20'
+    assert games_df['home_team'].tolist() == ['LAL']
+    assert os.path.exists(tmp_path / 'data' / 'csv' / 'lawler_2021-10-20_2021-10-20.csv')
+
+    assert connections == [os.path.abspath(db_path)]  # opened once at warm up, not on every load
+    assert not server_thread.is_alive() and not os.path.exists(sock_path)
+    assert sqlite_store._held is None  # closed when the daemon stopped
@@ -0,0 +1,82 @@
+import os
+
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler
+
+from extract import extract_game_data
+from extract.schedule import get_schedule_index
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """
+    bball-ref stand-in for 2021-10-20: no monthly schedule page, a scoreboard answering scoreboard_code and one pbp page.
+    """
+
+    scoreboard_code = 200
+    paths = []
+
+    def reply(self
+             ,code : int
+             ,body : str = ''):
+
+        payload = body.encode()
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+
+        type(self).paths.append(self.path)
+
+        if self.path.startswith('/boxscores/?'):
+            if self.scoreboard_code != 200:
+                return self.reply(self.scoreboard_code, 'Too Many Requests')
+            return self.reply(200, '<html><body><a href="/boxscores/202110200LAL.html">Final</a></body></html>')
+
+        if self.path == '/boxscores/pbp/202110200LAL.html':
+            with open(os.path.join(fixtures_path, 'pbp_202201030LAL.html')) as fixture:
+                return self.reply(200, fixture.read())
+
+        self.reply(404, 'Page Not Found')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_failed_scoreboard_is_not_cached_as_a_day_without_games(http_server, fresh_fetch_engine, isolated_stores, monkeypatch):
+
+    handler = type('Handler', (SiteHandler,), {'paths' : [], 'scoreboard_code' : 429})
+    monkeypatch.setattr(extract_game_data, 'base_url', http_server(handler))
+    monkeypatch.setattr(fresh_fetch_engine, 'max_attempts', 1)
+    fresh_fetch_engine.set_rate(1000)
+
+    days = list(extract_game_data.iter_game_html_between_dates('2021-10-20', '2021-10-20'))
+
+    assert [game_html_dict for game_date, game_html_dict in days] == [dict()]
+    assert get_schedule_index().get([days[0][0]]) == dict()  # nothing recorded for the date
+
+    handler.scoreboard_code = 200  # the server recovers, the next run plans the date again
+    days = list(extract_game_data.iter_game_html_between_dates('2021-10-20', '2021-10-20'))
+
+    assert list(days[0][1]) == ['pbp_202110200LAL.html']
+    assert get_schedule_index().get([days[0][0]]) == {'2021-10-20' : ['LAL']}
+
+
+def test_unchanged_recent_page_keeps_the_cached_copy(http_server, fresh_fetch_engine, isolated_stores, monkeypatch):
+
+    from bench.http_benchmark import MockState, make_handler
+
+    state = MockState(throttle_every=0, fail_every=0, retry_after=0)
+    monkeypatch.setattr(extract_game_data, 'base_url', http_server(make_handler(state)))
+    fresh_fetch_engine.set_rate(1000)
+    game_date = datetime.combine(date.today(), datetime.min.time())  # recent, so a cached page is revalidated
+
+    first = extract_game_data.get_all_games_on_date(game_date, ['LAL'])
+    second = extract_game_data.get_all_games_on_date(game_date, ['LAL'])
+
+    assert state.codes == {200 : 1, 304 : 1}  # the second request carried the ETag and got no body
+    assert list(first) == [f"pbp_{game_date:%Y%m%d}0LAL.html"]
+    assert second == first  # the cached page is what the second run parses
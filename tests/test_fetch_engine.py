@@ -0,0 +1,127 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+
+
+class ConcurrencyHandler(BaseHTTPRequestHandler):
+    """
+    Answers every GET after a short delay, recording when each request arrived and how many were in flight.
+    """
+
+    delay = 0.05
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    arrivals = []
+
+    def do_GET(self):
+
+        cls = type(self)
+
+        with cls.lock:
+            cls.arrivals.append(time.monotonic())
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+
+        time.sleep(cls.delay)
+        body = b'<html>ok</html>'
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def make_handler(delay : float):
+
+    return type('Handler', (ConcurrencyHandler,), {'delay' : delay, 'lock' : threading.Lock(), 'arrivals' : []})
+
+
+def test_fetch_all_holds_rate_cap(http_server, fresh_fetch_engine):
+
+    handler = make_handler(0.01)
+    base_url = http_server(handler)
+    rate = 20
+
+    results, stats = fresh_fetch_engine.fetch_all([f"{base_url}/{i}" for i in range(21)], workers=4, rate=rate)
+
+    assert all(code == 200 for _, code in results.values())
+    assert len(handler.arrivals) == 21
+
+    elapsed = max(handler.arrivals) - min(handler.arrivals)
+    assert (len(handler.arrivals) - 1) / elapsed <= rate * 1.1  # the first token is free, the other 20 come at the rate
+
+
+def test_fetch_all_holds_concurrency_cap(http_server, fresh_fetch_engine):
+
+    handler = make_handler(0.2)  # slow responses, so an unbounded client would pile requests up
+    base_url = http_server(handler)
+    workers = 3
+
+    results, stats = fresh_fetch_engine.fetch_all([f"{base_url}/{i}" for i in range(12)], workers=workers, rate=1000)
+
+    assert all(code == 200 for _, code in results.values())
+    assert 1 < handler.max_in_flight <= workers  # requests overlap, but never more than the pool
+
+
+def test_throttle_waits_retry_after_then_rate_recovers(http_server, fresh_fetch_engine, isolated_stores):
+
+    from bench.http_benchmark import MockState, make_handler as make_mock_handler
+
+    state = MockState(throttle_every=2, fail_every=0, retry_after=0.5)  # the second request gets a 429
+    base_url = http_server(make_mock_handler(state))
+    limiter = fresh_fetch_engine.TokenBucket(100)
+
+    assert fresh_fetch_engine.fetch_url(f"{base_url}/0", limiter=limiter)[1] == 200
+
+    start = time.monotonic()
+    html, code = fresh_fetch_engine.fetch_url(f"{base_url}/1", limiter=limiter)
+    elapsed = time.monotonic() - start
+
+    assert code == 200 and state.codes == {200 : 2, 429 : 1}
+    assert elapsed >= state.retry_after  # the retry was held back for the whole Retry-After
+    assert limiter.rate < limiter.max_rate  # slowed down, only one success added back so far
+
+    state.throttle_every = 0
+    for i in range(2, 40):
+        fresh_fetch_engine.fetch_url(f"{base_url}/{i}", limiter=limiter)
+
+    assert limiter.rate == limiter.max_rate == 100  # every success adds rate_increase back until the cap
+
+
+def test_server_errors_are_retried_up_to_the_limit(http_server, fresh_fetch_engine, isolated_stores, monkeypatch):
+
+    from bench.http_benchmark import MockState, make_handler as make_mock_handler
+
+    state = MockState(throttle_every=0, fail_every=1, retry_after=0)  # every request gets a 502
+    base_url = http_server(make_mock_handler(state))
+    monkeypatch.setattr(fresh_fetch_engine, 'max_attempts', 3)
+    monkeypatch.setattr(fresh_fetch_engine, 'backoff_base', 0.01)
+
+    html, code = fresh_fetch_engine.fetch_url(f"{base_url}/0", limiter=fresh_fetch_engine.TokenBucket(1000))
+
+    assert code == 502
+    assert state.codes == {502 : 3}  # the first request and two retries, then the error is returned
+
+
+def test_matching_etag_is_not_downloaded_again(http_server, fresh_fetch_engine, isolated_stores):
+
+    from bench.http_benchmark import MockState, make_handler as make_mock_handler
+
+    state = MockState(throttle_every=0, fail_every=0, retry_after=0)
+    base_url = http_server(make_mock_handler(state))
+    urls = [f"{base_url}/{i}" for i in range(5)]
+
+    full, full_stats = fresh_fetch_engine.fetch_all(urls, rate=1000)
+    revalidated, stats = fresh_fetch_engine.fetch_all(urls, rate=1000, conditional=True)
+
+    assert {code for _, code in full.values()} == {200}
+    assert {code for _, code in revalidated.values()} == {304}
+    assert stats['not_modified'] == 5 and stats['bytes_saved_not_modified'] == sum(len(html) for html, _ in full.values())
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from extract.html_cache import DirectoryCache, SqliteCache
+
+game_date = datetime(2022, 1, 3)
+key = 'pbp_202201030LAL.html'
+
+
+def test_sqlite_cache_migrates_legacy_pages_on_miss(tmp_path):
+
+    legacy = DirectoryCache(str(tmp_path / 'html'))
+    legacy.write(key, game_date, '<html>legacy page</html>')
+
+    cache = SqliteCache(str(tmp_path / 'html_cache.db'), fallback=legacy)
+
+    assert cache.count() == 0
+    assert cache.exists(key, game_date)
+    assert cache.read(key, game_date) == '<html>legacy page</html>'
+    assert cache.count() == 1  # copied in, the next open finds it in the table
+    assert not cache.exists('pbp_202201030BOS.html', game_date)
+
+
+def test_sqlite_cache_sees_pages_written_by_another_process(tmp_path):
+
+    path = str(tmp_path / 'html_cache.db')
+    reader = SqliteCache(path)
+    writer = SqliteCache(path)  # e.g. a shard worker or the daemon
+
+    assert not reader.exists(key, game_date)
+
+    writer.write(key, game_date, '<html>new page</html>')
+
+    assert reader.exists(key, game_date)
+    assert reader.read(key, game_date) == '<html>new page</html>'
@@ -0,0 +1,80 @@
+import os
+
+from datetime import datetime
+
+from extract import extract_game_data
+from extract.html_cache import store_page
+from pipeline import live
+from pipeline.replay_server import ReplayState, cut_page, make_handler
+from transform import build_game_df
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+game_date = datetime(2022, 1, 3)
+fixture_pages = {'LAL' : 'pbp_202201030LAL.html'  # replayed as three games of one date
+                ,'DEN' : 'pbp_202201050DEN.html'
+                ,'NYK' : 'pbp_202201070NYK.html'}
+
+
+def test_replayed_games_are_called_as_they_cross_100(http_server, fresh_fetch_engine, isolated_stores, monkeypatch):
+
+    html_dict = dict()
+
+    for home_team, fixture in fixture_pages.items():
+        with open(os.path.join(fixtures_path, fixture)) as f:
+            key = f"pbp_{game_date.strftime('%Y%m%d')}0{home_team}.html"
+            html_dict[key] = store_page(key, game_date, f.read())
+
+    state = ReplayState(game_date, rows_per_request=2)  # every poll reveals two more pbp rows
+    monkeypatch.setattr(extract_game_data, 'base_url', http_server(make_handler(state)))
+    fresh_fetch_engine.set_rate(1000)
+
+    requests_at_event = dict()
+
+    def on_event(event):
+        name = f"{game_date.strftime('%Y%m%d')}0{event['home_team']}.html"
+        requests_at_event[name] = state.requests[name]
+
+    events = live.run_live(game_date, interval=0, max_polls=50, on_event=on_event)  # games found on the replayed scoreboard
+
+    monkeypatch.setattr(build_game_df, 'use_result_cache', False)
+    monkeypatch.setattr(build_game_df, 'index_timelines', False)
+    games_df = build_game_df.read_game_data_from_html(html_dict).set_index('home_team')
+
+    assert sorted(event['home_team'] for event in events) == sorted(fixture_pages)
+
+    for event in events:  # every call matches what the batch parser finds in the finished page
+        game = games_df.loc[event['home_team']]
+
+        assert event['away_team'] == game['away_team']
+        assert event['score_at_100'] == f"{game['away_at_100']}-{game['home_at_100']}"
+        assert event['delta_at_100'] == game['delta_at_100']
+        assert (event['lawler_team'] == game['win_team']) == game['lawler_bool']
+
+    before_df = build_game_df.read_game_data_from_html({f"pbp_{name}" : cut_page(state.pages[name], (n - 1) * state.rows_per_request)
+                                                        for name, n in requests_at_event.items()})
+    assert not before_df['reached_100_bool'].fillna(False).any()  # each call came on the first poll that showed 100
+
+    assert requests_at_event == state.requests  # a called game is never polled again, and the loop ends with the last one
+    assert max(state.requests.values()) < 50
+
+
+def test_untrimmed_page_is_read_from_its_visible_table(monkeypatch):
+
+    with open(os.path.join(fixtures_path, 'pbp_202201070NYK.html')) as f:
+        game_html = f.read()  # as fetched: a stale commented-out copy of the pbp table comes first
+
+    monkeypatch.setattr(build_game_df, 'use_result_cache', False)
+    monkeypatch.setattr(build_game_df, 'index_timelines', False)
+    game = build_game_df.read_game_data_from_html({'pbp_202201070NYK.html' : game_html}).iloc[0]
+
+    live_game = live.LiveGame(datetime(2022, 1, 7), 'NYK')
+    events = []
+
+    for n_rows in range(1, 20):  # the visible table grows a row per poll
+        events += live_game.update(cut_page(game_html, n_rows))
+
+    assert len(events) == 1
+    assert events[0]['away_team'] == game['away_team']
+    assert events[0]['score_at_100'] == f"{game['away_at_100']}-{game['home_at_100']}"
+    assert live_game.last_score == f"{game['final_away']}-{game['final_home']}"
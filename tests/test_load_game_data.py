@@ -0,0 +1,46 @@
+import os
+import random
+
+from test_timeline import make_score_list, teams
+from load.load_game_data import upsert_parquet, read_parquet_store
+from transform.build_game_df import build_games_df
+from transform.timeline import GameTimeline, score_list_to_arrays
+
+
+def make_games_df(n_games : int
+                 ,seed    : int):
+    """
+    Returns a compact games dataframe of n_games random games in October 2021, some never reaching 100.
+    """
+
+    rng = random.Random(seed)
+    timelines = []
+
+    for i in range(n_games):
+        away_team, home_team = rng.sample(teams, 2)
+        timelines.append(GameTimeline(f"2021-10-{i % 28 + 1:02d}", home_team, away_team, *score_list_to_arrays(make_score_list(rng))))
+
+    return build_games_df(timelines).drop_duplicates(['game_date', 'home_team'], keep='last').reset_index(drop=True)
+
+
+def test_reloading_unchanged_games_writes_nothing(tmp_path):
+
+    games_df = make_games_df(40, 5)
+    store_path = str(tmp_path / 'parquet')
+
+    assert games_df['away_at_100'].isna().any()  # games that never reached 100 carry NA columns
+
+    assert upsert_parquet(games_df, store_path) == games_df.shape[0]
+    assert upsert_parquet(games_df, store_path) == 0
+    assert upsert_parquet(games_df, store_path) == 0
+    assert len(os.listdir(os.path.join(store_path, 'season=2021-22'))) == 1  # no part file added or rewritten
+
+    changed_df = games_df.copy()
+    changed_df.loc[0, 'final_home'] = changed_df.loc[0, 'final_home'] + 1
+
+    assert upsert_parquet(changed_df, store_path) == games_df.shape[0]  # one changed game rewrites its season
+
+    stored_df = read_parquet_store(file_path=store_path).drop(columns='season').sort_values(['game_date', 'home_team']).reset_index(drop=True)
+    expected_df = changed_df.sort_values(['game_date', 'home_team']).reset_index(drop=True)
+
+    assert stored_df.equals(expected_df)
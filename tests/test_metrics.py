@@ -0,0 +1,62 @@
+import json
+import re
+
+from pipeline import metrics
+
+sample_line = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="[^"]*",?)*\})? -?[0-9.e+]+$')
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+
+    monkeypatch.setattr(metrics, '_metrics', metrics.Metrics())
+    monkeypatch.setattr(metrics, 'enabled', False)
+
+    with metrics.timer('parse'):
+        metrics.incr('html_cache_hits')
+        metrics.observe('parse_seconds', 0.1)
+
+    snapshot = metrics.get_metrics().snapshot()
+
+    assert (snapshot['timers'], snapshot['counters'], snapshot['samples']) == (dict(), [], dict())
+
+
+def test_export_writes_json_and_prometheus_text(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(metrics, '_metrics', metrics.Metrics())
+    monkeypatch.setattr(metrics, 'enabled', True)
+
+    with metrics.timer('parse'):
+        pass
+    metrics.add_time('fetch', 1.5)
+    metrics.add_time('fetch', 0.5)
+    metrics.incr('http_responses', labels={'code' : 200})
+    metrics.incr('http_responses', 2, labels={'code' : 200})
+    metrics.incr('http_responses', labels={'code' : 429})
+    metrics.incr('bytes_fetched', 1000)
+    for i in range(1, 101):
+        metrics.observe('parse_seconds', i / 100)
+
+    json_path, prometheus_path = str(tmp_path / 'metrics.json'), str(tmp_path / 'lawler.prom')
+    snapshot = metrics.export(json_path, prometheus_path)
+
+    with open(json_path) as f:
+        assert json.load(f) == json.loads(json.dumps(snapshot))
+
+    assert snapshot['timers']['fetch'] == {'calls' : 2, 'seconds' : 2.0}
+    assert snapshot['timers']['parse']['calls'] == 1
+    assert {'name' : 'http_responses', 'labels' : {'code' : 200}, 'value' : 3} in snapshot['counters']
+    assert snapshot['samples']['parse_seconds'] == {'count' : 100, 'sum' : sum(i / 100 for i in range(1, 101)), 'max' : 1.0
+                                                   ,'p50' : 0.51, 'p90' : 0.91, 'p99' : 1.0}
+
+    with open(prometheus_path) as f:
+        lines = f.read().splitlines()
+
+    assert all(line.startswith('# ') or sample_line.match(line) for line in lines)
+    assert 'lawler_stage_seconds_total{stage="fetch"} 2.000000' in lines
+    assert 'lawler_stage_calls_total{stage="fetch"} 2' in lines
+    assert 'lawler_http_responses_total{code="200"} 3' in lines
+    assert 'lawler_http_responses_total{code="429"} 1' in lines
+    assert lines.count('# TYPE lawler_http_responses_total counter') == 1  # one TYPE line per metric, before its samples
+    assert 'lawler_bytes_fetched_total 1000' in lines
+    assert 'lawler_parse_seconds{quantile="0.9"} 0.910000' in lines
+    assert 'lawler_parse_seconds_count 100' in lines
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from transform.parse_engines import compare_engines, engines, trim_page
+from transform.timeline import score_list_to_arrays
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# key -> (away_team, last score, scoring plays), what every engine has to find
+expected = {'pbp_202201030LAL.html' : ('BOS', '108-110', 7)        # regular game, score cell in a <script>, commented line score
+           ,'pbp_202201050DEN.html' : ('MIA', '111-115', 5)        # two overtimes, single quoted and multi class cells, a cell spanning lines (skipped)
+           ,'pbp_202201070NYK.html' : ('CHI', '104-99', 4)         # a commented-out copy of the pbp table before the real one
+           ,'pbp_202201090PHO.html' : ('not_found', None, 0)       # 404 page, no pbp table
+           ,'pbp_202201110SAS.html' : ('not_found', None, 0)}      # empty page
+
+def read_fixture(key : str) -> str:
+
+    with open(os.path.join(fixtures_path, key)) as fixture:
+        return fixture.read()
+
+
+@pytest.mark.parametrize('key', sorted(expected))
+def test_engines_give_identical_timelines(key):
+
+    game_html = read_fixture(key)
+    home_team = key.split('.html')[0][-3:]
+    outputs = {name : parse(game_html, home_team) for name, parse in engines.items()}
+
+    away_team, last_score, n_scores = expected[key]
+    bs4_away_team, bs4_scores = outputs['bs4']
+
+    assert bs4_away_team == away_team
+    assert len(bs4_scores) == n_scores
+    assert (bs4_scores[-1] if bs4_scores else None) == last_score
+
+    bs4_away, bs4_home = score_list_to_arrays(bs4_scores)
+
+    for name, (engine_away_team, engine_scores) in outputs.items():
+        engine_away, engine_home = score_list_to_arrays(engine_scores)
+
+        assert engine_away_team == bs4_away_team, name
+        assert engine_scores == bs4_scores, name
+        assert np.array_equal(engine_away, bs4_away) and np.array_equal(engine_home, bs4_home), name
+
+
+@pytest.mark.parametrize('key', sorted(expected))
+def test_trimmed_pages_parse_the_same(key):
+
+    game_html = read_fixture(key)
+    home_team = key.split('.html')[0][-3:]
+    trimmed_html = trim_page(game_html)
+
+    if trimmed_html is None:  # no visible pbp table, the cache keeps the whole page
+        assert expected[key][2] == 0
+        return
+
+    for name, parse in engines.items():
+        assert parse(trimmed_html, home_team) == parse(game_html, home_team), name
+
+
+def test_compare_engines_finds_no_mismatch():
+
+    assert compare_engines({key : read_fixture(key) for key in expected}) == []
@@ -0,0 +1,57 @@
+import itertools
+import os
+
+import numpy as np
+
+from transform import build_game_df, result_cache
+from transform.parse_engines import get_engine
+from transform.result_cache import ParseResultCache
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+key = 'pbp_202201030LAL.html'
+
+
+def read_fixture() -> str:
+
+    with open(os.path.join(fixtures_path, key)) as fixture:
+        return fixture.read()
+
+
+def test_unchanged_page_is_a_hit_and_a_changed_page_a_miss(tmp_path, monkeypatch):
+
+    cache = ParseResultCache(str(tmp_path / 'parse_cache.db'))
+    monkeypatch.setattr(result_cache, '_cache', cache)
+    monkeypatch.setattr(build_game_df, 'use_result_cache', True)
+    engine = get_engine('scan')
+    game_html = read_fixture()
+
+    parsed = build_game_df.parse_game(key, game_html, engine)
+    assert cache.stats() == {'hits' : 0, 'misses' : 1, 'entries' : 1}
+
+    cached = build_game_df.parse_game(key, game_html, engine)
+    assert cache.stats() == {'hits' : 1, 'misses' : 1, 'entries' : 1}
+    assert cached.away_team == parsed.away_team
+    assert np.array_equal(cached.away_scores, parsed.away_scores) and np.array_equal(cached.home_scores, parsed.home_scores)
+
+    changed = build_game_df.parse_game(key, game_html.replace('108-110', '108-112'), engine)  # bball-ref corrected the final play
+    assert cache.stats() == {'hits' : 1, 'misses' : 2, 'entries' : 2}
+    assert changed.home_scores[-1] == 112
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+
+    clock = itertools.count(1000)
+    monkeypatch.setattr(result_cache.time, 'time', lambda: next(clock))  # strictly increasing last_used
+    cache = ParseResultCache(str(tmp_path / 'parse_cache.db'), max_entries=10)
+    scores = np.array([2, 4], dtype=np.int16)
+
+    for i in range(10):
+        cache.put(f"hash{i}", 'BOS', scores, scores)
+
+    assert cache.get('hash0') is not None  # used again, now the most recent
+    cache.put('hash10', 'BOS', scores, scores)  # past max_entries, down to 90% of it
+
+    kept = [f"hash{i}" for i in range(11) if cache.get(f"hash{i}") is not None]
+
+    assert kept == ['hash0'] + [f"hash{i}" for i in range(3, 11)]
+    assert cache.stats()['entries'] == 9
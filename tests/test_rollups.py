@@ -0,0 +1,41 @@
+import sqlite3
+
+import pandas as pd
+
+from test_load_game_data import make_games_df
+from load import rollups, sqlite_store
+
+
+def read_rollup_table(db_path : str) -> pd.DataFrame:
+
+    conn = sqlite3.connect(db_path)
+
+    try:
+        return pd.read_sql_query(f"SELECT * FROM team_rollups ORDER BY {', '.join(rollups.dimensions)}", conn)
+    finally:
+        conn.close()
+
+def rebuilt_rollup_table(db_path : str) -> pd.DataFrame:
+
+    sqlite_store.rebuild_rollups(db_path)
+
+    return read_rollup_table(db_path)
+
+
+def test_incremental_rollups_match_a_rebuild(tmp_path):
+
+    db_path = str(tmp_path / 'lawler.db')
+    games_df = make_games_df(60, 9)
+
+    sqlite_store.load_games(games_df.iloc[:40], db_path)
+    sqlite_store.load_games(games_df, db_path)  # 20 new games and 40 reloaded unchanged
+
+    changed_df = games_df.iloc[:30].copy()  # flip the winner of some stored games, moving them between rollup keys
+    changed_df['final_away'], changed_df['final_home'] = games_df['final_home'].iloc[:30], games_df['final_away'].iloc[:30]
+    changed_df['win_team'], changed_df['lose_team'] = games_df['lose_team'].iloc[:30], games_df['win_team'].iloc[:30]
+    sqlite_store.load_games(changed_df, db_path)
+
+    incremental_df = read_rollup_table(db_path)
+
+    assert incremental_df.shape[0] > 0
+    assert incremental_df.equals(rebuilt_rollup_table(db_path))
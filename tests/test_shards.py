@@ -0,0 +1,155 @@
+import os
+import time
+
+import pytest
+
+from test_load_game_data import make_games_df
+from pipeline import shards
+from pipeline.manifest import get_manifest
+
+
+def age_lease(job_path : str
+             ,name     : str
+             ,seconds  : float):
+
+    lease_path = os.path.join(job_path, f"{name}.lease")
+    os.utime(lease_path, (time.time() - seconds, time.time() - seconds))
+
+
+def test_only_the_owner_renews_releases_or_completes(tmp_path):
+
+    job_path = str(tmp_path)
+
+    assert shards.claim(job_path, 'shard-0000', 'a')
+    assert not shards.claim(job_path, 'shard-0000', 'b')
+
+    assert not shards.renew(job_path, 'shard-0000', 'b')
+    shards.release(job_path, 'shard-0000', 'b')
+    assert not shards.complete(job_path, 'shard-0000', 'b', {'dates' : []})
+    assert shards.lease_owner(os.path.join(job_path, 'shard-0000.lease')) == 'a'
+    assert not shards.is_done(job_path, 'shard-0000')
+
+    assert shards.renew(job_path, 'shard-0000', 'a')
+    assert shards.complete(job_path, 'shard-0000', 'a', {'dates' : []})
+    assert shards.is_done(job_path, 'shard-0000')
+    assert sorted(os.listdir(job_path)) == ['shard-0000.done']  # no lease or temp file left behind
+
+
+def test_expired_lease_is_taken_over_and_the_old_owner_stops(tmp_path):
+
+    job_path = str(tmp_path)
+
+    assert shards.claim(job_path, 'shard-0000', 'a')
+    age_lease(job_path, 'shard-0000', shards.lease_seconds + 1)
+
+    assert shards.claim(job_path, 'shard-0000', 'b')
+    assert not shards.renew(job_path, 'shard-0000', 'a')
+    assert not shards.complete(job_path, 'shard-0000', 'a', {'dates' : []})
+    assert shards.renew(job_path, 'shard-0000', 'b')
+
+
+def test_fresh_lease_moved_aside_by_a_stale_check_is_put_back(tmp_path, monkeypatch):
+
+    job_path = str(tmp_path)
+    assert shards.claim(job_path, 'shard-0000', 'a')
+
+    now = time.time()
+    clock = iter([now + shards.lease_seconds + 1, now])  # c saw the lease expired, but it was renewed before the rename
+    monkeypatch.setattr(shards.time, 'time', lambda: next(clock))
+
+    assert not shards.claim(job_path, 'shard-0000', 'c')
+
+    monkeypatch.undo()
+    assert shards.renew(job_path, 'shard-0000', 'a')
+    assert sorted(os.listdir(job_path)) == ['shard-0000.lease']
+
+
+def test_merge_lease_has_its_own_timeout(tmp_path):
+
+    job_path = str(tmp_path)
+
+    assert shards.claim(job_path, 'merge', 'a')
+    age_lease(job_path, 'merge', shards.lease_seconds + 1)
+
+    assert not shards.claim(job_path, 'merge', 'b')  # still within merge_lease_seconds
+
+    age_lease(job_path, 'merge', shards.merge_lease_seconds + 1)
+
+    assert shards.claim(job_path, 'merge', 'b')
+
+
+def write_done_shards(job_path : str
+                     ,games_df) -> list:
+    """
+    Two finished shards splitting games_df by date, as run_worker leaves them.
+
+    Returns the plan.
+    """
+
+    plan = shards.write_plan(job_path, [{'name' : 'shard-0000', 'start' : '2021-10-01', 'end' : '2021-10-15'}
+                                       ,{'name' : 'shard-0001', 'start' : '2021-10-16', 'end' : '2021-10-31'}])
+    shard_dates = games_df['game_date'].dt.strftime('%Y-%m-%d')
+
+    for shard in plan:
+        shard_df = games_df[(shard_dates >= shard['start']) & (shard_dates <= shard['end'])]
+        shard_df.to_csv(os.path.join(job_path, f"{shard['name']}.csv"), index=False)
+        assert shards.claim(job_path, shard['name'], 'w')
+        assert shards.complete(job_path, shard['name'], 'w', {'dates' : sorted(set(shard_df['game_date'].dt.strftime('%Y-%m-%d')))
+                                                             ,'games' : int(shard_df.shape[0])})
+
+    return plan
+
+@pytest.fixture
+def merge_outputs(tmp_path, isolated_stores, monkeypatch):
+    """
+    Point the merge's csv, parquet and sqlite outputs at tmp_path.
+
+    Returns tmp_path.
+    """
+
+    from load import load_game_data, sqlite_store
+
+    upsert_parquet, load_games = load_game_data.upsert_parquet, sqlite_store.load_games
+    monkeypatch.setattr(load_game_data, 'csv_file_path', str(tmp_path / 'csv'))
+    monkeypatch.setattr(load_game_data, 'upsert_parquet', lambda games_df: upsert_parquet(games_df, str(tmp_path / 'parquet')))
+    monkeypatch.setattr(sqlite_store, 'load_games', lambda games_df: load_games(games_df, str(tmp_path / 'lawler.db')))
+
+    return tmp_path
+
+
+def test_merge_loads_every_shard(tmp_path, merge_outputs):
+
+    job_path = str(tmp_path / 'job')
+    games_df = make_games_df(40, 5)
+    write_done_shards(job_path, games_df)
+
+    assert shards.claim(job_path, 'merge', 'h')
+    assert shards.merge_shards(job_path, '2021-10-01', '2021-10-31', 'h') == games_df.shape[0]
+    assert shards.is_done(job_path, 'merge')
+    assert get_manifest().loaded_games('2021-10-20')
+
+
+@pytest.mark.parametrize('damage, error', [('missing', FileNotFoundError), ('short', RuntimeError)])
+def test_merge_refuses_a_missing_or_short_shard_csv(tmp_path, merge_outputs, damage, error):
+
+    job_path = str(tmp_path / 'job')
+    games_df = make_games_df(40, 5)
+    plan = write_done_shards(job_path, games_df)
+    csv_path = os.path.join(job_path, f"{plan[1]['name']}.csv")
+
+    if damage == 'missing':
+        os.remove(csv_path)
+    else:
+        with open(csv_path) as f:
+            lines = f.readlines()
+        with open(csv_path, 'w') as f:
+            f.writelines(lines[:-3])  # the write stopped part way
+
+    assert shards.claim(job_path, 'merge', 'h')
+
+    with pytest.raises(error):
+        shards.merge_shards(job_path, '2021-10-01', '2021-10-31', 'h')
+
+    assert not os.path.exists(merge_outputs / 'csv')  # nothing written or loaded
+    assert not os.path.exists(merge_outputs / 'lawler.db')
+    assert not shards.is_done(job_path, 'merge')
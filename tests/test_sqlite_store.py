@@ -0,0 +1,29 @@
+from test_load_game_data import make_games_df
+from load import sqlite_store
+
+
+def test_reloading_games_is_an_idempotent_upsert(tmp_path):
+
+    db_path = str(tmp_path / 'lawler.db')
+    games_df = make_games_df(40, 5)
+
+    assert sqlite_store.load_games(games_df, db_path) == games_df.shape[0]
+    first_df = sqlite_store.read_games(db_path=db_path)
+
+    assert sqlite_store.load_games(games_df, db_path) == games_df.shape[0]
+    second_df = sqlite_store.read_games(db_path=db_path)
+
+    assert first_df.shape[0] == games_df.shape[0]
+    assert second_df.equals(first_df)  # same rows, same values
+
+    changed_df = games_df.copy()
+    changed_df.loc[0, 'final_home'] = changed_df.loc[0, 'final_home'] + 1
+    sqlite_store.load_games(changed_df, db_path)
+    stored_df = sqlite_store.read_games(db_path=db_path)
+
+    game_date, home_team = changed_df.loc[0, 'game_date'].strftime('%Y-%m-%d'), changed_df.loc[0, 'home_team']
+    is_changed = (stored_df['game_date'] == game_date) & (stored_df['home_team'] == home_team)
+
+    assert stored_df.shape[0] == games_df.shape[0]
+    assert stored_df.loc[is_changed, 'final_score'].tolist() == [f"{changed_df.loc[0, 'final_away']}-{changed_df.loc[0, 'final_home']}"]
+    assert stored_df[~is_changed].reset_index(drop=True).equals(first_df[~is_changed].reset_index(drop=True))
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from pipeline import stages
+
+
+def test_stage_exception_reaches_the_caller_without_deadlock():
+
+    def parse(item):
+        if item == 5:
+            raise ValueError('bad page')
+        return item
+
+    def source():  # an endless fetch, only the failure can stop it
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    results = []
+    errors = []
+    threads_before = threading.active_count()
+
+    def consume():
+        try:
+            for item in stages.pipeline(source(), [('parse', parse), ('load', None)], queue_size=2):
+                results.append(item)
+        except ValueError as e:
+            errors.append(e)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    consumer.join(10)
+
+    assert not consumer.is_alive(), 'pipeline deadlocked after a stage failed'
+    assert [str(e) for e in errors] == ['bad page']
+    assert results == list(range(len(results))) and len(results) <= 5  # in order, nothing after the failure
+    assert threading.active_count() == threads_before  # every stage thread was joined
+
+
+def test_queue_bound_holds_against_a_slow_consumer():
+
+    produced = []
+    queue_size = 2
+
+    def source():
+        for i in range(30):
+            produced.append(i)
+            yield i
+
+    consumed = 0
+    ahead = []
+
+    for item in stages.pipeline(source(), [('parse', lambda item: item)], queue_size=queue_size):
+        consumed += 1
+        time.sleep(0.02)  # a slow load stage, fetch and parse must wait for it
+        ahead.append(len(produced) - consumed)
+
+    assert consumed == 30
+    # in flight at most: one queue per stage boundary, plus the item each thread holds while blocked on a full queue
+    assert queue_size <= max(ahead) <= 2 * queue_size + 2
@@ -0,0 +1,81 @@
+import random
+
+import pandas as pd
+
+from transform.build_game_df import build_games_df
+from transform.timeline import GameTimeline, score_list_to_arrays
+
+teams = ['ATL', 'BOS', 'CHI', 'DEN', 'LAL', 'MIA', 'NYK', 'PHO']
+
+
+def make_score_list(rng : random.Random) -> list:
+    """
+    A random game as bball-ref's score cells: running "away-home" scores, with repeats for non scoring plays.
+    Some games stop short of 100, some end tied at the top (the home team is given the win).
+    """
+
+    away_score = home_score = 0
+    score_list = []
+    n_plays = rng.choice([0, rng.randint(1, 60), rng.randint(150, 260)])
+
+    for _ in range(n_plays):
+        if rng.random() < 0.6:
+            points = rng.choice([1, 2, 2, 3])
+            if rng.random() < 0.5:
+                away_score += points
+            else:
+                home_score += points
+        score_list.append(f"{away_score}-{home_score}")
+
+    return score_list
+
+def reference_result(away_team  : str
+                    ,home_team  : str
+                    ,score_list : list) -> dict:
+    """
+    Lawler's law one game at a time, the way the original row-by-row code evaluated it.
+    """
+
+    if not score_list:
+        return {'final_away' : None, 'final_home' : None, 'win_team' : None, 'reached_100_bool' : None
+               ,'lawler_bool' : None, 'away_at_100' : None, 'home_at_100' : None, 'delta_at_100' : None}
+
+    final_away, final_home = (int(part) for part in score_list[-1].split('-'))
+    win_team = away_team if final_away > final_home else home_team
+    result = {'final_away' : final_away, 'final_home' : final_home, 'win_team' : win_team, 'reached_100_bool' : max(final_away, final_home) >= 100
+             ,'lawler_bool' : None, 'away_at_100' : None, 'home_at_100' : None, 'delta_at_100' : None}
+
+    if result['reached_100_bool']:
+        for score in score_list:
+            away_score, home_score = (int(part) for part in score.split('-'))
+            if max(away_score, home_score) >= 100:
+                break
+
+        lawler_team = away_team if away_score == max(away_score, home_score) else home_team
+        result.update({'lawler_bool' : lawler_team == win_team, 'away_at_100' : away_score
+                      ,'home_at_100' : home_score, 'delta_at_100' : abs(away_score - home_score)})
+
+    return result
+
+
+def test_vectorized_evaluation_matches_reference():
+
+    rng = random.Random(7)
+    games = []
+
+    for i in range(3000):
+        away_team, home_team = rng.sample(teams, 2)
+        games.append((f"2022-01-{i % 28 + 1:02d}", home_team, away_team, make_score_list(rng)))
+
+    timelines = [GameTimeline(game_date, home_team, away_team, *score_list_to_arrays(score_list))
+                 for game_date, home_team, away_team, score_list in games]
+    games_df = build_games_df(timelines)
+
+    assert games_df.shape[0] == len(games)
+    assert 0 < games_df['reached_100_bool'].sum() < len(games)
+
+    for (game_date, home_team, away_team, score_list), row in zip(games, games_df.to_dict('records')):
+        expected = reference_result(away_team, home_team, score_list)
+        actual = {column : None if pd.isna(row[column]) else row[column] for column in expected}
+
+        assert actual == expected, (home_team, game_date, score_list[-1:])
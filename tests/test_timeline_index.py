@@ -0,0 +1,86 @@
+import random
+
+from test_timeline import make_score_list, teams
+from transform.timeline import GameTimeline, score_list_to_arrays
+from transform.timeline_index import TimelineIndex
+
+
+def make_timelines(n_games : int
+                  ,seed    : int) -> list:
+
+    rng = random.Random(seed)
+    timelines = []
+
+    for i in range(n_games):
+        away_team, home_team = rng.sample(teams, 2)
+        score_list = make_score_list(rng)
+        if score_list:
+            timelines.append(GameTimeline(f"{2000 + i // 300}-{i // 25 % 12 + 1:02d}-{i % 25 + 1:02d}", home_team, away_team
+                                         ,*score_list_to_arrays(score_list)))
+
+    return timelines
+
+def brute_force(timelines : list
+               ,threshold : int
+               ,min_lead  : int) -> dict:
+    """
+    First team to threshold in every game, one play at a time.
+
+    Returns dict of (game_date, home_team) -> (first_team, lead, first_team_won).
+    """
+
+    games = dict()
+
+    for game in timelines:
+        scores = list(zip(game.away_scores.tolist(), game.home_scores.tolist()))
+        win_team = game.away_team if scores[-1][0] > scores[-1][1] else game.home_team
+
+        for away_score, home_score in scores:
+            if max(away_score, home_score) >= threshold:
+                first_team = game.away_team if away_score >= home_score else game.home_team
+                lead = abs(away_score - home_score)
+                if lead >= min_lead:
+                    games[(game.game_date, game.home_team)] = (first_team, lead, first_team == win_team)
+                break
+
+    return games
+
+
+def test_threshold_queries_match_a_brute_force_scan(tmp_path):
+
+    timelines = make_timelines(1200, 11)
+    index = TimelineIndex(str(tmp_path / 'timelines.db'))
+    index.add(timelines)
+
+    assert len(index) == len(timelines)
+
+    for threshold, min_lead in [(100, 0), (90, 0), (110, 5), (60, 10)]:
+        games_df = index.query_first_to(threshold, min_lead)
+        found = {(row['game_date'], row['home_team']) : (row['first_team'], row['lead_at_threshold'], row['first_team_won'])
+                 for row in games_df.to_dict('records')}
+
+        assert found == brute_force(timelines, threshold, min_lead)
+
+    index.close()
+
+def test_loaded_batch_sees_rows_added_by_another_connection(tmp_path):
+
+    timelines = make_timelines(200, 3)
+    reader = TimelineIndex(str(tmp_path / 'timelines.db'))
+    writer = TimelineIndex(str(tmp_path / 'timelines.db'))  # stands in for a shard worker process
+
+    writer.add(timelines[:100])
+    assert len(reader.load()['game_date']) == 100
+
+    writer.add(timelines[100:])
+    assert len(reader.load()['game_date']) == len(timelines)
+
+    replaced = GameTimeline(timelines[0].game_date, timelines[0].home_team, 'XXX', timelines[0].away_scores, timelines[0].home_scores)
+    writer.add([replaced])  # same row count, changed row
+    assert 'XXX' in reader.load()['away_team']
+
+    reader.add(timelines[:1])  # and rows this connection wrote itself
+    assert 'XXX' not in reader.load()['away_team']
+
+    reader.close()
+    writer.close()
@@ -1,53 +1,27 @@
 import logging
 import pandas as pd
 import numpy as np
-import requests 
 import time
-import re
-
-from datetime import datetime, timedelta 
-from bs4 import BeautifulSoup
-
-team_dict = {'ATL' : ["Atlanta Hawks"]
-            ,'BUF' : ["Buffalo Braves"]
-            ,'BKN' : ["Brooklyn Nets"]
-            ,'BOS' : ["Boston Celtics"]
-            ,'BUF' : ['Buffalo Braves']
-            ,'CHA' : ["Charlotte Hornets"]
-            ,'CHH' : ['Charlotte Hornets']
-            ,'CHI' : ["Chicago Bulls"]
-            ,'CLE' : ["Cleveland Cavaliers"]
-            ,'DAL' : ["Dallas Mavericks"]
-            ,'DEN' : ["Denver Nuggets"]
-            ,'DET' : ["Detroit Pistons"]
-            ,'GSW' : ["Golden State Warriors"]
-            ,'HOU' : ["Houston Rockets"]
-            ,'IND' : ["Indiana Pacers"]
-            ,'KCK' : ['Kansas City Kings']
-            ,'LAC' : ["Los Angeles Clippers"]
-            ,'LAL' : ["Los Angeles Lakers"]
-            ,'MEM' : ["Memphis Grizzlies"]
-            ,'MIA' : ["Miami Heat"]
-            ,'MIL' : ["Milwaukee Bucks"]
-            ,'MIN' : ["Minnesota Timberwolves"]
-            ,'NJN' : ['New Jersey Nets']
-            ,'NOJ' : ['New Orleans Jazz']
-            ,'NOP' : ["New Orleans Pelicans"]
-            ,'NYK' : ["New York Knicks"]
-            ,'OKC' : ["Oklahoma City Thunder"]
-            ,'ORL' : ["Orlando Magic"]
-            ,'PHI' : ["Philadelphia 76ers"]
-            ,'PHX' : ["Phoenix Suns"]
-            ,'PHO' : ["Phoenix Suns"]  # b-ball ref seems to use both?
-            ,'POR' : ["Portland Trail Blazers"]
-            ,'SAC' : ["Sacramento Kings"]
-            ,'SAS' : ["San Antonio Spurs"]
-            ,'SEA' : ["Seattle SuperSonics"]
-            ,'TOR' : ["Toronto Raptors"]
-            ,'UTA' : ["Utah Jazz"]
-            ,'WAS' : ["Washington Wizards"]
-            ,'WSB' : ['Washington Bullets']
-            }
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from extract import html_cache
+from pipeline import metrics
+from transform.parse_engines import away_team_from_meta, scores_from_cells, get_engine
+from transform.result_builder import GameResultBuilder
+from transform.teams import team_dict
+from transform import result_cache
+from transform.result_cache import ParseResultCache, get_result_cache
+from transform import timeline_index
+from transform.timeline import GameTimeline, score_list_to_arrays, concat_timelines, evaluate_timelines
+
+parser_engine = 'bs4'  # 'bs4', 'lxml' or 'scan', see transform/parse_engines.py
+parse_workers = 1  # >1 parses games in a process pool
+parse_chunksize = 16  # games handed to a pool worker at a time
+index_timelines = True  # upsert every parsed timeline into transform/timeline_index for later threshold queries
+use_result_cache = True  # skip parsing pages whose content hash was parsed before (transform/result_cache.py)
 
 ### functions below are for parsing html ###
 
@@ -57,6 +31,8 @@ def get_soup(html : str):
     Return soup of html.
     """
 
+    from bs4 import BeautifulSoup  # only the legacy soup helpers need bs4 here, the engines import their own
+
     soup = BeautifulSoup('')
 
     try:
@@ -76,21 +52,10 @@ def get_away_team(game_soup
     Returns away team.
     """
     
-    meta_tags = game_soup.find_all('meta')
-    pattern = re.compile(f"(.*)content=\"(.*) vs {home_team}")
-
-    away_team = None
-    i = -1
+    meta_tags = [str(tag) for tag in game_soup.find_all('meta')]
 
     # search for away_team, if team is not found within meta_tags, return 'not_found'
-    while not away_team:
-        i += 1  # move to next index
-        if i == len(meta_tags): away_team = 'not_found'  # if index out of bounds, we could not find team
-
-        tag = meta_tags[i]
-        if pattern.match(str(tag)):
-            team_str = re.search(f"content=\"(.*) vs {home_team}", str(tag)).group(1)  # away team is beginning of this string
-            away_team = team_str[:3]  # first 3 characters will be away team
+    away_team = away_team_from_meta(meta_tags, home_team)
             
     return away_team
 
@@ -102,158 +67,306 @@ def get_score_list(game_soup) -> list:
     Returns list of unique scores in chronological order.
     """
     
-    score_tags = game_soup.find_all('td', class_='center')
-    score_pattern = re.compile("[0-9](.*)[0-9]")  # pattern for what scores look like
-    
-    scores = []
-    for tag in score_tags:
-        score = re.search(">(.*)<", str(tag)).group(1)  # all scores are formatted as >away_score-home_score<
-        if score not in scores: scores.append(score)
-        
-    scores = [score for score in scores if score_pattern.match(score)]
+    score_tags = [str(tag) for tag in game_soup.find_all('td', class_='center')]
+    scores = scores_from_cells(score_tags)
     
     return scores
 
-def get_teams_and_scores(game_html) -> dict:
+def split_game_key(game : str) -> tuple:
     """
-    Given home_team and date, contructs dictionary of home team, away team, ordered list of scores.
-    
-    Returns dictionary of teams, score_list (formatted HOME-AWAY)
+    Given a game key (abbrev_url_to_file_name of the pbp url), pull out home_team and game_date.
+
+    Returns home_team, game_date (yyyy-mm-dd).
     """
-    
 
-    game_soup = get_soup(game_html)
-    
-    away_team = get_away_team(game_soup, home_team)  
-    score_list = get_score_list(game_soup)
+    home_team = game.split('.html')[0][-3:]  # home team will always be 3 chars before .html
+    raw_date = game.split(f"0{home_team}.html")[0][-8:]  # date will always preced substring in the split
+    game_date = datetime.strptime(raw_date, '%Y%m%d').strftime("%Y-%m-%d")  # format to yyy-mm-dd
 
-    
-    game_dict = {'away_team'  : away_team
-                ,'home_team'  : home_team
-                ,'score_list' : score_list}
-    
-    return game_dict, resp_code
+    return home_team, game_date
 
-### functions below are for when data is extracted from html ###
 
-def test_lawlers_law(score_list : list
-                    ,win_team   : str
-                    ,away_team  : str
-                    ,home_team  : str) -> tuple:
+def parse_game(game            : str
+              ,game_html       : str
+              ,parse_game_html) -> GameTimeline:
+    """
+    Parse one game's html with parse_game_html (see parse_engines) into its compact score timeline.
+    With use_result_cache, a page whose content was parsed before is answered from the result cache.
 
+    Returns GameTimeline.
     """
-    Based on scores get lawler_bool, delta_at_100, score_at_100
-    
-    Returns lawler_bool, delta_at_100, score_at_100
+
+    home_team, game_date = split_game_key(game)
+
+    if use_result_cache:
+        content_hash = ParseResultCache.key(game_html, home_team, parse_game_html.__name__)
+        cached = get_result_cache().get(content_hash)
+
+        if cached is not None:
+            return GameTimeline(game_date, home_team, *cached)
+
+    start = time.perf_counter()
+    away_team, score_list = parse_game_html(game_html, home_team)  # parse html into away_team and scores
+    away_scores, home_scores = score_list_to_arrays(score_list)
+    metrics.observe('parse_seconds', time.perf_counter() - start)
+
+    if use_result_cache:
+        get_result_cache().put(content_hash, away_team, away_scores, home_scores)
+
+    return GameTimeline(game_date, home_team, away_team, away_scores, home_scores)
+
+
+def log_result_cache_stats(hits   : int
+                          ,misses : int):
+
+    metrics.incr('parse_cache_hits', hits)
+    metrics.incr('parse_cache_misses', misses)
+
+    if use_result_cache and hits + misses > 0:
+        logging.info(f"Parsed result cache: {hits} hits, {misses} misses")
+
+
+def evaluate_games(timelines : list) -> tuple:
     """
-    
-    high_score = 0  # initialize high_score for iteration
-    i = -1  # initialize index
-    while high_score < 100:
-        i += 1
-        score = score_list[i]
-        away_score = int(score.split('-')[0])  # away_score precedes the dash
-        home_score = int(score.split('-')[1])  # home_score succeeds the dash
-        high_score = max([away_score, home_score])
-    
-    score_at_100 = score
-    delta_at_100 = abs(away_score - home_score)
-    
-    if high_score == away_score:
-        lawler_team = away_team
-    else:
-        lawler_team = home_team
-    
-    if lawler_team == win_team:
-        lawler_bool = True
-    else:
-        lawler_bool = False
-        
-    return lawler_bool, delta_at_100, score_at_100
+    Apply Lawler's law to every game in timelines at once (see transform/timeline.py).
 
+    Returns dict of column -> array and dict of null masks for GameResultBuilder.append_columns.
+    """
 
-def get_game_attributes(away_team   : str
-                        ,home_team  : str
-                        ,score_list : list) -> tuple:
+    away_all, home_all, offsets = concat_timelines([(game.away_scores, game.home_scores) for game in timelines])
+    result = evaluate_timelines(away_all, home_all, offsets)
+
+    away_teams = np.array([game.away_team for game in timelines], dtype=object)
+    home_teams = np.array([game.home_team for game in timelines], dtype=object)
+    has_scores = result['has_scores']  # games without a score_list keep every attribute as None
+    reached = result['reached']
+
+    win_team = np.where(result['away_wins'], away_teams, home_teams)  # ties go to the home team
+    lose_team = np.where(result['away_wins'], home_teams, away_teams)
+    lawler_team = np.where(result['lawler_away'], away_teams, home_teams)  # team that reached 100 first
+
+    columns = {'game_date' : np.array([game.game_date for game in timelines], dtype=object)
+              ,'away_team' : away_teams
+              ,'home_team' : home_teams
+              ,'final_away' : result['final_away']
+              ,'final_home' : result['final_home']
+              ,'win_team' : np.where(has_scores, win_team, None)
+              ,'lose_team' : np.where(has_scores, lose_team, None)
+              ,'reached_100_bool' : reached
+              ,'lawler_bool' : lawler_team == win_team
+              ,'away_at_100' : result['away_at']
+              ,'home_at_100' : result['home_at']
+              ,'delta_at_100' : result['delta_at']}
+
+    nulls = {'final_away' : ~has_scores
+            ,'final_home' : ~has_scores
+            ,'reached_100_bool' : ~has_scores
+            ,'lawler_bool' : ~reached
+            ,'away_at_100' : ~reached
+            ,'home_at_100' : ~reached
+            ,'delta_at_100' : ~reached}
+
+    return columns, nulls
+
+
+### process pool parsing: cached games are sent as keys (workers read the html themselves), html passed in is sent along ###
+
+_worker_parse_game_html = None
+_worker_verified = False
+
+def _init_parse_worker(engine   : str
+                      ,verified : bool = False):
     """
-    Based on teams & score_list, get winner, loser, reached_100_bool, lawler_bool, score_at_100, final_score
+    Runs once in each pool worker: pick the engine and drop any cache handle inherited from the parent.
     """
-    
-    # get final scores
-    final_score = score_list[-1]  # final_score is last in score_list
-    away_score = int(final_score.split('-')[0])  # away_score precedes the dash
-    home_score = int(final_score.split('-')[1])  # home_score succeeds the dash
-    
-    # get winner loser
-    if away_score > home_score:
-        win_team = away_team
-        lose_team = home_team
+
+    global _worker_parse_game_html, _worker_verified
+
+    html_cache._cache = None  # sqlite connections must not cross a fork, each worker opens its own
+    result_cache._cache = None
+    _worker_parse_game_html = get_engine(engine)
+    _worker_verified = verified
+
+def _parse_cached_game(game : str) -> tuple:
+    """
+    Worker task: read game's html from the cache and parse it.
+
+    Returns GameTimeline, whether it came from the parsed result cache and seconds spent on it
+    (metrics recorded in a worker process are never exported, the parent records them).
+    """
+
+    cache = html_cache.get_cache()
+    home_team, game_date = split_game_key(game)
+    game_date = datetime.strptime(game_date, '%Y-%m-%d')
+
+    if _worker_verified or cache.exists(game, game_date):  # verified keys come from the cache inventory, no existence check per file
+        game_html = html_cache.read_page(game, game_date)
     else:
-        win_team = home_team
-        lose_team = away_team
-        
-    # get 100s
-    reached_100_bool = (max(away_score, home_score) >= 100)  # if one or both teams reached 100 return True else False
-    lawler_bool = None
-    delta_at_100 = None
-    score_at_100 = None
-    
-    if reached_100_bool:  # if someone reached 100, test lawlers
-        lawler_bool, delta_at_100, score_at_100 = test_lawlers_law(score_list, win_team, away_team, home_team)
-    
-    
-    return final_score, win_team, lose_team, reached_100_bool, lawler_bool, delta_at_100, score_at_100
+        game_html = ''  # page was never cached (failed fetch)
 
+    return _parse_in_worker(game, game_html)
 
-def read_game_data_from_html(all_html_dict : dict) -> pd.DataFrame:
+def _parse_passed_game(game_item : tuple) -> tuple:
+    """
+    Worker task: parse a (game, game_html) pair handed over by the parent.
+
+    Returns same as _parse_cached_game.
+    """
+
+    return _parse_in_worker(*game_item)
+
+def _parse_in_worker(game      : str
+                    ,game_html : str) -> tuple:
+
+    hits = get_result_cache().hits if use_result_cache else 0
+    start = time.perf_counter()
+    timeline = parse_game(game, game_html, _worker_parse_game_html)
+
+    return timeline, use_result_cache and get_result_cache().hits > hits, time.perf_counter() - start
+
+def parse_cached_games(games     : list
+                      ,engine    : str = None
+                      ,workers   : int = None
+                      ,chunksize : int = None
+                      ,verified  : bool = False) -> list:
+    """
+    Parse games (list of cache keys) on a pool of worker processes.
+    Results come back in the same order as games, same as the serial path.
+    verified means every key is known to be cached, workers read the pages without checking first.
+
+    Returns list of GameTimeline.
+    """
+
+    return _parse_on_pool(_parse_cached_game, games, engine, workers, chunksize, verified)
+
+def parse_html_games(all_html_dict : dict
+                    ,engine        : str = None
+                    ,workers       : int = None
+                    ,chunksize     : int = None) -> list:
+    """
+    Parse the html in all_html_dict (game -> html) on a pool of worker processes, in dict order.
+    The html itself is sent to the workers, so the result is the same as parsing it serially
+    whether or not the page is in the html cache.
+
+    Returns list of GameTimeline.
+    """
+
+    return _parse_on_pool(_parse_passed_game, list(all_html_dict.items()), engine, workers, chunksize)
+
+def _parse_on_pool(task
+                  ,items     : list
+                  ,engine    : str = None
+                  ,workers   : int = None
+                  ,chunksize : int = None
+                  ,verified  : bool = False) -> list:
+    """
+    Map task over items on a process pool and record the parse metrics in the parent.
+
+    Returns list of GameTimeline in items order.
+    """
+
+    workers = workers or parse_workers or os.cpu_count()
+    chunksize = chunksize or parse_chunksize
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker, initargs=(engine or parser_engine, verified)) as pool:
+        results = list(pool.map(task, items, chunksize=chunksize))
+
+    for timeline, hit, seconds in results:
+        if not hit:
+            metrics.observe('parse_seconds', seconds)
+
+    hits = sum(1 for timeline, hit, seconds in results if hit)
+    log_result_cache_stats(hits, len(results) - hits)
+
+    return [timeline for timeline, hit, seconds in results]
+
+
+def build_games_df(timelines : list) -> pd.DataFrame:
+    """
+    Evaluate every parsed game in one vectorized pass and build one dataframe via the columnar GameResultBuilder.
+
+    Returns all_games_df.
+    """
+
+    builder = GameResultBuilder(len(timelines))
+
+    if timelines:
+        with metrics.timer('evaluate'):
+            columns = evaluate_games(timelines)
+        builder.append_columns(*columns)
+
+    with metrics.timer('build_frame'):
+        return builder.to_frame()
+
+
+def read_game_data_from_html(all_html_dict : dict
+                            ,engine        : str = None
+                            ,workers       : int = None
+                            ,chunksize     : int = None) -> pd.DataFrame:
     """
     Builds dataframe based on home_team, away_team, score_list.
+    Pages are parsed with the given engine (defaults to parser_engine).
+
+    With more than one worker the games are parsed in a process pool on the html passed in
+    (read_game_data_from_cache sends only keys, for pages that are known to be cached).
     
     Returns game_df.
     """
     
-    df_dict = dict()  # dictionary where all dataframes will be stored
-
-    for game in all_html_dict.keys():  # each key is a game with corresponding html
-
-        home_team = game.split('.html')[0][-3:]  # home team will always be 3 chars before .html
-        raw_date = game.split(f"0{home_team}.html")[0][-8:]  # date will always preced substring in the split
-        game_date = datetime.strptime(raw_date, '%Y%m%d').strftime("%Y-%m-%d")  # format to yyy-mm-dd
-
-        game_html = all_html_dict.get(game)  # retrieve html
-        game_soup = get_soup(game_html)  # parse html into soup
-
-        away_team = get_away_team(game_soup, home_team)  
-        score_list = get_score_list(game_soup)
-
-        
-        final_score = None
-        win_team = None
-        lose_team = None
-        reached_100_bool = None
-        lawler_bool = None 
-        delta_at_100 = None 
-        score_at_100 = None 
-
-        if len(score_list) > 0:  # if we were able to get a score_list, we overwrite the attributes initialized above
-            final_score, win_team, lose_team, reached_100_bool, lawler_bool, delta_at_100, score_at_100 = get_game_attributes(away_team, home_team, score_list)
-        
-        game_df = pd.DataFrame({'game_date': [game_date]
-                            ,'away_team' : [away_team]
-                            ,'home_team' : [home_team]
-                            ,'final_score' : [final_score]
-                            ,'win_team' : [win_team]
-                            ,'lose_team' : [lose_team]
-                            ,'reached_100_bool' : [reached_100_bool]
-                            ,'lawler_bool' : [lawler_bool]
-                            ,'score_at_100' : [score_at_100]
-                            ,'delta_at_100' : [delta_at_100]})
-
-        df_dict[game] = game_df.copy()  # each df has a unique game_date + home_team pairing
-        
-    all_games_df = pd.DataFrame()  # in case there is no game data in the date range
-    
-    if df_dict:  # if dict is not empty, concat into a dataframe
-        all_games_df = pd.concat(df_dict).reset_index(drop=True)
+    workers = workers or parse_workers
+
+    if workers > 1 and len(all_html_dict) > 1:
+        with metrics.timer('parse'):
+            timelines = parse_html_games(all_html_dict, engine, workers, chunksize)
+
+    else:
+        parse_game_html = get_engine(engine or parser_engine)
+        hits, misses = (get_result_cache().hits, get_result_cache().misses) if use_result_cache else (0, 0)
+
+        with metrics.timer('parse'):
+            timelines = [parse_game(game, game_html, parse_game_html) for game, game_html in all_html_dict.items()]  # each key is a game with corresponding html
+
+        if use_result_cache:
+            log_result_cache_stats(get_result_cache().hits - hits, get_result_cache().misses - misses)
+
+    if index_timelines and timelines:
+        with metrics.timer('index_timelines'):
+            timeline_index.get_index().add(timelines)
+
+    return build_games_df(timelines)
+
+
+def read_game_data_from_cache(games     : list
+                             ,engine    : str = None
+                             ,workers   : int = None
+                             ,chunksize : int = None
+                             ,verified  : bool = False) -> pd.DataFrame:
+    """
+    Re-parse already cached games (list of cache keys) without loading their html in this process.
+    Uses every core unless workers is given. Pass verified=True for keys taken from extract/cache_inventory.py.
+
+    Returns game_df.
+    """
+
+    with metrics.timer('parse'):
+        timelines = parse_cached_games(games, engine, workers or os.cpu_count(), chunksize, verified)
+
+    if index_timelines and timelines:
+        with metrics.timer('index_timelines'):
+            timeline_index.get_index().add(timelines)
+
+    return build_games_df(timelines)
+
+
+def iter_game_data_from_html(html_iter) -> pd.DataFrame:
+    """
+    Streaming version of read_game_data_from_html. Takes an iterable of (game_date, game_html_dict)
+    such as extract_game_data.iter_game_html_between_dates and parses one day at a time.
+
+    Yields game_date and game_df for each day (game_df is empty on days without games).
+    """
+
+    for game_date, game_html_dict in html_iter:
+        game_df = read_game_data_from_html(game_html_dict)
 
-    return all_games_df
\ No newline at end of file
+        yield game_date, game_df
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from transform.teams import team_dict
+from transform.timeline import format_scores
+
+### compact typed schema of the games dataframe ###
+#
+#   game_date                                   datetime64[s]   (8 bytes, midnight)
+#   away_team, home_team, win_team, lose_team   category        (int8 codes into the 38 team codes)
+#   final_away, final_home                      Int16           (the old "away-home" final_score string, split)
+#   reached_100_bool, lawler_bool               boolean         (nullable, was an object column of True/False/None)
+#   away_at_100, home_at_100, delta_at_100      Int16           (the old score_at_100 string, split)
+#
+# Every team column shares one CategoricalDtype, so frames concatenate without falling back to object and
+# filters compare int8 codes. csv and parquet files hold this layout, to_compact also reads the old one
+# (final_score / score_at_100 strings) so csvs written before the split load the same way. The sqlite table
+# keeps its text columns, to_legacy rebuilds the score strings for it.
+
+game_columns = ['game_date'
+               ,'away_team'
+               ,'home_team'
+               ,'final_away'
+               ,'final_home'
+               ,'win_team'
+               ,'lose_team'
+               ,'reached_100_bool'
+               ,'lawler_bool'
+               ,'away_at_100'
+               ,'home_at_100'
+               ,'delta_at_100']
+
+legacy_columns = ['game_date', 'away_team', 'home_team', 'final_score', 'win_team', 'lose_team'
+                 ,'reached_100_bool', 'lawler_bool', 'score_at_100', 'delta_at_100']  # the object layout before the split
+
+team_columns = ['away_team', 'home_team', 'win_team', 'lose_team']
+score_columns = ['final_away', 'final_home', 'away_at_100', 'home_at_100', 'delta_at_100']
+bool_columns = ['reached_100_bool', 'lawler_bool']
+split_columns = {'final_score' : ('final_away', 'final_home'), 'score_at_100' : ('away_at_100', 'home_at_100')}  # old column -> split columns
+
+team_dtype = pd.CategoricalDtype(sorted(team_dict))
+score_dtype = 'Int16'
+date_dtype = 'datetime64[s]'
+
+csv_dtypes = {column : 'category' for column in team_columns}  # pd.read_csv dtype=, everything else is cast by to_compact
+
+def to_team_category(teams : pd.Series) -> pd.Series:
+    """
+    Cast team codes (strings or any categorical) to team_dtype. A code missing from team_dict (a relocated
+    franchise) is added to the categories instead of turning into NaN.
+
+    Returns categorical series.
+    """
+
+    is_categorical = isinstance(teams.dtype, pd.CategoricalDtype)
+
+    if not is_categorical:
+        teams = teams.astype('string')
+
+    unknown = set(teams.cat.categories if is_categorical else teams.dropna().unique()) - set(team_dtype.categories)
+    dtype = pd.CategoricalDtype(sorted(set(team_dtype.categories) | unknown)) if unknown else team_dtype
+
+    return teams.cat.set_categories(dtype.categories) if is_categorical else teams.astype(dtype)
+
+def split_scores(scores : pd.Series) -> tuple:
+    """
+    Split "away-home" strings (None for missing) into two Int16 series.
+
+    Returns away scores and home scores.
+    """
+
+    parts = scores.astype('string').str.split('-', n=1, expand=True)
+
+    if parts.shape[1] < 2:  # every value missing
+        empty = pd.array([pd.NA] * len(scores), dtype=score_dtype)
+        return pd.Series(empty, index=scores.index), pd.Series(empty.copy(), index=scores.index)
+
+    return pd.to_numeric(parts[0]).astype(score_dtype), pd.to_numeric(parts[1]).astype(score_dtype)
+
+def to_compact(games_df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast a games dataframe in either layout (split score columns, or the old final_score / score_at_100 strings)
+    to the compact schema, columns in game_columns order.
+
+    Returns compact copy of games_df.
+    """
+
+    if games_df.shape[1] == 0:
+        return empty_frame()
+
+    compact_df = pd.DataFrame(index=games_df.index)
+    compact_df['game_date'] = pd.to_datetime(games_df['game_date'], format='%Y-%m-%d').astype(date_dtype)
+
+    for column in team_columns:
+        compact_df[column] = to_team_category(games_df[column])
+
+    for old_column, (away_column, home_column) in split_columns.items():
+        if away_column in games_df.columns:
+            away, home = games_df[away_column].astype(score_dtype), games_df[home_column].astype(score_dtype)
+
+            if old_column in games_df.columns:  # parquet part files from both layouts read into one frame
+                old_away, old_home = split_scores(games_df[old_column])
+                away, home = away.fillna(old_away), home.fillna(old_home)
+        else:
+            away, home = split_scores(games_df[old_column])
+
+        compact_df[away_column], compact_df[home_column] = away, home
+
+    for column in bool_columns:
+        compact_df[column] = games_df[column].astype('boolean')
+
+    compact_df['delta_at_100'] = games_df['delta_at_100'].astype(score_dtype)
+
+    return compact_df[game_columns]
+
+def empty_frame() -> pd.DataFrame:
+    """
+    Returns a dataframe with no rows and every column of the compact schema.
+    """
+
+    return pd.DataFrame({'game_date' : pd.Series([], dtype=date_dtype)
+                        ,**{column : pd.Series([], dtype=team_dtype) for column in team_columns}
+                        ,**{column : pd.Series([], dtype=score_dtype) for column in score_columns}
+                        ,**{column : pd.Series([], dtype='boolean') for column in bool_columns}})[game_columns]
+
+def to_legacy(games_df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Rebuild the old layout from a compact dataframe: yyyy-mm-dd string dates, object team codes and
+    "away-home" final_score / score_at_100 strings (None where missing).
+
+    Returns dataframe.
+    """
+
+    legacy_df = pd.DataFrame(index=games_df.index)
+    legacy_df['game_date'] = pd.to_datetime(games_df['game_date']).dt.strftime('%Y-%m-%d')
+
+    for column in team_columns:
+        legacy_df[column] = games_df[column].astype(object).where(games_df[column].notna(), None)
+
+    for old_column, (away_column, home_column) in split_columns.items():
+        missing = (games_df[away_column].isna() | games_df[home_column].isna()).to_numpy()
+        away, home = games_df[away_column].fillna(0).to_numpy(np.int64), games_df[home_column].fillna(0).to_numpy(np.int64)
+        legacy_df[old_column] = np.where(missing, None, format_scores(away, home))
+
+    for column in bool_columns:
+        legacy_df[column] = games_df[column].astype(object).where(games_df[column].notna(), None)
+
+    legacy_df['delta_at_100'] = games_df['delta_at_100']
+
+    return legacy_df[legacy_columns]
@@ -0,0 +1,240 @@
+import logging
+import re
+import sys
+
+### selectable engines for pulling away_team and score_list out of a pbp page ###
+#
+# Every engine reduces the page to the same two fragments (meta tag strings and td.center tag strings)
+# and hands them to the shared helpers below, so the Lawler logic only exists once.
+#   bs4  : BeautifulSoup html.parser over the whole page (original behaviour)
+#   lxml : lxml's C parser + xpath (requires lxml)
+#   scan : regex tokenizer that only looks at <meta> and <td> tags, no tree is built
+
+parser_version = 1  # bump whenever an engine's output changes, invalidates transform/result_cache.py
+
+score_pattern = re.compile("[0-9](.*)[0-9]")  # pattern for what scores look like
+cell_pattern = re.compile(">(.*)<")  # all scores are formatted as >away_score-home_score<
+
+hidden_pattern = re.compile(r"<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>", re.IGNORECASE | re.DOTALL)  # html.parser never sees tags in these
+meta_tag_pattern = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
+td_tag_pattern = re.compile(r"<td\b([^>]*)>(.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+content_attr_pattern = re.compile(r"""\bcontent\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+class_attr_pattern = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+def away_team_from_meta(meta_strs : list
+                       ,home_team : str) -> str:
+    """
+    Given meta tags as strings, find the "AWAY vs HOME" content and take the away team.
+
+    Returns away team ('not_found' if no tag matches).
+    """
+
+    pattern = re.compile(f"(.*)content=\"(.*) vs {home_team}")
+
+    for tag_str in meta_strs:
+        if pattern.match(tag_str):
+            team_str = re.search(f"content=\"(.*) vs {home_team}", tag_str).group(1)  # away team is beginning of this string
+            return team_str[:3]  # first 3 characters will be away team
+
+    return 'not_found'
+
+def scores_from_cells(cell_strs : list) -> list:
+    """
+    Given td.center tags as strings, extract score from each tag.
+
+    Returns list of unique scores in chronological order.
+    """
+
+    scores = []
+    seen = set()  # set lookup keeps the dedup linear in the number of cells
+    for tag_str in cell_strs:
+        match = cell_pattern.search(tag_str)
+        if match is None: continue  # cell spans lines, can't be a score
+
+        score = match.group(1)
+        if score not in seen:
+            seen.add(score)
+            scores.append(score)
+
+    scores = [score for score in scores if score_pattern.match(score)]
+
+    return scores
+
+
+def parse_bs4(game_html : str
+             ,home_team : str) -> tuple:
+    """
+    Parse game_html with BeautifulSoup's html.parser.
+
+    Returns away_team, score_list.
+    """
+
+    from bs4 import BeautifulSoup  # imported on first use like lxml, the scan engine needs neither
+
+    game_soup = BeautifulSoup(game_html, features='html.parser')
+
+    meta_strs = [str(tag) for tag in game_soup.find_all('meta')]
+    cell_strs = [str(tag) for tag in game_soup.find_all('td', class_='center')]
+
+    return away_team_from_meta(meta_strs, home_team), scores_from_cells(cell_strs)
+
+def parse_lxml(game_html : str
+              ,home_team : str) -> tuple:
+    """
+    Parse game_html with lxml.
+
+    Returns away_team, score_list.
+    """
+
+    from lxml import html as lxml_html  # optional dependency, only needed for this engine
+
+    if not game_html.strip():
+        return away_team_from_meta([], home_team), []
+
+    root = lxml_html.fromstring(game_html)
+
+    meta_strs = [f'<meta content="{tag.get("content")}">' for tag in root.iter('meta') if tag.get('content') is not None]
+
+    cell_strs = []
+    for tag in root.xpath("//td[contains(concat(' ', normalize-space(@class), ' '), ' center ')]"):
+        if len(tag) == 0:
+            cell_strs.append(f'<td>{tag.text or ""}</td>')  # text only cell, no need to serialize
+        else:
+            cell_strs.append(lxml_html.tostring(tag, encoding='unicode', with_tail=False))
+
+    return away_team_from_meta(meta_strs, home_team), scores_from_cells(cell_strs)
+
+def parse_scan(game_html : str
+              ,home_team : str) -> tuple:
+    """
+    Scan game_html for <meta> and <td class="center"> tags with regexes, without building a tree.
+
+    Returns away_team, score_list.
+    """
+
+    game_html = hidden_pattern.sub('', game_html)  # bball-ref hides some tables inside comments
+
+    meta_strs = []
+    for tag in meta_tag_pattern.findall(game_html):
+        content = content_attr_pattern.search(tag)
+        if content:
+            meta_strs.append(f'<meta content="{content.group(1) if content.group(1) is not None else content.group(2)}">')
+
+    cell_strs = []
+    for attrs, inner in td_tag_pattern.findall(game_html):
+        class_attr = class_attr_pattern.search(attrs)
+        if class_attr and 'center' in ''.join(part for part in class_attr.groups() if part).split():
+            cell_strs.append(f'<td>{inner}</td>')
+
+    return away_team_from_meta(meta_strs, home_team), scores_from_cells(cell_strs)
+
+engines = {'bs4'  : parse_bs4
+          ,'lxml' : parse_lxml
+          ,'scan' : parse_scan}
+
+def get_engine(name : str):
+    """
+    Returns parse function for engine name.
+    """
+
+    if name not in engines:
+        raise ValueError(f"Unknown parser engine '{name}', choose from {list(engines)}")
+
+    return engines[name]
+
+
+### page trimming: cut a pbp page down to the fragments the engines read ###
+
+pbp_table_pattern = re.compile(r"""<table\b[^>]*\bid\s*=\s*["']?pbp\b[^>]*>.*?</table\s*>""", re.IGNORECASE | re.DOTALL)
+pbp_table_bytes_pattern = re.compile(pbp_table_pattern.pattern.encode('utf-8'), re.IGNORECASE | re.DOTALL)
+meta_tag_bytes_pattern = re.compile(meta_tag_pattern.pattern.encode('utf-8'), re.IGNORECASE)
+
+def in_comment(page
+              ,position : int) -> bool:
+    """
+    Returns True if position of page (str, bytes or mmap) lies inside an html comment.
+    """
+
+    open_str, close_str = ('<!--', '-->') if isinstance(page, str) else (b'<!--', b'-->')
+
+    return page.rfind(open_str, 0, position) > page.rfind(close_str, 0, position)
+
+def find_pbp_table(page):
+    """
+    Returns the match of the first pbp table of page (str, bytes or mmap) that is not inside an html comment,
+    bball-ref pages also carry commented-out copies. None if there is no visible one.
+    """
+
+    table_pattern = pbp_table_pattern if isinstance(page, str) else pbp_table_bytes_pattern
+
+    return next((match for match in table_pattern.finditer(page) if not in_comment(page, match.start())), None)
+
+def trim_page(page) -> str:
+    """
+    Keep only what the engines look at: every visible meta tag and the pbp table.
+    page may be a str, or bytes / mmap which are searched in place so only the kept slices are copied.
+
+    Returns trimmed html, or None if page has no visible pbp table (the caller keeps the whole page).
+    """
+
+    is_text = isinstance(page, str)
+    meta_pattern = meta_tag_pattern if is_text else meta_tag_bytes_pattern
+    table = find_pbp_table(page)
+
+    if table is None:
+        return None
+
+    meta_tags = [match.group(0) for match in meta_pattern.finditer(page, 0, table.start()) if not in_comment(page, match.start())]
+    meta_tags += [match.group(0) for match in meta_pattern.finditer(page, table.end()) if not in_comment(page, match.start())]
+    fragments = [table.group(0)] + meta_tags
+
+    if not is_text:
+        fragments = [fragment.decode('utf-8') for fragment in fragments]
+
+    return f"<html><head>{''.join(fragments[1:])}</head><body>{fragments[0]}</body></html>"
+
+
+def compare_engines(html_dict : dict
+                   ,names     : list = None) -> list:
+    """
+    Differential check: parse every page in html_dict (abbrev -> html) with each engine and compare to bs4.
+
+    Returns list of (abbrev, engine) pairs whose output differed.
+    """
+
+    names = names or [name for name in engines if name != 'bs4']
+    mismatches = []
+
+    for abbrev, game_html in html_dict.items():
+        home_team = abbrev.split('.html')[0][-3:]  # home team will always be 3 chars before .html
+        expected = parse_bs4(game_html, home_team)
+
+        for name in names:
+            if get_engine(name)(game_html, home_team) != expected:
+                logging.info(f"{name} output differs from bs4 for {abbrev}")
+                mismatches.append((abbrev, name))
+
+    return mismatches
+
+
+if __name__ == "__main__":
+
+    # python -m transform.parse_engines check [engine ...]
+    # compares every cached pbp page against the bs4 engine
+    from extract.html_cache import get_cache
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'check':
+        print('usage: python -m transform.parse_engines check [engine ...]')
+        sys.exit(1)
+
+    cache = get_cache()
+    pbp_keys = [(key, date) for key, date in cache.keys() if key.startswith('pbp_')]
+    html_dict = {key : cache.read(key, date) for key, date in pbp_keys}
+
+    mismatches = compare_engines(html_dict, sys.argv[2:] or None)
+
+    for abbrev, name in mismatches:
+        print(f"MISMATCH {name} {abbrev}")
+
+    print(f"Checked {len(html_dict)} cached pages, {len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
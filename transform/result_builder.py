@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from transform.game_schema import game_columns, team_columns, score_columns, bool_columns, date_dtype, to_team_category, empty_frame
+
+int_columns = score_columns  # int16 buffer + null mask each
+flag_columns = bool_columns  # bool buffer + null mask each, game_date and the team codes are object buffers
+
+class GameResultBuilder:
+    """
+    Accumulates parsed game rows into preallocated column buffers and builds one dataframe at the end.
+
+    Buffers double in size when full, so appending a game is a handful of array stores
+    instead of a 1-row dataframe + pd.concat.
+    """
+
+    def __init__(self
+                ,capacity : int = 1024):
+
+        self._capacity = max(capacity, 1)
+        self._n = 0
+        self._alloc(self._capacity)
+
+    def _alloc(self
+              ,capacity : int):
+
+        self._buffers = {column : np.empty(capacity, dtype=np.int16 if column in int_columns else bool if column in flag_columns else object) for column in game_columns}
+        self._null = {column : np.zeros(capacity, dtype=bool) for column in int_columns + flag_columns}
+
+    def _grow(self):
+
+        old_buffers, old_null, n = self._buffers, self._null, self._n
+        self._capacity *= 2
+        self._alloc(self._capacity)
+
+        for column in game_columns:
+            self._buffers[column][:n] = old_buffers[column][:n]
+        for column in int_columns + flag_columns:
+            self._null[column][:n] = old_null[column][:n]
+
+    def __len__(self) -> int:
+
+        return self._n
+
+    def append(self
+              ,row : dict):
+        """
+        Add one evaluated game: dict of column -> value for the game_columns (split scores and bools, None for missing).
+        Batches of parsed GameTimelines go through build_game_df.evaluate_games and append_columns instead.
+        """
+
+        if self._n == self._capacity:
+            self._grow()
+
+        i = self._n
+
+        for column in game_columns:
+            value = row.get(column)
+
+            if column in self._null:
+                self._null[column][i] = value is None
+                self._buffers[column][i] = 0 if value is None else value
+            else:
+                self._buffers[column][i] = value
+
+        self._n += 1
+
+    def extend(self
+              ,rows : list):
+
+        for row in rows:
+            self.append(row)
+
+    def append_columns(self
+                      ,columns : dict
+                      ,nulls   : dict = None):
+        """
+        Add a whole batch of games at once. columns is column -> array of equal length,
+        nulls is int or flag column -> bool array marking missing values.
+        """
+
+        nulls = nulls or dict()
+        k = len(columns[game_columns[0]])
+
+        while self._n + k > self._capacity:
+            self._grow()
+
+        i = self._n
+
+        for column in game_columns:
+            self._buffers[column][i:i + k] = columns[column]
+
+            if column in self._null:
+                self._null[column][i:i + k] = nulls.get(column, False)
+
+        self._n += k
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns one dataframe of every appended game in the compact schema of transform/game_schema.py
+        (no rows, but every column, if there are none).
+        """
+
+        if self._n == 0:
+            return empty_frame()  # in case there is no game data in the date range
+
+        n = self._n
+        data = dict()
+
+        for column in game_columns:
+            if column in int_columns:
+                data[column] = pd.arrays.IntegerArray(self._buffers[column][:n].copy(), self._null[column][:n].copy())
+            elif column in flag_columns:
+                data[column] = pd.arrays.BooleanArray(self._buffers[column][:n].copy(), self._null[column][:n].copy())
+            elif column in team_columns:
+                data[column] = to_team_category(pd.Series(self._buffers[column][:n]))
+            else:
+                data[column] = self._buffers[column][:n].astype('datetime64[D]').astype(date_dtype)  # yyyy-mm-dd strings
+
+        return pd.DataFrame(data)
+
+    def reset(self):
+        """
+        Drop all appended games (keeps the buffers), e.g. between chunks in streaming mode.
+        """
+
+        for column in game_columns:
+            if column not in self._null:
+                self._buffers[column][:self._n] = None  # release references to the old values
+
+        self._n = 0
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from transform.parse_engines import parser_version
+from transform.timeline import score_dtype
+
+### memo of parsed games keyed on the html content hash, so unchanged pages are never parsed twice ###
+
+result_cache_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'parse_cache.db'))
+max_entries = 200000  # roughly every game since 1996 several times over, least recently used entries are evicted past this
+
+class ParseResultCache:
+    """
+    Parsed (away_team, away_scores, home_scores) per sha1 of (parser_version, engine, home_team, html).
+
+    Bounded to max_entries with LRU eviction on the last_used timestamp.
+    """
+
+    def __init__(self
+                ,path        : str = result_cache_db
+                ,max_entries : int = max_entries):
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # pool workers share the file
+        self._conn.execute("PRAGMA journal_mode = WAL")
+
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS results (content_hash TEXT PRIMARY KEY
+                                                                     ,away_team    TEXT
+                                                                     ,away_scores  BLOB NOT NULL
+                                                                     ,home_scores  BLOB NOT NULL
+                                                                     ,last_used    REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+        self._size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @staticmethod
+    def key(game_html   : str
+           ,home_team   : str
+           ,engine_name : str) -> str:
+        """
+        Returns content hash for a page parsed by engine_name.
+        """
+
+        digest = hashlib.sha1(f"{parser_version}|{engine_name}|{home_team}|".encode('utf-8'))
+        digest.update(game_html.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self
+           ,content_hash : str) -> tuple:
+        """
+        Returns (away_team, away_scores, home_scores) or None on a miss.
+        """
+
+        with self._lock:
+            row = self._conn.execute("SELECT away_team, away_scores, home_scores FROM results WHERE content_hash = ?", (content_hash,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            with self._conn:
+                self._conn.execute("UPDATE results SET last_used = ? WHERE content_hash = ?", (time.time(), content_hash))
+
+        return row[0], np.frombuffer(row[1], dtype=score_dtype), np.frombuffer(row[2], dtype=score_dtype)
+
+    def put(self
+           ,content_hash : str
+           ,away_team    : str
+           ,away_scores  : np.ndarray
+           ,home_scores  : np.ndarray):
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO results (content_hash, away_team, away_scores, home_scores, last_used) VALUES (?, ?, ?, ?, ?)"
+                              ,(content_hash, away_team
+                               ,np.asarray(away_scores, dtype=score_dtype).tobytes()
+                               ,np.asarray(home_scores, dtype=score_dtype).tobytes(), time.time()))
+            self._size += 1
+
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """
+        Drop the least recently used entries down to 90% of max_entries (caller holds the lock).
+        """
+
+        self._size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]  # other processes may have written too
+        excess = self._size - int(self.max_entries * 0.9)
+
+        if excess > 0:
+            self._conn.execute("DELETE FROM results WHERE content_hash IN (SELECT content_hash FROM results ORDER BY last_used LIMIT ?)", (excess,))
+            self._size -= excess
+
+    def stats(self) -> dict:
+
+        return {'hits' : self.hits, 'misses' : self.misses, 'entries' : self._size}
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+
+def get_result_cache() -> ParseResultCache:
+    """
+    Returns the process-wide parsed result cache (opened on first use).
+    """
+
+    global _cache
+
+    if _cache is None:
+        _cache = ParseResultCache()
+
+    return _cache
@@ -0,0 +1,132 @@
+import numpy as np
+
+from collections import namedtuple
+
+### compact numeric score timelines and vectorized Lawler evaluation ###
+#
+# A game's timeline is two int16 arrays (away and home score after each scoring play).
+# A batch of games is the concatenation of every timeline plus an offsets array,
+# game i owns rows offsets[i]:offsets[i+1], so one pass of numpy covers all of them.
+
+GameTimeline = namedtuple('GameTimeline', ['game_date', 'home_team', 'away_team', 'away_scores', 'home_scores'])
+
+score_dtype = np.int16  # no team has ever scored 32767
+
+def score_list_to_arrays(score_list : list) -> tuple:
+    """
+    Given "away-home" score strings, split them into two integer arrays.
+    Consecutive repeats are dropped (scores only go up, so a repeat is always adjacent).
+
+    Returns away_scores, home_scores.
+    """
+
+    if not score_list:
+        return np.empty(0, dtype=score_dtype), np.empty(0, dtype=score_dtype)
+
+    pairs = np.array([score.split('-', 1) for score in score_list]).astype(score_dtype)  # one numpy cast instead of int() per score
+    away_scores, home_scores = pairs[:, 0], pairs[:, 1]
+
+    keep = np.ones(len(pairs), dtype=bool)
+    keep[1:] = (away_scores[1:] != away_scores[:-1]) | (home_scores[1:] != home_scores[:-1])
+
+    return np.ascontiguousarray(away_scores[keep]), np.ascontiguousarray(home_scores[keep])
+
+def concat_timelines(timelines : list) -> tuple:
+    """
+    Given list of (away_scores, home_scores), concatenate into one batch.
+
+    Returns away_all, home_all, offsets.
+    """
+
+    lengths = np.array([len(away_scores) for away_scores, home_scores in timelines], dtype=np.int64)
+    offsets = np.zeros(len(timelines) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    if len(timelines) == 0 or offsets[-1] == 0:
+        return np.empty(0, dtype=score_dtype), np.empty(0, dtype=score_dtype), offsets
+
+    away_all = np.concatenate([away_scores for away_scores, home_scores in timelines]).astype(score_dtype, copy=False)
+    home_all = np.concatenate([home_scores for away_scores, home_scores in timelines]).astype(score_dtype, copy=False)
+
+    return away_all, home_all, offsets
+
+def first_crossing(away_all  : np.ndarray
+                  ,home_all  : np.ndarray
+                  ,offsets   : np.ndarray
+                  ,threshold : int = 100) -> np.ndarray:
+    """
+    For every game in the batch, find the first row where either team has at least threshold points.
+
+    Returns array of row indices into the batch (-1 for games that never cross).
+    """
+
+    n_games = len(offsets) - 1
+    first = np.full(n_games, -1, dtype=np.int64)
+
+    rows = np.flatnonzero(np.maximum(away_all, home_all) >= threshold)
+    if len(rows) == 0:
+        return first
+
+    game_of_row = np.searchsorted(offsets, rows, side='right') - 1  # which game each crossing row belongs to
+    games, first_idx = np.unique(game_of_row, return_index=True)  # rows are sorted, so first occurrence is the earliest
+    first[games] = rows[first_idx]
+
+    return first
+
+def evaluate_timelines(away_all  : np.ndarray
+                      ,home_all  : np.ndarray
+                      ,offsets   : np.ndarray
+                      ,threshold : int = 100) -> dict:
+    """
+    Vectorized Lawler's law over a batch of games.
+
+    Returns dict of arrays (one value per game):
+        has_scores, final_away, final_home, away_wins, reached, lawler_away, away_at, home_at, delta_at.
+    away_wins follows the original rule (ties go to the home team) and lawler_away is True
+    when the away team was first to threshold. *_at values are only meaningful where reached.
+    """
+
+    lengths = np.diff(offsets)
+    has_scores = lengths > 0
+    last = np.where(has_scores, offsets[1:] - 1, 0)
+
+    if len(away_all) == 0:
+        final_away = np.zeros(len(lengths), dtype=score_dtype)
+        final_home = np.zeros(len(lengths), dtype=score_dtype)
+    else:
+        final_away = np.where(has_scores, away_all[last], 0)
+        final_home = np.where(has_scores, home_all[last], 0)
+
+    away_wins = final_away > final_home
+    reached = has_scores & (np.maximum(final_away, final_home) >= threshold)
+
+    crossing = first_crossing(away_all, home_all, offsets, threshold)
+    reached &= crossing >= 0
+    row = np.where(reached, crossing, 0)
+
+    if len(away_all) == 0:
+        away_at = np.zeros(len(lengths), dtype=score_dtype)
+        home_at = np.zeros(len(lengths), dtype=score_dtype)
+    else:
+        away_at = np.where(reached, away_all[row], 0)
+        home_at = np.where(reached, home_all[row], 0)
+
+    lawler_away = away_at >= home_at  # the team at threshold is the one with the high score
+
+    return {'has_scores'  : has_scores
+           ,'final_away'  : final_away
+           ,'final_home'  : final_home
+           ,'away_wins'   : away_wins
+           ,'reached'     : reached
+           ,'lawler_away' : lawler_away
+           ,'away_at'     : away_at
+           ,'home_at'     : home_at
+           ,'delta_at'    : np.abs(away_at.astype(np.int32) - home_at)}
+
+def format_scores(away_scores : np.ndarray
+                 ,home_scores : np.ndarray) -> np.ndarray:
+    """
+    Returns object array of "away-home" strings.
+    """
+
+    return np.char.add(np.char.add(away_scores.astype(str), '-'), home_scores.astype(str)).astype(object)
@@ -0,0 +1,224 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from transform.timeline import GameTimeline, score_dtype, concat_timelines, evaluate_timelines, format_scores
+
+### persisted index of every parsed game's score timeline + threshold queries over the whole history ###
+#
+# python -m transform.timeline_index build                 (re-parse every cached pbp page into the index)
+# python -m transform.timeline_index query 110 [min_lead]  (first to 110, optionally leading by min_lead)
+
+index_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'timelines.db'))
+
+class TimelineIndex:
+    """
+    Score timelines of every parsed game, one row per (game_date, home_team) with the int16 score arrays as blobs.
+
+    Queries load the whole index once into one concatenated batch and answer any threshold in a single
+    vectorized pass, no html is touched. The batch is reloaded once the file changes, from this or any other process.
+    """
+
+    def __init__(self
+                ,path : str = index_db):
+
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # shard workers share the file
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS timelines (game_date   TEXT NOT NULL
+                                                                   ,home_team   TEXT NOT NULL
+                                                                   ,away_team   TEXT
+                                                                   ,away_scores BLOB NOT NULL
+                                                                   ,home_scores BLOB NOT NULL
+                                                                   ,PRIMARY KEY (game_date, home_team))""")
+        self._conn.commit()
+        self._batch = None  # loaded batch, reused while the index is unchanged
+        self._batch_version = None
+        self._writes = 0  # adds through this connection, sqlite's data_version only moves on commits by other connections
+
+    def add(self
+           ,timelines : list):
+        """
+        Upsert a list of GameTimeline in one transaction.
+        """
+
+        rows = [(game.game_date, game.home_team, game.away_team
+                ,np.asarray(game.away_scores, dtype=score_dtype).tobytes()
+                ,np.asarray(game.home_scores, dtype=score_dtype).tobytes()) for game in timelines]
+
+        with self._lock, self._conn:
+            self._conn.executemany("""INSERT OR REPLACE INTO timelines (game_date, home_team, away_team, away_scores, home_scores)
+                                      VALUES (?, ?, ?, ?, ?)""", rows)
+            self._writes += 1
+
+    def __len__(self) -> int:
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM timelines").fetchone()[0]
+
+    def load(self
+            ,start_date : str = None
+            ,end_date   : str = None) -> dict:
+        """
+        Load timelines (optionally between dates, inclusive) into one batch.
+
+        Returns dict of game_date, home_team, away_team (object arrays) and away_all, home_all, offsets.
+        """
+
+        whole = start_date is None and end_date is None
+        sql = "SELECT game_date, home_team, away_team, away_scores, home_scores FROM timelines WHERE game_date BETWEEN ? AND ? ORDER BY game_date, home_team"
+
+        with self._lock:
+            version = (self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes)
+
+            if whole and self._batch is not None and version == self._batch_version:
+                return self._batch
+
+            rows = self._conn.execute(sql, (start_date or '0000-00-00', end_date or '9999-99-99')).fetchall()
+
+        away_all, home_all, offsets = concat_timelines([(np.frombuffer(away_blob, dtype=score_dtype), np.frombuffer(home_blob, dtype=score_dtype))
+                                                       for _, _, _, away_blob, home_blob in rows])
+
+        batch = {'game_date' : np.array([row[0] for row in rows], dtype=object)
+                ,'home_team' : np.array([row[1] for row in rows], dtype=object)
+                ,'away_team' : np.array([row[2] for row in rows], dtype=object)
+                ,'away_all'  : away_all
+                ,'home_all'  : home_all
+                ,'offsets'   : offsets}
+
+        if whole:
+            with self._lock:
+                self._batch, self._batch_version = batch, version
+
+        return batch
+
+    def timeline(self
+                ,game_date : str
+                ,home_team : str) -> GameTimeline:
+        """
+        Returns one game's GameTimeline (None if the game is not indexed).
+        """
+
+        with self._lock:
+            row = self._conn.execute("SELECT away_team, away_scores, home_scores FROM timelines WHERE game_date = ? AND home_team = ?"
+                                    ,(game_date, home_team)).fetchone()
+
+        if row is None:
+            return None
+
+        return GameTimeline(game_date, home_team, row[0], np.frombuffer(row[1], dtype=score_dtype), np.frombuffer(row[2], dtype=score_dtype))
+
+    def query_first_to(self
+                      ,threshold  : int = 100
+                      ,min_lead   : int = 0
+                      ,start_date : str = None
+                      ,end_date   : str = None) -> pd.DataFrame:
+        """
+        Which team got to threshold first in every indexed game, and did it win?
+        Games where nobody reached threshold are dropped, min_lead keeps only games where
+        the first team led by at least min_lead at the moment it got there.
+
+        Returns dataframe with one row per matching game.
+        """
+
+        batch = self.load(start_date, end_date)
+        result = evaluate_timelines(batch['away_all'], batch['home_all'], batch['offsets'], threshold)
+
+        keep = result['reached'] & (result['delta_at'] >= min_lead)
+
+        first_team = np.where(result['lawler_away'], batch['away_team'], batch['home_team'])
+        win_team = np.where(result['away_wins'], batch['away_team'], batch['home_team'])
+
+        return pd.DataFrame({'game_date'        : batch['game_date'][keep]
+                            ,'away_team'        : batch['away_team'][keep]
+                            ,'home_team'        : batch['home_team'][keep]
+                            ,'final_score'      : format_scores(result['final_away'][keep], result['final_home'][keep])
+                            ,'win_team'         : win_team[keep]
+                            ,'first_team'       : first_team[keep]
+                            ,'score_at_threshold' : format_scores(result['away_at'][keep], result['home_at'][keep])
+                            ,'lead_at_threshold'  : result['delta_at'][keep]
+                            ,'first_team_won'   : (first_team == win_team)[keep].astype(bool)})
+
+    def hit_rate(self
+                ,threshold  : int = 100
+                ,min_lead   : int = 0
+                ,start_date : str = None
+                ,end_date   : str = None) -> tuple:
+        """
+        Share of games where the first team to threshold (leading by min_lead) went on to win.
+
+        Returns hit_rate, number of games.
+        """
+
+        games_df = self.query_first_to(threshold, min_lead, start_date, end_date)
+
+        if games_df.shape[0] == 0:
+            return None, 0
+
+        return float(games_df['first_team_won'].mean()), int(games_df.shape[0])
+
+    def close(self):
+
+        with self._lock:
+            self._conn.close()
+
+
+_index = None
+
+def get_index() -> TimelineIndex:
+    """
+    Returns the process-wide timeline index (opened on first use).
+    """
+
+    global _index
+
+    if _index is None:
+        _index = TimelineIndex()
+
+    return _index
+
+
+def build_index_from_cache(workers : int = None) -> int:
+    """
+    Re-parse every cached pbp page (process pool) into the timeline index.
+
+    Returns number of games indexed.
+    """
+
+    from extract.html_cache import get_cache
+    from transform.build_game_df import parse_cached_games
+
+    games = [key for key, date in get_cache().keys() if key.startswith('pbp_')]
+    timelines = parse_cached_games(games, workers=workers or os.cpu_count())
+    get_index().add(timelines)
+
+    logging.info(f"Indexed {len(timelines)} game timelines into {get_index().path}")
+
+    return len(timelines)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) >= 2 and sys.argv[1] == 'build':
+        print(f"Indexed {build_index_from_cache()} games")
+
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'query':
+        threshold = int(sys.argv[2])
+        min_lead = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        rate, n_games = get_index().hit_rate(threshold, min_lead)
+
+        if n_games:
+            print(f"first to {threshold} (lead >= {min_lead}) won {rate:.1%} of {n_games} games")
+        else:
+            print(f"no indexed games reached {threshold} with lead >= {min_lead}")
+
+    else:
+        print('usage: python -m transform.timeline_index build | query threshold [min_lead]')
+        sys.exit(1)